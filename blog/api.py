@@ -0,0 +1,48 @@
+"""
+博客只读 API
+"""
+from moyinji.api import ReadOnlyViewSet
+
+from .models import BlogPost, Category, Tag
+from .serializers import CategorySerializer, PostSerializer, TagSerializer
+
+
+class PostViewSet(ReadOnlyViewSet):
+    """已发布的文章，可按 ?category= 和 ?tag= 筛选"""
+    serializer_class = PostSerializer
+
+    def get_base_queryset(self):
+        posts = BlogPost.objects.published()
+        params = self.request.query_params
+        if params.get('category'):
+            posts = posts.filter(category__slug=params['category'])
+        if params.get('tag'):
+            posts = posts.filter(tags__slug=params['tag'])
+        return posts
+
+    def etag_namespaces(self):
+        # 分类、标签改名会改变文章中嵌入的名称
+        if self.action == 'retrieve':
+            return [f'blog:detail:{self.kwargs["slug"]}', 'blog:filters']
+        return ['blog:list', 'blog:filters']
+
+
+class CategoryViewSet(ReadOnlyViewSet):
+    serializer_class = CategorySerializer
+    cursor_ordering = ('order', 'id')
+
+    def get_base_queryset(self):
+        return Category.objects.all()
+
+    def etag_namespaces(self):
+        return ['blog:filters']
+
+
+class TagViewSet(ReadOnlyViewSet):
+    serializer_class = TagSerializer
+
+    def get_base_queryset(self):
+        return Tag.objects.all()
+
+    def etag_namespaces(self):
+        return ['blog:filters']
@@ -0,0 +1,92 @@
+"""
+博客的异步视图
+
+ASGI 部署（``ASYNC_VIEWS=True``）时代替 ``blog.views`` 中的同名视图，
+输出完全相同。互不依赖的查询用 ``asyncio.gather`` 同时发出，缓存使用
+异步接口；浏览次数计数器只有同步客户端，经 ``sync_to_async`` 调用。
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.http import Http404
+
+from moyinji.async_views import alist
+from moyinji.response_cache import cache_response
+from moyinji.stale_cache import aget_or_build
+from moyinji.viewmodels import loads
+
+from .counters import record_view, seed_view_count
+from .models import BlogPost, Category, Tag
+from .pagination import InvalidCursor, KeysetPaginator
+from .viewmodels import PostDetail
+from .views import (
+    _detail_queryset, _list_params, _pack_detail, _page_size, _related_queryset,
+    _render_detail, _render_list, detail_cache_key, list_cache_key,
+)
+
+
+async def _aget_or_404(queryset, **lookup):
+    try:
+        return await queryset.aget(**lookup)
+    except queryset.model.DoesNotExist:
+        raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+
+
+async def _none():
+    return None
+
+
+@cache_response(list_cache_key, 60 * 15)  # 缓存15分钟
+async def blog_list(request):
+    """文章列表页"""
+    category_slug, tag_slug, after, before = _list_params(request)
+
+    category, tag = await asyncio.gather(
+        _aget_or_404(Category.objects.all(), slug=category_slug) if category_slug else _none(),
+        _aget_or_404(Tag.objects.all(), slug=tag_slug) if tag_slug else _none(),
+    )
+    posts = BlogPost.objects.published().cards()
+    if category:
+        posts = posts.filter(category=category)
+    if tag:
+        posts = posts.filter(tags=tag)
+
+    paginator = KeysetPaginator(posts, _page_size())
+    try:
+        page, categories, tags = await asyncio.gather(
+            paginator.apage(after=after, before=before),
+            alist(Category.objects.only('name', 'slug')),
+            alist(Tag.objects.only('name', 'slug')),
+        )
+    except InvalidCursor:
+        raise Http404('无效的分页参数')
+
+    return _render_list(request, page, categories, tags, category_slug, tag_slug)
+
+
+def _seed_and_pack(post, related_posts):
+    # 以数据库值重置实时计数
+    seed_view_count(post.id, post.view_count)
+    return _pack_detail(post, related_posts)
+
+
+async def blog_detail(request, slug):
+    """文章详情页"""
+    async def build():
+        # 相关文章按文章的 slug 连接查询，不必等文章本身查出来
+        post, related_posts = await asyncio.gather(
+            _aget_or_404(_detail_queryset(), slug=slug),
+            alist(_related_queryset().filter(related_by__post__slug=slug)),
+        )
+        # 打包时可能要补渲染并保存 Markdown，和重置计数一起放到同步线程中
+        return await sync_to_async(_seed_and_pack)(post, related_posts)
+
+    key, namespaces = detail_cache_key(slug)
+    data = loads(await aget_or_build(
+        key, namespaces, build, 60 * 30,  # 缓存30分钟
+        refresh=bool(request.GET.get('no-cache')),
+    ))
+    post = PostDetail.unpack(data['post'])
+    # 浏览次数写入缓冲计数器，由定期任务批量写回数据库
+    post.view_count = await sync_to_async(record_view)(post.id, post.view_count)
+    return _render_detail(request, post, data)
@@ -0,0 +1,214 @@
+"""
+文章浏览次数的写缓冲计数器
+
+详情页每次访问只在缓存中做一次原子自增，累计的增量由定期任务
+（任务队列 worker 中的周期任务、``flush_view_counts`` 命令，或 locmem
+模式下的进程内定时刷新）合并为一条 UPDATE 写回 ``BlogPost.view_count``。
+
+缓存中维护两张表：
+- pending：尚未写回数据库的增量
+- total：页面展示用的实时浏览次数
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+
+from .models import BlogPost
+
+try:
+    from redis.exceptions import RedisError
+    REDIS_ERRORS = (RedisError,)
+except ImportError:  # 未安装 redis 时只会用到进程内计数器
+    REDIS_ERRORS = ()
+
+PENDING_KEY = 'blog:views:pending'
+TOTAL_KEY = 'blog:views:total'
+
+# 每条 UPDATE 语句最多合并的文章数，避免 CASE 表达式过长
+FLUSH_BATCH_SIZE = 500
+
+
+def get_flush_interval():
+    """写回间隔（秒）"""
+    return getattr(settings, 'VIEW_COUNT_FLUSH_INTERVAL', 60)
+
+
+class RedisViewCounter:
+    """基于 Redis 哈希的计数器，多个 worker 共享"""
+
+    # 自增 pending；total 存在则自增，否则用数据库值加 pending 初始化
+    RECORD_SCRIPT = """
+local pending = redis.call('HINCRBY', KEYS[1], ARGV[1], 1)
+if redis.call('HEXISTS', KEYS[2], ARGV[1]) == 1 then
+    return redis.call('HINCRBY', KEYS[2], ARGV[1], 1)
+end
+local total = tonumber(ARGV[2]) + pending
+redis.call('HSET', KEYS[2], ARGV[1], total)
+return total
+"""
+
+    # 原子地取出并清空 pending
+    DRAIN_SCRIPT = """
+local values = redis.call('HGETALL', KEYS[1])
+redis.call('DEL', KEYS[1])
+return values
+"""
+
+    def __init__(self, client):
+        self.client = client
+        self.pending_key = cache.make_key(PENDING_KEY)
+        self.total_key = cache.make_key(TOTAL_KEY)
+
+    def record(self, post_id, base_count):
+        return int(self.client.eval(
+            self.RECORD_SCRIPT, 2, self.pending_key, self.total_key,
+            post_id, base_count,
+        ))
+
+    def seed(self, post_id, total):
+        self.client.hset(self.total_key, post_id, total)
+
+    def pending(self, post_id):
+        return int(self.client.hget(self.pending_key, post_id) or 0)
+
+    def drain(self):
+        values = self.client.eval(self.DRAIN_SCRIPT, 1, self.pending_key)
+        return {
+            int(values[i]): int(values[i + 1])
+            for i in range(0, len(values), 2)
+        }
+
+    def restore(self, counts):
+        pipe = self.client.pipeline()
+        for post_id, count in counts.items():
+            pipe.hincrby(self.pending_key, post_id, count)
+        pipe.execute()
+
+
+class LocalViewCounter:
+    """进程内计数器，用于未启用 Redis 的 locmem 缓存"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._totals = {}
+        self.last_flush = time.monotonic()
+
+    def record(self, post_id, base_count):
+        with self._lock:
+            pending = self._pending.get(post_id, 0) + 1
+            self._pending[post_id] = pending
+            if post_id in self._totals:
+                self._totals[post_id] += 1
+            else:
+                self._totals[post_id] = base_count + pending
+            return self._totals[post_id]
+
+    def seed(self, post_id, total):
+        with self._lock:
+            self._totals[post_id] = total
+
+    def pending(self, post_id):
+        with self._lock:
+            return self._pending.get(post_id, 0)
+
+    def drain(self):
+        with self._lock:
+            counts, self._pending = self._pending, {}
+            self.last_flush = time.monotonic()
+            return counts
+
+    def restore(self, counts):
+        with self._lock:
+            for post_id, count in counts.items():
+                self._pending[post_id] = self._pending.get(post_id, 0) + count
+
+    def reset(self):
+        with self._lock:
+            self._pending.clear()
+            self._totals.clear()
+            self.last_flush = time.monotonic()
+
+
+_local_counter = LocalViewCounter()
+
+
+def get_counter():
+    """根据当前缓存后端选择计数器实现"""
+    try:
+        from django_redis import get_redis_connection
+        return RedisViewCounter(get_redis_connection('default'))
+    except (ImportError, NotImplementedError):
+        return _local_counter
+
+
+def record_view(post_id, base_count):
+    """
+    记录一次浏览并返回实时浏览次数
+
+    base_count 是调用方已知的数据库浏览次数，仅在缓存中没有
+    实时值时用于初始化。缓存不可用时退化为直接更新数据库。
+    """
+    counter = get_counter()
+    try:
+        total = counter.record(post_id, base_count)
+    except REDIS_ERRORS:
+        BlogPost.objects.filter(pk=post_id).update(view_count=F('view_count') + 1)
+        return base_count + 1
+
+    if counter is _local_counter:
+        maybe_flush_local()
+    return total
+
+
+def seed_view_count(post_id, db_count):
+    """用数据库中的值（加上尚未写回的增量）重置实时浏览次数"""
+    counter = get_counter()
+    try:
+        total = db_count + counter.pending(post_id)
+        counter.seed(post_id, total)
+    except REDIS_ERRORS:
+        return db_count
+    return total
+
+
+def flush_view_counts(counter=None):
+    """
+    将缓冲的浏览次数写回数据库
+
+    Returns:
+        写回的文章数量
+    """
+    counter = counter or get_counter()
+    counts = {pk: n for pk, n in counter.drain().items() if n > 0}
+    if not counts:
+        return 0
+
+    items = list(counts.items())
+    try:
+        with transaction.atomic():
+            for start in range(0, len(items), FLUSH_BATCH_SIZE):
+                batch = items[start:start + FLUSH_BATCH_SIZE]
+                increment = Case(
+                    *[When(pk=pk, then=Value(n)) for pk, n in batch],
+                    default=Value(0),
+                    output_field=PositiveIntegerField(),
+                )
+                BlogPost.objects.filter(pk__in=[pk for pk, _ in batch]).update(
+                    view_count=F('view_count') + increment
+                )
+    except Exception:
+        # 写回失败时把增量放回缓冲区，等待下一次刷新
+        counter.restore(counts)
+        raise
+    return len(counts)
+
+
+def maybe_flush_local():
+    """locmem 计数器只存在于当前进程，由请求路径按间隔顺带刷新"""
+    if time.monotonic() - _local_counter.last_flush >= get_flush_interval():
+        flush_view_counts(_local_counter)
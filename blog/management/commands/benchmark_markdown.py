@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.models import BlogPost
+from blog.rendering import render_markdown
+
+SAMPLE_CONTENT = '''## 宋代美学与摄影
+
+宋代美学，以**简约**、*留白*、自然为核心，与摄影艺术有着天然的契合。
+
+- 简约之美
+- 留白之妙
+- 自然之真
+
+> 现代摄影可以从宋代美学中汲取营养。
+
+| 器材 | 参数 |
+|------|------|
+| Sony A7R IV | 50mm f/1.2 |
+'''
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request Markdown rendering with precomputed content_html'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=500)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        posts = list(BlogPost.objects.only('content', 'content_html', 'content_hash')[:50])
+        if not posts:
+            posts = [BlogPost(content=SAMPLE_CONTENT * 10)]
+            posts[0].render_content()
+
+        per_request = self.measure(
+            lambda post: render_markdown(post.content), posts, iterations
+        )
+        precomputed = self.measure(
+            lambda post: post.get_content_html(), posts, iterations
+        )
+
+        self.stdout.write(f'Posts sampled:          {len(posts)}')
+        self.stdout.write(f'Per-request rendering:  {per_request * 1e6:9.1f} us/request')
+        self.stdout.write(f'Precomputed (hash hit): {precomputed * 1e6:9.1f} us/request')
+        if precomputed:
+            self.stdout.write(self.style.SUCCESS(f'Speedup: {per_request / precomputed:.0f}x'))
+
+    def measure(self, func, posts, iterations):
+        started = time.perf_counter()
+        for i in range(iterations):
+            func(posts[i % len(posts)])
+        return (time.perf_counter() - started) / iterations
@@ -0,0 +1,158 @@
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from .benchmark_views import benchmark_pages, percentile
+
+PROFILES = ('wsgi', 'asgi')
+
+
+async def fetch(reader, writer, path):
+    """发送一个 keep-alive 的 GET 请求，返回 (状态码, 连接能否复用)"""
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: keep-alive\r\n\r\n'.encode())
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    status_line, *header_lines = head.decode('latin-1').split('\r\n')
+    headers = {}
+    for line in header_lines:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip().lower()
+
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.read()
+        return int(status_line.split()[1]), False
+    return int(status_line.split()[1]), headers.get('connection') != 'close'
+
+
+async def run_load(port, paths, concurrency, duration):
+    """concurrency 个连接在 duration 秒内轮流请求 paths，返回耗时列表和错误数"""
+    latencies, errors = [], 0
+    deadline = time.monotonic() + duration
+
+    async def client(offset):
+        nonlocal errors
+        reader = writer = None
+        n = offset
+        while time.monotonic() < deadline:
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                started = time.perf_counter()
+                status, keep_alive = await fetch(reader, writer, paths[n % len(paths)])
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                errors += 1
+                keep_alive = False
+            else:
+                latencies.append(time.perf_counter() - started)
+                if status >= 400:
+                    errors += 1
+            if not keep_alive and writer is not None:
+                writer.close()
+                reader = writer = None
+            n += 1
+        if writer is not None:
+            writer.close()
+
+    await asyncio.gather(*(client(i) for i in range(concurrency)))
+    return latencies, errors
+
+
+class Command(BaseCommand):
+    help = (
+        'Start the site under gunicorn with the WSGI (sync views) and ASGI (uvicorn worker, '
+        'async views) profiles and compare throughput at high concurrency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', choices=PROFILES, action='append', help='Default: both')
+        parser.add_argument('--workers', type=int, default=3, help='Gunicorn workers per profile')
+        parser.add_argument('--concurrency', type=int, default=64, help='Concurrent client connections')
+        parser.add_argument('--duration', type=float, default=10, help='Measured seconds per profile')
+        parser.add_argument('--warmup', type=float, default=2, help='Unmeasured seconds per profile')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument(
+            'paths', nargs='*',
+            help='Paths to request in turn (default: home, blog list/detail, gallery list/detail)',
+        )
+
+    def start_server(self, profile, port, workers):
+        env = {
+            **os.environ,
+            'SERVER_PROFILE': profile,
+            'ASYNC_VIEWS': str(profile == 'asgi'),
+            'GUNICORN_BIND': f'127.0.0.1:{port}',
+            'WEB_CONCURRENCY': str(workers),
+            # 与本命令使用同一个数据库
+            'DB_NAME': str(settings.DATABASES['default']['NAME']),
+        }
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--config', str(settings.BASE_DIR / 'gunicorn.conf.py')],
+            cwd=settings.BASE_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'{profile} server exited: {server.stderr.read().decode()[-2000:]}')
+            try:
+                status, _ = asyncio.run(self.probe(port))
+            except OSError:
+                status = None
+            if status == 200:
+                return server
+            time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f'{profile} server did not become healthy on port {port}')
+
+    async def probe(self, port):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            return await fetch(reader, writer, '/health/')
+        finally:
+            writer.close()
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or [url for _, url in benchmark_pages()]
+        results = []
+        for offset, profile in enumerate(options['profile'] or PROFILES):
+            port = options['port'] + offset
+            self.stdout.write(f'Starting {profile} on port {port} with {options["workers"]} workers...')
+            server = self.start_server(profile, port, options['workers'])
+            try:
+                if options['warmup']:
+                    asyncio.run(run_load(port, paths, options['concurrency'], options['warmup']))
+                latencies, errors = asyncio.run(
+                    run_load(port, paths, options['concurrency'], options['duration'])
+                )
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+            results.append((profile, sorted(latencies), errors))
+
+        self.stdout.write(
+            f'\n{"profile":<10}{"requests":>10}{"req/s":>10}{"p50 ms":>10}{"p99 ms":>10}{"errors":>8}'
+        )
+        for profile, latencies, errors in results:
+            if not latencies:
+                self.stdout.write(f'{profile:<10}{0:>10}{"-":>10}{"-":>10}{"-":>10}{errors:>8}')
+                continue
+            self.stdout.write(
+                f'{profile:<10}{len(latencies):>10}{len(latencies) / options["duration"]:>10.1f}'
+                f'{statistics.median(latencies) * 1000:>10.1f}{percentile(latencies, 0.99) * 1000:>10.1f}'
+                f'{errors:>8}'
+            )
@@ -0,0 +1,175 @@
+import json
+import platform
+import statistics
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from blog.models import BlogPost
+from gallery.models import Photo, PhotoAlbum
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+
+# 不经过缓存时测量完整的查询和渲染路径
+UNCACHED = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+# 页面和数据不缓存，只缓存模板片段：整页缓存失效后重建页面的耗时
+FRAGMENTS_ONLY = {
+    **UNCACHED,
+    # locmem 默认只保留 300 个键，放不下整个相册列表的卡片
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 100_000},
+    },
+}
+
+MODES = ('uncached', 'fragments', 'cached')
+CACHE_OVERRIDES = {'uncached': UNCACHED, 'fragments': FRAGMENTS_ONLY}
+
+
+def percentile(sorted_values, fraction):
+    """已排序数据的分位数（最近秩）"""
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def render_ms(response):
+    """Server-Timing 中的模板渲染耗时（毫秒），缓存命中时为 0"""
+    for metric in response.get('Server-Timing', '').split(','):
+        name, _, params = metric.strip().partition(';')
+        if name == 'render':
+            return float(params.partition('dur=')[2] or 0)
+    return 0.0
+
+
+def benchmark_pages():
+    """要测量的页面：(名称, URL)，详情页取浏览最多的文章和照片最多的相册"""
+    post = BlogPost.objects.published().order_by('-view_count', '-id').values_list('slug', flat=True).first()
+    album = PhotoAlbum.objects.order_by('-photo_count', '-id').values_list('slug', flat=True).first()
+    if post is None or album is None:
+        raise CommandError('Need at least one published post and one album; run generate_synthetic_data first.')
+    return [
+        ('home', reverse('home')),
+        ('blog_list', reverse('blog:list')),
+        ('blog_detail', reverse('blog:detail', kwargs={'slug': post})),
+        ('gallery_list', reverse('gallery:list')),
+        ('gallery_detail', reverse('gallery:detail', kwargs={'slug': album})),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure p50/p99 latency and query counts of the main pages, '
+        'optionally saving or comparing against a stored baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Measured requests per page and mode')
+        parser.add_argument('--warmup', type=int, default=3, help='Unmeasured requests per page and mode')
+        parser.add_argument('--mode', choices=MODES, action='append', help='Default: all')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='Baseline JSON file')
+        parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline')
+        parser.add_argument('--compare', action='store_true', help='Fail if results regress against the baseline')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.3,
+            help='Allowed relative p50 slowdown before --compare fails (default 0.3)',
+        )
+        parser.add_argument(
+            '--min-delta-ms', type=float, default=2.0,
+            help='Ignore p50 slowdowns smaller than this many milliseconds (default 2)',
+        )
+
+    def measure(self, client, url, requests, warmup):
+        for _ in range(warmup):
+            client.get(url)
+        latencies, queries, renders = [], [], []
+        for _ in range(requests):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(url)
+                latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise CommandError(f'{url} returned {response.status_code}')
+            queries.append(len(captured))
+            renders.append(render_ms(response))
+        latencies.sort()
+        return {
+            'p50_ms': round(statistics.median(latencies) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+            'render_ms': round(statistics.median(renders), 3),
+            'queries': max(queries),
+        }
+
+    def handle(self, *args, **options):
+        client = Client(SERVER_NAME='localhost')
+        pages = benchmark_pages()
+        results = {}
+        for mode in options['mode'] or MODES:
+            overrides = {'CACHES': CACHE_OVERRIDES[mode]} if mode in CACHE_OVERRIDES else {}
+            # 渲染耗时取自 Server-Timing 头
+            with override_settings(SERVER_TIMING=True, **overrides):
+                if mode == 'cached':
+                    cache.clear()
+                for name, url in pages:
+                    results[f'{name}:{mode}'] = self.measure(
+                        client, url, options['requests'], options['warmup']
+                    )
+
+        baseline_path = Path(options['baseline'])
+        baseline = None
+        if options['compare']:
+            if not baseline_path.exists():
+                raise CommandError(f'No baseline at {baseline_path}; run with --save-baseline first.')
+            stored = json.loads(baseline_path.read_text())
+            baseline = stored['results']
+            # 数据量不同时耗时不可比，只提示不阻止
+            dataset = {'posts': BlogPost.objects.count(), 'photos': Photo.objects.count()}
+            recorded = {key: stored['environment'].get(key) for key in dataset}
+            if recorded != dataset:
+                self.stdout.write(self.style.WARNING(
+                    f'Baseline was recorded with {recorded}, current data is {dataset}.'
+                ))
+
+        self.stdout.write(f'{"page":<24}{"p50 ms":>10}{"p99 ms":>10}{"render":>9}{"queries":>9}  vs baseline')
+        regressions = []
+        for key, result in results.items():
+            line = (
+                f'{key:<24}{result["p50_ms"]:>10.2f}{result["p99_ms"]:>10.2f}'
+                f'{result["render_ms"]:>9.2f}{result["queries"]:>9}'
+            )
+            previous = baseline.get(key) if baseline else None
+            if previous:
+                change = result['p50_ms'] / previous['p50_ms'] - 1 if previous['p50_ms'] else 0
+                line += f'  p50 {change:+.0%}, queries {previous["queries"]}->{result["queries"]}'
+                if result['queries'] > previous['queries']:
+                    regressions.append(f'{key}: queries {previous["queries"]} -> {result["queries"]}')
+                delta = result['p50_ms'] - previous['p50_ms']
+                if change > options['tolerance'] and delta > options['min_delta_ms']:
+                    regressions.append(f'{key}: p50 {previous["p50_ms"]:.2f}ms -> {result["p50_ms"]:.2f}ms')
+            self.stdout.write(line)
+
+        if options['save_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps({
+                'environment': {
+                    'python': platform.python_version(),
+                    'database': connection.vendor,
+                    'cache': settings.CACHES['default']['BACKEND'],
+                    'posts': BlogPost.objects.count(),
+                    'photos': Photo.objects.count(),
+                    'requests': options['requests'],
+                },
+                'results': results,
+            }, indent=2, ensure_ascii=False) + '\n')
+            self.stdout.write(f'Baseline written to {baseline_path}')
+
+        if regressions:
+            raise CommandError('Regressions against baseline:\n  ' + '\n  '.join(regressions))
+        if baseline is not None:
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline.'))
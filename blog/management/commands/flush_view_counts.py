@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.counters import flush_view_counts, get_flush_interval
+
+
+class Command(BaseCommand):
+    help = 'Flush buffered blog post view counts to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and flush every VIEW_COUNT_FLUSH_INTERVAL seconds',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=None,
+            help='Override the flush interval in seconds (implies --loop)',
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        if not options['loop'] and interval is None:
+            flushed = flush_view_counts()
+            self.stdout.write(self.style.SUCCESS(f'Flushed view counts for {flushed} posts.'))
+            return
+
+        interval = interval or get_flush_interval()
+        self.stdout.write(f'Flushing view counts every {interval}s...')
+        try:
+            while True:
+                flushed = flush_view_counts()
+                if flushed:
+                    self.stdout.write(f'Flushed view counts for {flushed} posts.')
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            # 退出前把剩余的增量写回
+            flush_view_counts()
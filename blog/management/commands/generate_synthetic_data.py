@@ -0,0 +1,248 @@
+import io
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from blog.models import BlogPost, Category, Tag
+from blog.rendering import content_digest, render_markdown
+from gallery import thumbnails
+from gallery.models import Photo, PhotoAlbum
+from moyinji.generations import bump
+
+# 正文用词，按 Zipf 分布抽取，使词频接近真实文本
+WORDS = [
+    '西湖', '断桥', '苏堤', '雷峰塔', '晨雾', '光影', '胶片', '黑白', '镜头', '快门',
+    '构图', '留白', '山水', '云海', '日出', '黄昏', '古镇', '白墙', '黛瓦', '马头墙',
+    '炊烟', '老屋', '石桥', '流水', '柳树', '桃花', '荷叶', '秋月', '冬雪', '春风',
+    '器物', '青瓷', '茶盏', '宋画', '意境', '简约', '自然', '时光', '岁月', '记忆',
+    '徽州', '江南', '黄山', '泰山', '长城', '运河', '渔舟', '灯火', '街巷', '行人',
+    '色彩', '质感', '颗粒', '曝光', '对焦', '光圈', '逆光', '剪影', '倒影', '长焦',
+]
+
+CATEGORY_NAMES = ['山水意境', '器物特写', '光影实验', '随笔', '旅行', '人文', '建筑', '夜景']
+TAG_WORDS = ['风光', '人像', '黑白', '胶片', '街拍', '静物', '建筑', '夜景', '长曝光', '航拍']
+
+# 每篇文章的标签数及其概率
+TAGS_PER_POST = ([1, 2, 3, 4, 5, 6], [15, 30, 25, 15, 10, 5])
+
+PLACEHOLDER_COLORS = ['#3C4856', '#B78B5D', '#2A5CAA', '#D03B40', '#6B8E5A', '#8C7A6B', '#4A4A4A', '#C9B79C']
+
+
+def zipf_weights(n, exponent=1.1):
+    return [1 / (rank ** exponent) for rank in range(1, n + 1)]
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """暂时关闭 auto_now / auto_now_add，让 bulk_create 写入生成的时间"""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def batches(total, size):
+    for start in range(0, total, size):
+        yield start, min(size, total - start)
+
+
+class Command(BaseCommand):
+    help = 'Bulk-generate a large synthetic dataset (posts, tags, albums, photos) for scale testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--photos', type=int, default=5000)
+        parser.add_argument('--albums', type=int, default=None, help='Default: one per 50 photos')
+        parser.add_argument('--categories', type=int, default=8)
+        parser.add_argument('--tags', type=int, default=200)
+        parser.add_argument('--days', type=int, default=3 * 365, help='Spread created_at over this many days')
+        parser.add_argument('--bodies', type=int, default=200, help='Distinct post bodies to render and reuse')
+        parser.add_argument('--placeholders', type=int, default=8, help='Distinct placeholder images')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--prefix', default='synthetic', help='Slug prefix of generated rows')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument(
+            '--with-indexes', action='store_true',
+            help='Also rebuild the search index and related posts afterwards',
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.prefix = options['prefix']
+        self.now = timezone.now()
+        self.days = options['days']
+        started = time.perf_counter()
+
+        images = self.create_placeholders(options['placeholders'])
+        categories = self.create_categories(options['categories'])
+        tags = self.create_tags(options['tags'])
+        self.create_posts(options['posts'], options['bodies'], categories, tags, images)
+        albums = options['albums'] or max(1, options['photos'] // 50)
+        self.create_gallery(albums, options['photos'], images)
+
+        if options['with_indexes']:
+            from blog import related, search
+            self.stdout.write('Rebuilding search index and related posts...')
+            search.rebuild_index()
+            related.rebuild()
+
+        bump('blog:list', 'blog:filters', 'gallery:list')
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.perf_counter() - started:.1f}s.'))
+
+    def report(self, label, count, started):
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed if elapsed else 0
+        self.stdout.write(f'{label}: {count} in {elapsed:.1f}s ({rate:.0f}/s)')
+
+    def random_time(self):
+        return self.now - timedelta(seconds=self.random.uniform(0, self.days * 86400))
+
+    def create_placeholders(self, count):
+        """少量占位图片供全部照片和封面共用，并预先生成它们的缩略图"""
+        names = []
+        for i in range(count):
+            name = f'gallery/{self.prefix}/placeholder-{i}.jpg'
+            if not default_storage.exists(name):
+                buffer = io.BytesIO()
+                color = PLACEHOLDER_COLORS[i % len(PLACEHOLDER_COLORS)]
+                Image.new('RGB', (1600, 1067), color).save(buffer, format='JPEG', quality=80)
+                name = default_storage.save(name, ContentFile(buffer.getvalue()))
+            thumbnails.generate_for_image(name)
+            names.append(name)
+        return names
+
+    def create_categories(self, count):
+        existing = Category.objects.filter(slug__startswith=f'{self.prefix}-').count()
+        Category.objects.bulk_create(
+            Category(
+                name=f'{CATEGORY_NAMES[i % len(CATEGORY_NAMES)]}{i}',
+                slug=f'{self.prefix}-category-{i}',
+                order=i,
+            )
+            for i in range(existing, count)
+        )
+        return list(Category.objects.filter(slug__startswith=f'{self.prefix}-category-'))
+
+    def create_tags(self, count):
+        existing = Tag.objects.filter(slug__startswith=f'{self.prefix}-').count()
+        Tag.objects.bulk_create(
+            Tag(name=f'{TAG_WORDS[i % len(TAG_WORDS)]}{i}', slug=f'{self.prefix}-tag-{i}')
+            for i in range(existing, count)
+        )
+        # 按 id 排序，Zipf 分布中靠前的标签最常用
+        return list(Tag.objects.filter(slug__startswith=f'{self.prefix}-tag-').order_by('id'))
+
+    def sentence(self, weights):
+        words = self.random.choices(WORDS, weights, k=self.random.randint(4, 12))
+        return '，'.join(''.join(words[i:i + 2]) for i in range(0, len(words), 2)) + '。'
+
+    def render_bodies(self, count):
+        """预先渲染一批正文，文章之间复用，不在生成时逐篇渲染 Markdown"""
+        weights = zipf_weights(len(WORDS))
+        bodies = []
+        for _ in range(count):
+            paragraphs = [
+                ''.join(self.sentence(weights) for _ in range(self.random.randint(2, 6)))
+                for _ in range(self.random.randint(3, 12))
+            ]
+            content = '\n\n'.join(paragraphs)
+            bodies.append((content, render_markdown(content), content_digest(content), paragraphs[0][:120]))
+        return bodies
+
+    def create_posts(self, total, body_count, categories, tags, images):
+        started = time.perf_counter()
+        bodies = self.render_bodies(max(1, body_count))
+        category_weights = zipf_weights(len(categories), 0.8)
+        tag_weights = zipf_weights(len(tags))
+        offset = BlogPost.objects.filter(slug__startswith=f'{self.prefix}-post-').count()
+        through = BlogPost.tags.through
+        fields = [BlogPost._meta.get_field(name) for name in ('created_at', 'updated_at')]
+
+        with explicit_timestamps(*fields):
+            for start, size in batches(total, self.batch_size):
+                posts = []
+                for n in range(offset + start, offset + start + size):
+                    content, html, digest, excerpt = self.random.choice(bodies)
+                    created_at = self.random_time()
+                    posts.append(BlogPost(
+                        title=f'{self.random.choice(WORDS)}{self.random.choice(WORDS)}·{n}',
+                        slug=f'{self.prefix}-post-{n}',
+                        cover_image=self.random.choice(images),
+                        content=content,
+                        content_html=html,
+                        content_hash=digest,
+                        excerpt=excerpt,
+                        category=self.random.choices(categories, category_weights)[0] if categories else None,
+                        is_photography=self.random.random() < 0.6,
+                        is_published=self.random.random() < 0.95,
+                        created_at=created_at,
+                        updated_at=min(created_at + timedelta(hours=self.random.uniform(0, 72)), self.now),
+                        # 浏览次数呈长尾分布
+                        view_count=int(self.random.paretovariate(1.2) * 10),
+                    ))
+                with transaction.atomic():
+                    BlogPost.objects.bulk_create(posts)
+                    rows = []
+                    for post in posts:
+                        k = self.random.choices(*TAGS_PER_POST)[0]
+                        chosen = {tag.pk for tag in self.random.choices(tags, tag_weights, k=k)} if tags else ()
+                        rows.extend(through(blogpost_id=post.pk, tag_id=tag_id) for tag_id in chosen)
+                    through.objects.bulk_create(rows)
+                self.stdout.write(f'  posts {start + size}/{total}')
+        self.report('Posts', total, started)
+
+    def create_gallery(self, album_count, total, images):
+        started = time.perf_counter()
+        offset = PhotoAlbum.objects.filter(slug__startswith=f'{self.prefix}-album-').count()
+        with explicit_timestamps(PhotoAlbum._meta.get_field('created_at')):
+            PhotoAlbum.objects.bulk_create(
+                PhotoAlbum(
+                    title=f'{self.random.choice(WORDS)}{self.random.choice(WORDS)}·{n}',
+                    slug=f'{self.prefix}-album-{n}',
+                    description=self.sentence(zipf_weights(len(WORDS))),
+                    theme_color=self.random.choice(PhotoAlbum.THEME_COLOR_CHOICES)[0],
+                    is_featured=self.random.random() < 0.1,
+                    created_at=self.random_time().date(),
+                )
+                for n in range(offset, offset + album_count)
+            )
+        albums = list(PhotoAlbum.objects.filter(slug__startswith=f'{self.prefix}-album-').values_list('pk', flat=True))
+        # 少数相册照片很多，多数相册照片较少
+        album_weights = zipf_weights(len(albums), 0.7)
+        field = Photo._meta.get_field('created_at')
+
+        with explicit_timestamps(field):
+            for start, size in batches(total, self.batch_size):
+                Photo.objects.bulk_create(
+                    Photo(
+                        album_id=album_id,
+                        title=f'{self.random.choice(WORDS)}·{start + i}',
+                        image=self.random.choice(images),
+                        location=self.random.choice(WORDS),
+                        camera=self.random.choice(['Sony A7R IV', 'Fujifilm X-T5', 'Leica M11', 'Nikon Z8']),
+                        aperture=self.random.choice(['1.4', '2', '2.8', '5.6', '8']),
+                        iso=str(self.random.choice([100, 200, 400, 800, 1600])),
+                        order=start + i,
+                        created_at=self.random_time(),
+                    )
+                    for i, album_id in enumerate(self.random.choices(albums, album_weights, k=size))
+                )
+                self.stdout.write(f'  photos {start + size}/{total}')
+
+        # bulk_create 不触发信号，按照片表校正相册的照片数量和封面
+        PhotoAlbum.objects.filter(slug__startswith=f'{self.prefix}-album-').reconcile()
+        self.stdout.write(f'Albums: {album_count}')
+        self.report('Photos', total, started)
@@ -0,0 +1,90 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+
+
+class Command(BaseCommand):
+    help = (
+        'Issue concurrent in-process requests and report latency and how many '
+        'database connections were opened'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*', default=['/health/'],
+            help='Paths to request in turn (default: /health/, one query per request)',
+        )
+        parser.add_argument('--requests', type=int, default=500, help='Total number of requests')
+        parser.add_argument('--concurrency', type=int, default=8, help='Worker threads')
+        parser.add_argument(
+            '--conn-max-age', type=int, default=None,
+            help='Override CONN_MAX_AGE for this run (0 reconnects on every request)',
+        )
+
+    def handle(self, *args, **options):
+        if options['conn_max_age'] is not None:
+            connections.settings['default']['CONN_MAX_AGE'] = options['conn_max_age']
+        connections.close_all()
+
+        opened = []
+        lock = threading.Lock()
+
+        def count_connection(sender, connection, **kwargs):
+            with lock:
+                opened.append(connection.alias)
+
+        connection_created.connect(count_connection, weak=False)
+
+        paths = options['paths']
+        total = options['requests']
+        concurrency = max(1, options['concurrency'])
+        latencies, errors = [], []
+
+        def worker(index):
+            client = Client(SERVER_NAME='localhost')
+            local, failed = [], 0
+            try:
+                for n in range(index, total, concurrency):
+                    # 测试客户端不会像 WSGI 处理器那样在请求开始和结束时
+                    # 关闭过期连接，这里显式调用以还原真实的连接生命周期
+                    started = time.perf_counter()
+                    close_old_connections()
+                    response = client.get(paths[n % len(paths)])
+                    close_old_connections()
+                    local.append(time.perf_counter() - started)
+                    if response.status_code >= 400:
+                        failed += 1
+            finally:
+                connections.close_all()
+            with lock:
+                latencies.extend(local)
+                errors.append(failed)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        connection_created.disconnect(count_connection)
+
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        self.stdout.write(
+            f'{len(latencies)} requests in {elapsed:.2f}s ({len(latencies) / elapsed:.1f} req/s), '
+            f'{sum(errors)} errors'
+        )
+        self.stdout.write(
+            f'latency p50 {statistics.median(latencies) * 1000:.2f}ms, p99 {p99 * 1000:.2f}ms'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'database connections opened: {len(opened)} '
+            f'({len(opened) / len(latencies):.2f} per request, '
+            f'CONN_MAX_AGE={connections.settings["default"].get("CONN_MAX_AGE")})'
+        ))
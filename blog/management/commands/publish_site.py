@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from moyinji import publish
+
+
+class Command(BaseCommand):
+    help = (
+        'Render the public pages to HTML files under PUBLISH_DIR for nginx to serve directly, '
+        'removing files for pages that no longer exist'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*',
+            help='Only republish these page paths, e.g. / /blog/?tag=lake (default: the whole site)',
+        )
+
+    def handle(self, *args, **options):
+        if not publish.enabled():
+            raise CommandError('PUBLISH_DIR is not set.')
+
+        if options['paths']:
+            stats = publish.publish(options['paths'])
+        else:
+            stats = publish.publish_site()
+
+        for error in stats.errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'Published {stats.written} pages to {settings.PUBLISH_DIR}, removed {stats.removed}, '
+            f'{len(stats.errors)} errors in {stats.elapsed:.2f}s.'
+        ))
+        if stats.errors:
+            raise CommandError(f'{len(stats.errors)} pages failed to publish.')
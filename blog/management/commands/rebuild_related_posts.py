@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.related import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute related posts for all published blog posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per INSERT')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        processed = rebuild(batch_size=options['batch_size'])
+
+        elapsed = time.perf_counter() - started
+        rate = processed / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Computed related posts for {processed} posts in {elapsed:.2f}s ({rate:.1f} posts/s).'
+        ))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for all blog posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Posts per batch')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def progress(indexed):
+            self.stdout.write(f'Indexed {indexed} posts...')
+
+        indexed = rebuild_index(batch_size=options['batch_size'], progress=progress)
+
+        elapsed = time.perf_counter() - started
+        rate = indexed / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {indexed} posts in {elapsed:.2f}s ({rate:.1f} posts/s).'
+        ))
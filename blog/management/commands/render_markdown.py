@@ -0,0 +1,62 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from blog.models import BlogPost
+from blog.rendering import content_digest, render_item
+
+
+class Command(BaseCommand):
+    help = 'Render BlogPost Markdown content to content_html in a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Re-render every post, not only posts whose content hash changed',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of worker processes (default: CPU count)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Posts per bulk_update batch (default: 200)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        rows = BlogPost.objects.values_list('pk', 'content', 'content_hash').order_by('pk')
+
+        started = time.perf_counter()
+        rendered = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            batch = []
+            for pk, content, current_hash in rows.iterator(chunk_size=batch_size):
+                if options['all'] or content_digest(content) != current_hash:
+                    batch.append((pk, content))
+                if len(batch) >= batch_size:
+                    rendered += self.render_batch(pool, batch)
+                    batch = []
+            if batch:
+                rendered += self.render_batch(pool, batch)
+
+        elapsed = time.perf_counter() - started
+        rate = rendered / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {rendered} posts in {elapsed:.2f}s ({rate:.1f} posts/s).'
+        ))
+
+    def render_batch(self, pool, batch):
+        posts = [
+            BlogPost(pk=pk, content_hash=content_hash, content_html=content_html)
+            for pk, content_hash, content_html in pool.map(render_item, batch, chunksize=16)
+        ]
+        BlogPost.objects.bulk_update(posts, ['content_html', 'content_hash'])
+        return len(posts)
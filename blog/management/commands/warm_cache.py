@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from moyinji import warm
+
+# 只在当前进程内有效的缓存后端，从命令中预热对 web 进程没有作用
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the page, list, detail and album caches by requesting every public page, '
+        'most viewed first, with bounded concurrency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*',
+            help='Only warm these page paths, e.g. / /blog/?tag=lake (default: every page)',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Pages requested at the same time (default 4)',
+        )
+        parser.add_argument(
+            '--limit', type=int, default=None,
+            help='Only warm this many pages from the top of the priority order',
+        )
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be at least 1.')
+        if settings.CACHES['default']['BACKEND'] in PROCESS_LOCAL_BACKENDS:
+            self.stdout.write(self.style.WARNING(
+                'The default cache is local to this process; warming it does not help the web workers.'
+            ))
+
+        paths = options['paths'] or warm.warm_pages(options['limit'])
+        stats = warm.warm(paths, concurrency=options['concurrency'])
+
+        for error in stats.errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'Warmed {stats.pages} pages in {stats.elapsed:.2f}s: wrote {stats.keys} keys '
+            f'({stats.keys_per_second:.1f} keys/s), {stats.bytes / 1024:.1f} KiB, {len(stats.errors)} errors.'
+        ))
+        if stats.errors:
+            raise CommandError(f'{len(stats.errors)} pages failed to warm.')
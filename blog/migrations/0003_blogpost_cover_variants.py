@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_blogpost_content_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='cover_variants',
+            field=models.JSONField(blank=True, editable=False, null=True, verbose_name='封面响应式图片清单'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_blogpost_cover_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='blog.blogpost')),
+                ('length', models.PositiveIntegerField(verbose_name='词数')),
+                ('digest', models.CharField(max_length=64, verbose_name='索引内容哈希')),
+            ],
+            options={
+                'verbose_name': '索引文档',
+                'verbose_name_plural': '索引文档',
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=32, unique=True, verbose_name='索引词')),
+                ('doc_freq', models.PositiveIntegerField(default=0, verbose_name='文档频率')),
+            ],
+            options={
+                'verbose_name': '索引词',
+                'verbose_name_plural': '索引词',
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weight', models.FloatField(verbose_name='权重')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_postings', to='blog.blogpost')),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='postings', to='blog.searchterm')),
+            ],
+            options={
+                'verbose_name': '倒排项',
+                'verbose_name_plural': '倒排项',
+                'indexes': [models.Index(fields=['term', '-weight'], name='blog_searchposting_impact')],
+                'constraints': [models.UniqueConstraint(fields=('term', 'post'), name='blog_searchposting_term_post')],
+            },
+        ),
+    ]
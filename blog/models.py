@@ -2,6 +2,8 @@ from django.db import models
 from django.urls import reverse
 from django.utils.text import slugify
 
+from .rendering import content_digest, render_markdown
+
 
 class Category(models.Model):
     """文章分类"""
@@ -41,6 +43,25 @@ class Tag(models.Model):
         return reverse('blog:tag', kwargs={'slug': self.slug})
 
 
+class BlogPostQuerySet(models.QuerySet):
+    """文章查询集"""
+
+    # 文章卡片（列表、首页、相关文章）用到的字段
+    CARD_FIELDS = (
+        'title', 'slug', 'cover_image', 'cover_variants', 'excerpt', 'created_at', 'updated_at',
+        'category__name', 'category__slug',
+    )
+
+    def published(self):
+        return self.filter(is_published=True)
+
+    def cards(self):
+        """只取卡片需要的字段，并一次性带出分类和标签"""
+        return self.select_related('category').prefetch_related(
+            models.Prefetch('tags', queryset=Tag.objects.only('name', 'slug'))
+        ).only(*self.CARD_FIELDS)
+
+
 class BlogPost(models.Model):
     """博客文章"""
     CATEGORY_CHOICES = [
@@ -53,7 +74,10 @@ class BlogPost(models.Model):
     title = models.CharField(max_length=200, verbose_name='标题')
     slug = models.SlugField(unique=True, verbose_name='URL别名')
     cover_image = models.ImageField(upload_to="covers/", verbose_name='封面图')
+    cover_variants = models.JSONField(null=True, blank=True, editable=False, verbose_name='封面响应式图片清单')
     content = models.TextField(verbose_name='内容（Markdown）')
+    content_html = models.TextField(blank=True, editable=False, verbose_name='渲染后的内容')
+    content_hash = models.CharField(max_length=64, blank=True, editable=False, verbose_name='内容哈希')
     excerpt = models.TextField(max_length=300, blank=True, verbose_name='摘要')
     category = models.ForeignKey(
         Category,
@@ -70,10 +94,26 @@ class BlogPost(models.Model):
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
     view_count = models.PositiveIntegerField(default=0, verbose_name='浏览次数')
 
+    objects = BlogPostQuerySet.as_manager()
+
     class Meta:
         verbose_name = '文章'
         verbose_name_plural = '文章'
         ordering = ['-created_at']
+        indexes = [
+            # 已发布文章按 (-created_at, -id) 翻页：首页、列表页、API
+            models.Index(
+                fields=['-created_at', '-id'],
+                condition=models.Q(is_published=True),
+                name='blog_post_published_recent',
+            ),
+            # 分类筛选后同样按时间翻页
+            models.Index(
+                fields=['category', '-created_at', '-id'],
+                condition=models.Q(is_published=True),
+                name='blog_post_category_recent',
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -81,7 +121,86 @@ class BlogPost(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
+        self.render_content()
         super().save(*args, **kwargs)
 
     def get_absolute_url(self):
         return reverse('blog:detail', kwargs={'slug': self.slug})
+
+    def render_content(self):
+        """内容哈希变化时重新渲染 Markdown，返回是否重新渲染"""
+        digest = content_digest(self.content)
+        if digest == self.content_hash:
+            return False
+        self.content_html = render_markdown(self.content)
+        self.content_hash = digest
+        return True
+
+    def get_content_html(self):
+        """渲染后的内容；经 QuerySet.update() 等绕过 save() 修改过的文章在首次读取时补渲染"""
+        if self.render_content() and self.pk:
+            BlogPost.objects.filter(pk=self.pk).update(
+                content_html=self.content_html,
+                content_hash=self.content_hash,
+            )
+        return self.content_html
+
+
+class SearchTerm(models.Model):
+    """搜索词典：索引词及包含它的文章数"""
+    term = models.CharField(max_length=32, unique=True, verbose_name='索引词')
+    doc_freq = models.PositiveIntegerField(default=0, verbose_name='文档频率')
+
+    class Meta:
+        verbose_name = '索引词'
+        verbose_name_plural = '索引词'
+
+    def __str__(self):
+        return self.term
+
+
+class SearchPosting(models.Model):
+    """倒排表：索引词在文章中的权重"""
+    term = models.ForeignKey(SearchTerm, on_delete=models.CASCADE, related_name='postings')
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='search_postings')
+    weight = models.FloatField(verbose_name='权重')
+
+    class Meta:
+        verbose_name = '倒排项'
+        verbose_name_plural = '倒排项'
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'post'], name='blog_searchposting_term_post'),
+        ]
+        indexes = [
+            # 按权重从高到低读取某个词的倒排项，常见词只取前若干篇作为候选
+            models.Index(fields=['term', '-weight'], name='blog_searchposting_impact'),
+        ]
+
+
+class SearchDocument(models.Model):
+    """已索引的文章及其索引内容的哈希，内容未变时跳过重建"""
+    post = models.OneToOneField(
+        BlogPost, on_delete=models.CASCADE, primary_key=True, related_name='search_document'
+    )
+    length = models.PositiveIntegerField(verbose_name='词数')
+    digest = models.CharField(max_length=64, verbose_name='索引内容哈希')
+
+    class Meta:
+        verbose_name = '索引文档'
+        verbose_name_plural = '索引文档'
+
+
+class RelatedPost(models.Model):
+    """预先计算的相关文章，由 blog.related 维护"""
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='related_by')
+    rank = models.PositiveSmallIntegerField(verbose_name='排序')
+    score = models.FloatField(verbose_name='相似度')
+
+    class Meta:
+        verbose_name = '相关文章'
+        verbose_name_plural = '相关文章'
+        constraints = [
+            # 同时作为详情页按文章读取相关列表的索引
+            models.UniqueConstraint(fields=['post', 'rank'], name='blog_relatedpost_post_rank'),
+        ]
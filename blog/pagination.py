@@ -0,0 +1,123 @@
+"""
+基于游标（keyset）的分页
+
+按 (created_at, id) 倒序翻页，游标记录当前页边界文章的这两个值。
+每一页都是一次带范围条件的 LIMIT 查询，翻到多深都和第一页开销相同，
+不会像 OFFSET 分页那样扫描并丢弃前面所有的行。
+"""
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    """游标格式错误"""
+
+
+def encode_cursor(created_at, pk):
+    """将 (created_at, id) 编码为 URL 安全的游标字符串"""
+    raw = f'{created_at.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解析游标，返回 (created_at, id)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        timestamp, pk = raw.rsplit('|', 1)
+        created_at = parse_datetime(timestamp)
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidCursor(cursor)
+    if created_at is None:
+        raise InvalidCursor(cursor)
+    return created_at, pk
+
+
+class KeysetPage:
+    """一页结果及前后页游标"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator:
+    """按 (-created_at, -id) 对 QuerySet 进行游标分页"""
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    def page(self, after=None, before=None):
+        """
+        获取一页数据
+
+        Args:
+            after: 返回该游标之后（更旧）的文章
+            before: 返回该游标之前（更新）的文章
+
+        Raises:
+            InvalidCursor: 游标无法解析时
+        """
+        queryset = self._window(after, before)
+        return self._page(list(queryset), after, before)
+
+    async def apage(self, after=None, before=None):
+        """page 的异步版本"""
+        queryset = self._window(after, before)
+        return self._page([row async for row in queryset], after, before)
+
+    def _window(self, after, before):
+        """本页加一行（用于判断是否还有下一页）的查询"""
+        if before:
+            created_at, pk = decode_cursor(before)
+            return self.queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+            ).order_by('created_at', 'id')[:self.per_page + 1]
+
+        queryset = self.queryset.order_by('-created_at', '-id')
+        if after:
+            created_at, pk = decode_cursor(after)
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            )
+        return queryset[:self.per_page + 1]
+
+    def _page(self, rows, after, before):
+        if before:
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next = True
+        else:
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = bool(after)
+
+        if not rows:
+            return KeysetPage(rows)
+
+        first, last = rows[0], rows[-1]
+        return KeysetPage(
+            rows,
+            next_cursor=encode_cursor(last.created_at, last.pk) if has_next else None,
+            previous_cursor=encode_cursor(first.created_at, first.pk) if has_previous else None,
+        )
@@ -0,0 +1,277 @@
+"""
+相关文章
+
+每篇已发布文章预先算好最相似的 ``RELATED_COUNT`` 篇，保存在
+``RelatedPost`` 表中，详情页按 (post, rank) 索引一次读出。相似度为
+
+    score = Jaccard(标签集合) + CATEGORY_WEIGHT × [分类相同且不为空]
+
+得分相同时发布时间更接近的文章优先，得分为 0（既无共同标签、分类也
+不同或为空）的文章不算相关。
+
+标签集合很稀疏，按标签的倒排表只需遍历与当前文章有共同标签的文章，
+不必两两比较；同分类但无共同标签的文章得分都相同，只需从按时间排序的
+分类列表中向两侧取最近的几篇。
+
+全量计算由 ``rebuild_related_posts`` 命令完成。文章、标签或分类变化后
+由 ``refresh()`` 增量更新：只重算该文章本身、列表中原本包含它的文章，
+以及与它有共同标签或分类、可能因此把它排进列表的文章，并且只写回
+结果确有变化的列表。增量更新只读出这些文章及其相邻的文章（有共同
+标签或分类），不读出全部文章。
+"""
+import bisect
+import heapq
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+
+from moyinji.generations import bump
+
+from .models import BlogPost, RelatedPost
+
+RELATED_COUNT = 3
+CATEGORY_WEIGHT = 0.3
+
+
+class _Post:
+    __slots__ = ('id', 'slug', 'category_id', 'timestamp', 'tags')
+
+    def __init__(self, id, slug, category_id, created_at):
+        self.id = id
+        self.slug = slug
+        self.category_id = category_id
+        self.timestamp = created_at.timestamp()
+        self.tags = set()
+
+
+class Corpus:
+    """全部已发布文章的分类、发布时间和标签集合"""
+
+    def __init__(self, posts):
+        self.posts = {post.id: post for post in posts}
+        self.by_tag = defaultdict(list)
+        self.by_category = defaultdict(list)
+        for post in self.posts.values():
+            for tag_id in post.tags:
+                self.by_tag[tag_id].append(post.id)
+            if post.category_id:
+                self.by_category[post.category_id].append(post)
+        for members in self.by_category.values():
+            members.sort(key=lambda post: (post.timestamp, post.id))
+        self._timelines = {
+            category_id: [post.timestamp for post in members]
+            for category_id, members in self.by_category.items()
+        }
+
+    @classmethod
+    def load(cls, around=None):
+        """
+        两次查询读出已发布文章及其标签
+
+        Args:
+            around: 只读出这些文章以及与它们有共同标签或分类的文章。这些文章的
+                ``scores``、``neighbours`` 和 ``sharing`` 与全量读出时相同，
+                其余文章只保证自身的分类、发布时间和标签集合完整。默认读出全部文章
+        """
+        published = BlogPost.objects.published()
+        through = BlogPost.tags.through.objects
+        if around is not None:
+            seeds = published.filter(pk__in=around)
+            published = published.filter(
+                Q(pk__in=seeds.values('pk'))
+                | Q(category__in=seeds.values('category_id'))
+                | Q(pk__in=through.filter(
+                    tag__in=through.filter(blogpost__in=seeds.values('pk')).values('tag_id')
+                ).values('blogpost_id'))
+            )
+        posts = {
+            pk: _Post(pk, slug, category_id, created_at)
+            for pk, slug, category_id, created_at in published.values_list(
+                'pk', 'slug', 'category_id', 'created_at'
+            )
+        }
+        for post_id, tag_id in through.filter(blogpost__in=published.values('pk')).values_list(
+            'blogpost_id', 'tag_id'
+        ):
+            posts[post_id].tags.add(tag_id)
+        return cls(posts.values())
+
+    def _nearest_in_category(self, post, exclude):
+        """同分类中发布时间最接近且不在 exclude 中的文章，最多 RELATED_COUNT 篇"""
+        members = self.by_category[post.category_id]
+        position = bisect.bisect_left(self._timelines[post.category_id], post.timestamp)
+        left, right = position - 1, position
+        found = []
+        while len(found) < RELATED_COUNT and (left >= 0 or right < len(members)):
+            before = members[left] if left >= 0 else None
+            after = members[right] if right < len(members) else None
+            if after is None or (
+                before is not None
+                and post.timestamp - before.timestamp <= after.timestamp - post.timestamp
+            ):
+                candidate, left = before, left - 1
+            else:
+                candidate, right = after, right + 1
+            if candidate.id != post.id and candidate.id not in exclude:
+                found.append(candidate)
+        return found
+
+    def score(self, post_id, other_id):
+        """两篇文章的相似度"""
+        post, other = self.posts[post_id], self.posts[other_id]
+        common = len(post.tags & other.tags)
+        score = common / (len(post.tags) + len(other.tags) - common) if common else 0
+        if post.category_id and other.category_id == post.category_id:
+            score += CATEGORY_WEIGHT
+        return score
+
+    def rank_key(self, post_id, other_id, score):
+        """相关文章的排序键：得分高者优先，其次发布时间更接近者"""
+        distance = abs(self.posts[other_id].timestamp - self.posts[post_id].timestamp)
+        return (score, -distance, other_id)
+
+    def scores(self, post_id):
+        """与该文章得分大于 0 的文章，同分类无共同标签的只包含最近的几篇"""
+        post = self.posts[post_id]
+        shared = Counter()
+        for tag_id in post.tags:
+            shared.update(self.by_tag[tag_id])
+        shared.pop(post_id, None)
+
+        scores = {}
+        for other_id, common in shared.items():
+            other = self.posts[other_id]
+            score = common / (len(post.tags) + len(other.tags) - common)
+            if post.category_id and other.category_id == post.category_id:
+                score += CATEGORY_WEIGHT
+            scores[other_id] = score
+        if post.category_id:
+            for other in self._nearest_in_category(post, scores):
+                scores[other.id] = CATEGORY_WEIGHT
+        return scores
+
+    def neighbours(self, post_id):
+        """
+        该文章的相关文章
+
+        Returns:
+            按相关度从高到低的 ``[(文章 id, 得分), ...]``
+        """
+        return heapq.nlargest(
+            RELATED_COUNT,
+            self.scores(post_id).items(),
+            key=lambda item: self.rank_key(post_id, *item),
+        )
+
+    def sharing(self, post_id):
+        """与该文章有共同标签或分类的文章"""
+        post = self.posts[post_id]
+        ids = {other_id for tag_id in post.tags for other_id in self.by_tag[tag_id]}
+        if post.category_id:
+            ids.update(other.id for other in self.by_category[post.category_id])
+        ids.discard(post_id)
+        return ids
+
+
+def _rows(post_id, neighbours):
+    return [
+        RelatedPost(post_id=post_id, related_id=related_id, rank=rank, score=score)
+        for rank, (related_id, score) in enumerate(neighbours)
+    ]
+
+
+def rebuild(batch_size=1000):
+    """
+    全量重建所有文章的相关文章
+
+    Returns:
+        处理的文章数
+    """
+    corpus = Corpus.load()
+    rows = []
+    for post_id in corpus.posts:
+        rows.extend(_rows(post_id, corpus.neighbours(post_id)))
+    with transaction.atomic():
+        RelatedPost.objects.all().delete()
+        RelatedPost.objects.bulk_create(rows, batch_size=batch_size)
+    bump(*(f'blog:detail:{post.slug}' for post in corpus.posts.values()))
+    return len(corpus.posts)
+
+
+def refresh(post_ids):
+    """
+    文章的分类、标签或发布状态变化后增量更新相关文章
+
+    只有两类文章的列表可能变化：原列表中包含变化文章的，以及变化文章
+    现在能排进其列表的（得分超过原列表最后一篇）。其余文章的候选中只有
+    变化文章的得分变了，列表不受影响。
+
+    Args:
+        post_ids: 发生变化的文章，包括已删除或已取消发布的文章
+
+    Returns:
+        列表有变化的文章数
+    """
+    post_ids = set(post_ids)
+    if not post_ids:
+        return 0
+    # 变化文章及与其有共同标签或分类的文章
+    nearby = Corpus.load(around=post_ids)
+    present = post_ids & nearby.posts.keys()
+
+    sharing = set()
+    for post_id in present:
+        sharing.update(nearby.sharing(post_id))
+    sharing -= post_ids
+
+    stored = defaultdict(list)
+    # 被删除的文章随级联删除后，列表的排序会留下空位，需要重写
+    gaps = set()
+    rows = RelatedPost.objects.filter(
+        Q(post_id__in=post_ids | sharing) | Q(related_id__in=post_ids)
+    ).order_by('post_id', 'rank').values_list('post_id', 'related_id', 'score', 'rank')
+    for post_id, related_id, score, rank in rows:
+        if rank != len(stored[post_id]):
+            gaps.add(post_id)
+        stored[post_id].append((related_id, score))
+
+    candidates = {
+        post_id for post_id, entries in stored.items()
+        if any(related_id in post_ids for related_id, _ in entries)
+    }
+    candidates.update(post_ids)
+    for post_id in sharing - candidates:
+        entries = stored.get(post_id, [])
+        if len(entries) < RELATED_COUNT:
+            candidates.add(post_id)
+            continue
+        last_id, last_score = entries[-1]
+        for changed in present:
+            score = nearby.score(post_id, changed)
+            # 列表最后一篇不一定已读出，无法比较发布时间时得分相同也重算
+            if score > last_score or score == last_score and (
+                last_id not in nearby.posts
+                or nearby.rank_key(post_id, changed, score) > nearby.rank_key(post_id, last_id, last_score)
+            ):
+                candidates.add(post_id)
+                break
+
+    # 重算的文章及其相邻文章，得到与全量相同的相关列表
+    corpus = Corpus.load(around=candidates)
+    changed, rows = [], []
+    for post_id in candidates:
+        neighbours = corpus.neighbours(post_id) if post_id in corpus.posts else []
+        if neighbours != stored.get(post_id, []) or post_id in gaps:
+            changed.append(post_id)
+            rows.extend(_rows(post_id, neighbours))
+    if not changed:
+        return 0
+
+    with transaction.atomic():
+        RelatedPost.objects.filter(post_id__in=changed).delete()
+        RelatedPost.objects.bulk_create(rows)
+    bump(*(
+        f'blog:detail:{corpus.posts[post_id].slug}' for post_id in changed if post_id in corpus.posts
+    ))
+    return len(changed)
@@ -0,0 +1,82 @@
+"""
+文章 Markdown 渲染
+
+Markdown 解析器和 bleach 清理器在每个进程（线程）中只构建一次并复用。
+渲染结果按内容哈希保存在 ``BlogPost.content_html``，请求路径上不再解析。
+"""
+import hashlib
+import threading
+
+import bleach
+import markdown
+
+# 渲染配置变化时递增，使已保存的 HTML 全部按哈希失效
+RENDERER_VERSION = 1
+
+MARKDOWN_EXTENSIONS = ['extra', 'sane_lists', 'nl2br']
+
+# 表格对齐使用 align 属性而不是 style，清理时无需放行 CSS
+MARKDOWN_EXTENSION_CONFIGS = {'tables': {'use_align_attribute': True}}
+
+ALLOWED_TAGS = frozenset(bleach.sanitizer.ALLOWED_TAGS) | {
+    'p', 'br', 'hr', 'pre', 'img', 'span', 'div',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'table', 'thead', 'tbody', 'tr', 'th', 'td',
+    'dl', 'dt', 'dd', 'sup', 'sub', 'del',
+}
+
+ALLOWED_ATTRIBUTES = {
+    'a': ['href', 'title', 'rel'],
+    'abbr': ['title'],
+    'img': ['src', 'alt', 'title', 'width', 'height'],
+    'code': ['class'],
+    'th': ['align'],
+    'td': ['align'],
+    'sup': ['id'],
+    'li': ['id'],
+    'div': ['class'],
+}
+
+_local = threading.local()
+
+
+def _get_renderer():
+    """当前线程的 Markdown 解析器与清理器"""
+    renderer = getattr(_local, 'renderer', None)
+    if renderer is None:
+        renderer = (
+            markdown.Markdown(
+                extensions=MARKDOWN_EXTENSIONS,
+                extension_configs=MARKDOWN_EXTENSION_CONFIGS,
+                output_format='html',
+            ),
+            bleach.Cleaner(tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES, strip=True),
+        )
+        _local.renderer = renderer
+    return renderer
+
+
+def content_digest(text):
+    """内容哈希，包含渲染器版本"""
+    return hashlib.sha256(f'{RENDERER_VERSION}:{text}'.encode()).hexdigest()
+
+
+def render_markdown(text):
+    """将 Markdown 渲染为经过清理的 HTML"""
+    md, cleaner = _get_renderer()
+    html = md.reset().convert(text or '')
+    return cleaner.clean(html)
+
+
+def render_item(item):
+    """
+    进程池任务：渲染一篇文章
+
+    Args:
+        item: (pk, content)
+
+    Returns:
+        (pk, content_hash, content_html)
+    """
+    pk, content = item
+    return pk, content_digest(content), render_markdown(content)
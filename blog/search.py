@@ -0,0 +1,378 @@
+"""
+文章全文搜索
+
+倒排索引保存在数据库中（SearchTerm / SearchPosting / SearchDocument），
+不依赖外部搜索服务：
+
+- 分词：中日韩文字没有空格分词，按相邻两字切分（bigram），标题和标签
+  另外保留单字，使单字查询也能命中；拉丁字母和数字按单词切分
+- 权重：各字段词频按字段加权后做 BM25 饱和与长度归一，写入倒排项；
+  查询时乘以 IDF 求和排序，一条聚合查询取出前 MAX_RESULTS 篇
+- 增量维护：文章保存后只增删有变化的倒排项并调整文档频率，
+  索引内容哈希不变时直接跳过
+"""
+import hashlib
+import itertools
+import math
+import re
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import (
+    Avg, Case, Count, F, FloatField, OuterRef, Prefetch, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce
+
+from .models import BlogPost, SearchDocument, SearchPosting, SearchTerm, Tag
+
+# 索引规则变化时递增，所有文章按哈希失效后由 rebuild_search_index 重建
+INDEX_VERSION = 1
+
+# 字段权重
+FIELD_WEIGHTS = {'title': 5.0, 'tags': 3.0, 'excerpt': 2.0, 'content': 1.0}
+
+# BM25 参数
+K1 = 1.2
+B = 0.75
+
+# 一次搜索最多排序返回的文章数
+MAX_RESULTS = 200
+
+# 每次查询参与聚合的候选文章上限
+CANDIDATE_LIMIT = 2000
+
+# 出现在超过这一比例文章中的词几乎不区分文章，查询中还有其他词时忽略
+COMMON_TERM_RATIO = 0.5
+
+# 索引变更时 IN 查询的分批大小
+CHUNK_SIZE = 500
+
+TERM_MAX_LENGTH = SearchTerm._meta.get_field('term').max_length
+
+# 假名、中日韩统一表意文字（含扩展 A 与兼容区）、韩文音节
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+TOKEN_RE = re.compile(f'[{_CJK}]+|[a-z0-9]+')
+CJK_RE = re.compile(f'[{_CJK}]')
+
+AVG_LENGTH_CACHE_KEY = 'blog:search:avg_length'
+DOC_COUNT_CACHE_KEY = 'blog:search:doc_count'
+STATS_TIMEOUT = 60 * 10
+
+
+def tokenize(text, unigrams=False):
+    """
+    切分文本为索引词（可重复）
+
+    Args:
+        unigrams: 中日韩文字是否同时输出单字
+    """
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    for match in TOKEN_RE.finditer(text):
+        token = match.group()
+        if not CJK_RE.match(token):
+            yield token[:TERM_MAX_LENGTH]
+            continue
+        if unigrams or len(token) == 1:
+            yield from token
+        for i in range(len(token) - 1):
+            yield token[i:i + 2]
+
+
+def query_terms(query):
+    """查询词：去重并保持顺序，单字查询只能匹配单字索引词"""
+    return list(dict.fromkeys(tokenize(query)))
+
+
+def document_fields(post, tag_names):
+    return {
+        'title': post.title,
+        'tags': ' '.join(tag_names),
+        'excerpt': post.excerpt,
+        'content': post.content,
+    }
+
+
+def document_digest(fields):
+    raw = '\x00'.join(fields[name] or '' for name in FIELD_WEIGHTS)
+    return hashlib.sha256(f'{INDEX_VERSION}:{raw}'.encode()).hexdigest()
+
+
+def document_weights(fields, avg_length):
+    """
+    计算一篇文章各索引词的权重
+
+    Returns:
+        ({索引词: 权重}, 文档长度)
+    """
+    frequencies = Counter()
+    length = 0
+    for name, field_weight in FIELD_WEIGHTS.items():
+        tokens = list(tokenize(fields[name], unigrams=name in ('title', 'tags')))
+        length += len(tokens)
+        for token in tokens:
+            frequencies[token] += field_weight
+
+    norm = K1 * (1 - B + B * length / max(avg_length, 1))
+    weights = {term: tf * (K1 + 1) / (tf + norm) for term, tf in frequencies.items()}
+    return weights, length
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _term_ids(terms):
+    """索引词到主键的映射，缺失的索引词会被创建"""
+    ids = {}
+    for chunk in _chunks(terms):
+        ids.update(SearchTerm.objects.filter(term__in=chunk).values_list('term', 'id'))
+    missing = [term for term in terms if term not in ids]
+    if missing:
+        SearchTerm.objects.bulk_create(
+            [SearchTerm(term=term) for term in missing], ignore_conflicts=True, batch_size=CHUNK_SIZE
+        )
+        for chunk in _chunks(missing):
+            ids.update(SearchTerm.objects.filter(term__in=chunk).values_list('term', 'id'))
+    return ids
+
+
+def _insert_postings(rows):
+    """
+    批量写入倒排项 (term_id, post_id, weight)
+
+    重建时一次写入数十万行，绕过模型实例化直接 executemany。
+    """
+    table = connection.ops.quote_name(SearchPosting._meta.db_table)
+    sql = f'INSERT INTO {table} (term_id, post_id, weight) VALUES (%s, %s, %s)'
+    rows = iter(rows)
+    with connection.cursor() as cursor:
+        while True:
+            batch = list(itertools.islice(rows, 5000))
+            if not batch:
+                break
+            cursor.executemany(sql, batch)
+
+
+def _adjust_doc_freq(term_ids, delta):
+    for chunk in _chunks(term_ids):
+        SearchTerm.objects.filter(id__in=chunk).update(doc_freq=F('doc_freq') + delta)
+
+
+def average_length():
+    """已索引文章的平均长度，用于 BM25 长度归一"""
+    value = cache.get(AVG_LENGTH_CACHE_KEY)
+    if value is None:
+        value = SearchDocument.objects.aggregate(avg=Avg('length'))['avg'] or 500
+        cache.set(AVG_LENGTH_CACHE_KEY, value, STATS_TIMEOUT)
+    return value
+
+
+def document_count():
+    value = cache.get(DOC_COUNT_CACHE_KEY)
+    if value is None:
+        value = SearchDocument.objects.count()
+        cache.set(DOC_COUNT_CACHE_KEY, value, STATS_TIMEOUT)
+    return value
+
+
+def _load_post(post_id):
+    return (
+        BlogPost.objects.filter(pk=post_id)
+        .only('title', 'excerpt', 'content')
+        .prefetch_related(Prefetch('tags', queryset=Tag.objects.only('name')))
+        .first()
+    )
+
+
+def index_post(post_id):
+    """
+    增量更新一篇文章的索引
+
+    Returns:
+        是否有变化
+    """
+    post = _load_post(post_id)
+    if post is None:
+        return remove_post(post_id)
+
+    fields = document_fields(post, [tag.name for tag in post.tags.all()])
+    digest = document_digest(fields)
+    document = SearchDocument.objects.filter(post_id=post_id).first()
+    if document and document.digest == digest:
+        return False
+
+    weights, length = document_weights(fields, average_length())
+    with transaction.atomic():
+        existing = {
+            term: (posting_id, term_id, weight)
+            for posting_id, term_id, term, weight in SearchPosting.objects.filter(
+                post_id=post_id
+            ).values_list('id', 'term_id', 'term__term', 'weight')
+        }
+        added = [term for term in weights if term not in existing]
+        removed = [existing[term][1] for term in existing if term not in weights]
+
+        if removed:
+            for chunk in _chunks(removed):
+                SearchPosting.objects.filter(post_id=post_id, term_id__in=chunk).delete()
+            _adjust_doc_freq(removed, -1)
+
+        if added:
+            ids = _term_ids(added)
+            SearchPosting.objects.bulk_create(
+                [SearchPosting(term_id=ids[term], post_id=post_id, weight=weights[term]) for term in added],
+                batch_size=CHUNK_SIZE,
+            )
+            _adjust_doc_freq([ids[term] for term in added], 1)
+
+        changed = [
+            SearchPosting(id=posting_id, weight=weights[term])
+            for term, (posting_id, _, weight) in existing.items()
+            if term in weights and abs(weights[term] - weight) > 1e-6
+        ]
+        SearchPosting.objects.bulk_update(changed, ['weight'], batch_size=CHUNK_SIZE)
+
+        SearchDocument.objects.update_or_create(
+            post_id=post_id, defaults={'length': length, 'digest': digest}
+        )
+    cache.delete_many([AVG_LENGTH_CACHE_KEY, DOC_COUNT_CACHE_KEY])
+    return True
+
+
+def remove_post(post_id):
+    """从索引中移除文章，返回是否有变化"""
+    with transaction.atomic():
+        term_ids = list(SearchPosting.objects.filter(post_id=post_id).values_list('term_id', flat=True))
+        deleted, _ = SearchDocument.objects.filter(post_id=post_id).delete()
+        SearchPosting.objects.filter(post_id=post_id).delete()
+        _adjust_doc_freq(term_ids, -1)
+    cache.delete_many([AVG_LENGTH_CACHE_KEY, DOC_COUNT_CACHE_KEY])
+    return bool(deleted or term_ids)
+
+
+def rebuild_index(batch_size=500, progress=None):
+    """
+    清空并重建全部索引
+
+    Returns:
+        已索引的文章数
+    """
+    with transaction.atomic():
+        SearchPosting.objects.all().delete()
+        SearchDocument.objects.all().delete()
+        SearchTerm.objects.all().delete()
+
+    posts = BlogPost.objects.only('title', 'excerpt', 'content').order_by('pk')
+    # 先抽样估计平均长度，重建时所有文章使用同一个值归一
+    sample = [
+        document_weights(document_fields(post, []), 1)[1]
+        for post in posts[:1000]
+    ]
+    avg_length = sum(sample) / len(sample) if sample else 500
+
+    term_ids = {}
+    indexed = 0
+    last_pk = 0
+    while True:
+        batch = list(
+            posts.filter(pk__gt=last_pk).prefetch_related(
+                Prefetch('tags', queryset=Tag.objects.only('name'))
+            )[:batch_size]
+        )
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+
+        documents, batch_weights = [], []
+        for post in batch:
+            fields = document_fields(post, [tag.name for tag in post.tags.all()])
+            weights, length = document_weights(fields, avg_length)
+            documents.append(SearchDocument(post_id=post.pk, length=length, digest=document_digest(fields)))
+            batch_weights.append((post.pk, weights))
+
+        with transaction.atomic():
+            new_terms = {term for _, weights in batch_weights for term in weights} - term_ids.keys()
+            term_ids.update(_term_ids(new_terms))
+            _insert_postings(
+                (term_ids[term], post_id, weight)
+                for post_id, weights in batch_weights
+                for term, weight in weights.items()
+            )
+            SearchDocument.objects.bulk_create(documents, batch_size=CHUNK_SIZE)
+
+        indexed += len(batch)
+        if progress:
+            progress(indexed)
+
+    # 一条 UPDATE 由倒排表统计全部文档频率
+    SearchTerm.objects.update(doc_freq=Coalesce(Subquery(
+        SearchPosting.objects.filter(term=OuterRef('pk'))
+        .values('term').annotate(total=Count('pk')).values('total')
+    ), 0))
+    cache.delete_many([AVG_LENGTH_CACHE_KEY, DOC_COUNT_CACHE_KEY])
+    return indexed
+
+
+@dataclass
+class SearchHit:
+    post_id: int
+    score: float
+
+
+def search(query, published_only=True, limit=MAX_RESULTS):
+    """
+    按相关度搜索文章
+
+    查询中的每个索引词都必须出现（AND），得分为各词权重乘 IDF 之和。
+
+    Returns:
+        按得分降序排列的 SearchHit 列表，最多 limit 条（None 表示不限）
+    """
+    terms = query_terms(query)
+    if not terms:
+        return []
+
+    rows = list(SearchTerm.objects.filter(term__in=terms).values_list('id', 'doc_freq'))
+    if len(rows) < len(terms) or any(doc_freq == 0 for _, doc_freq in rows):
+        # 有词不在索引中，没有文章能包含全部查询词
+        return []
+
+    total = max(document_count(), 1)
+    rows.sort(key=lambda row: row[1])
+    selective = [row for row in rows if row[1] <= total * COMMON_TERM_RATIO]
+    rows = selective or rows[:1]
+
+    idf = {
+        term_id: math.log(1 + (total - doc_freq + 0.5) / (doc_freq + 0.5))
+        for term_id, doc_freq in rows
+    }
+    postings = SearchPosting.objects.filter(term_id__in=idf)
+    if limit is not None:
+        # 结果必然包含最少见的词：按权重取它的前 CANDIDATE_LIMIT 篇作为候选，
+        # 其余词只在候选文章中按 (term, post) 索引查找。最少见的词也出现在
+        # 大量文章中时，聚合开销因此有上限，排序只在权重最高的候选中进行。
+        # 不限条数时（如后台搜索）需要完整结果，不截断候选
+        candidates = SearchPosting.objects.filter(term_id=rows[0][0]).order_by('-weight')
+        postings = postings.filter(post_id__in=candidates.values('post_id')[:CANDIDATE_LIMIT])
+    if published_only:
+        postings = postings.filter(post__is_published=True)
+    score = Sum(Case(
+        *[When(term_id=term_id, then=F('weight') * Value(weight)) for term_id, weight in idf.items()],
+        output_field=FloatField(),
+    ))
+    ranked = (
+        postings.values('post_id')
+        .annotate(matched=Count('term_id'), score=score)
+        .filter(matched=len(idf))
+        .order_by('-score', '-post_id')[:limit]
+    )
+    return [SearchHit(row['post_id'], row['score']) for row in ranked]
+
+
+def search_ids(query, published_only=True, limit=MAX_RESULTS):
+    return [hit.post_id for hit in search(query, published_only, limit)]
@@ -0,0 +1,64 @@
+"""
+博客 API 的序列化器
+"""
+from moyinji.api import Field, RecordSerializer, attr, datetime_attr, tags_prefetch
+
+from .models import Tag
+
+
+def _category(post, serializer):
+    category = post.category
+    return {'name': category.name, 'slug': category.slug} if category else None
+
+
+def _cover_url(post, serializer):
+    return serializer.absolute_url(post.cover_image.url) if post.cover_image else None
+
+
+class CategorySerializer(RecordSerializer):
+    FIELDS = {
+        'id': attr('id'),
+        'name': attr('name'),
+        'slug': attr('slug'),
+        'description': attr('description'),
+        'order': attr('order'),
+    }
+
+
+class TagSerializer(RecordSerializer):
+    FIELDS = {
+        'id': attr('id'),
+        'name': attr('name'),
+        'slug': attr('slug'),
+    }
+
+
+class PostSerializer(RecordSerializer):
+    FIELDS = {
+        'id': attr('id'),
+        'slug': attr('slug'),
+        'title': attr('title'),
+        'url': Field(
+            lambda post, s: s.absolute_url(post.get_absolute_url()), columns=('slug',)
+        ),
+        'cover_url': Field(_cover_url, columns=('cover_image',)),
+        'excerpt': attr('excerpt'),
+        'category': Field(
+            _category,
+            columns=('category__name', 'category__slug'),
+            related=('category',),
+        ),
+        'tags': Field(
+            lambda post, s: [{'name': tag.name, 'slug': tag.slug} for tag in post.tags.all()],
+            prefetch=(tags_prefetch(Tag),),
+        ),
+        'is_photography': attr('is_photography'),
+        'created_at': datetime_attr('created_at'),
+        'updated_at': datetime_attr('updated_at'),
+        'content_html': Field(
+            lambda post, s: post.get_content_html(),
+            columns=('content', 'content_html', 'content_hash'),
+        ),
+    }
+    # 列表默认不输出正文，需要时用 ?fields= 显式请求
+    LIST_FIELDS = [name for name in FIELDS if name != 'content_html']
@@ -1,43 +1,266 @@
-from django.db.models.signals import post_save, post_delete
+import math
+
+from django.db.models import Q, Sum
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
-from django.core.cache import cache
-from .models import BlogPost, Category, Tag
+from django.urls import reverse
+from moyinji import publish, variants, warm
+from moyinji.generations import bump
+from . import search, tasks
+from .models import BlogPost, Category, RelatedPost, Tag
+
+
+def post_namespaces(post):
+    """文章会出现的缓存命名空间：详情页、全部列表、所属分类和标签列表"""
+    namespaces = [f'blog:detail:{post.slug}', 'blog:list']
+    if post.category_id:
+        namespaces.append(f'blog:category:{post.category.slug}')
+    namespaces.extend(
+        f'blog:tag:{slug}' for slug in post.tags.values_list('slug', flat=True)
+    )
+    return namespaces
+
+
+# 封面保存后在后台生成响应式变体，完成后失效文章所在的缓存
+variants.register(BlogPost, 'cover_image', 'cover_variants', post_namespaces)
+
+
+def filter_pages():
+    """文章列表及各分类、标签的第一页"""
+    list_url = reverse('blog:list')
+    return [
+        list_url,
+        *(f'{list_url}?category={slug}' for slug in Category.objects.values_list('slug', flat=True)),
+        *(f'{list_url}?tag={slug}' for slug in Tag.objects.values_list('slug', flat=True)),
+    ]
+
+
+def published_pages():
+    """静态发布的博客页面：列表及各分类、标签的第一页，全部已发布文章"""
+    return filter_pages() + [
+        reverse('blog:detail', kwargs={'slug': slug})
+        for slug in BlogPost.objects.published().values_list('slug', flat=True)
+    ]
+
+
+def namespace_pages(namespace):
+    """命名空间失效后需要重新发布的页面"""
+    list_url = reverse('blog:list')
+    if namespace == 'blog:list':
+        return [list_url]
+    if namespace == 'blog:filters':
+        # 分类和标签筛选器出现在每个列表页中，只需分类和标签的 slug，不涉及文章
+        return filter_pages()
+    kind, _, slug = namespace.removeprefix('blog:').partition(':')
+    if kind == 'detail':
+        return [reverse('blog:detail', kwargs={'slug': slug})]
+    if kind in ('category', 'tag'):
+        return [f'{list_url}?{kind}={slug}']
+    return []
+
+
+# 内容变化后重新发布受影响的静态页面
+publish.register(published_pages, namespace_pages)
+
+
+def warm_pages():
+    """缓存预热的博客页面：列表页最先，分类和标签按其文章的浏览次数之和，文章按浏览次数"""
+    list_url = reverse('blog:list')
+    pages = [(math.inf, list_url)]
+    views = Sum('posts__view_count', filter=Q(posts__is_published=True))
+    for model, param in ((Category, 'category'), (Tag, 'tag')):
+        pages.extend(
+            (total or 0, f'{list_url}?{param}={slug}')
+            for slug, total in model.objects.annotate(views=views).values_list('slug', 'views')
+        )
+    pages.extend(
+        (count, reverse('blog:detail', kwargs={'slug': slug}))
+        for slug, count in BlogPost.objects.published().values_list('slug', 'view_count')
+    )
+    return pages
+
+
+warm.register(warm_pages)
+
+
+@receiver(pre_save, sender=BlogPost)
+def remember_previous_post_state(sender, instance, **kwargs):
+    """记录修改前的 slug 和分类，以便同时失效旧的命名空间"""
+    instance._previous_namespaces = []
+    if instance.pk:
+        previous = BlogPost.objects.filter(pk=instance.pk).values(
+            'slug', 'category__slug'
+        ).first()
+        if previous:
+            instance._previous_namespaces = [f'blog:detail:{previous["slug"]}']
+            if previous['category__slug']:
+                instance._previous_namespaces.append(f'blog:category:{previous["category__slug"]}')
+
+
+@receiver(pre_delete, sender=BlogPost)
+def remember_deleted_post_state(sender, instance, **kwargs):
+    """删除前记录标签，post_delete 时关联已被清除"""
+    instance._previous_namespaces = post_namespaces(instance)
 
 
 @receiver(post_save, sender=BlogPost)
 @receiver(post_delete, sender=BlogPost)
 def clear_blog_post_cache(sender, instance, **kwargs):
     """清除文章相关缓存"""
-    # 清除文章详情缓存
-    cache.delete(f'blog:detail:{instance.slug}')
+    bump(*post_namespaces(instance), *getattr(instance, '_previous_namespaces', []))
 
-    # 清除文章列表缓存（需要清除所有可能的组合）
-    cache.delete_pattern('blog:list:*')
 
-    # 如果文章有分类，清除该分类相关的缓存
-    if instance.category:
-        cache.delete_pattern(f'blog:list:category:{instance.category.slug}:*')
+@receiver(post_save, sender=BlogPost)
+def clear_referring_posts_cache(sender, instance, created, **kwargs):
+    """其他文章的相关文章中有本文的卡片（标题、封面），一并失效这些详情页"""
+    if created:
+        return
+    slugs = RelatedPost.objects.filter(related=instance).values_list('post__slug', flat=True)
+    namespaces = [f'blog:detail:{slug}' for slug in slugs]
+    if namespaces:
+        bump(*namespaces)
+
 
-    # 清除所有标签相关的缓存
-    for tag in instance.tags.all():
-        cache.delete_pattern(f'blog:list:tag:{tag.slug}:*')
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def clear_post_tags_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    """文章标签变化时清除受影响的列表"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    if reverse:
+        # instance 为标签，pk_set 为文章
+        if action == 'pre_clear':
+            posts = instance.posts.all()
+        else:
+            posts = BlogPost.objects.filter(pk__in=pk_set)
+        namespaces = [f'blog:tag:{instance.slug}']
+        for post in posts.select_related('category'):
+            namespaces.extend(post_namespaces(post))
+        bump(*namespaces)
+        return
+
+    if action == 'pre_clear':
+        changed = list(instance.tags.values_list('slug', flat=True))
+    else:
+        changed = list(Tag.objects.filter(pk__in=pk_set).values_list('slug', flat=True))
+    bump(*post_namespaces(instance), *(f'blog:tag:{slug}' for slug in changed))
 
 
 @receiver(post_save, sender=Category)
 @receiver(post_delete, sender=Category)
 def clear_category_cache(sender, instance, **kwargs):
     """清除分类相关缓存"""
-    # 清除包含该分类的所有文章列表缓存
-    cache.delete_pattern(f'blog:list:category:{instance.slug}:*')
-    # 清除文章列表缓存
-    cache.delete_pattern('blog:list:*')
+    # 分类列表出现在所有文章列表的筛选器中
+    bump('blog:filters', f'blog:category:{instance.slug}')
 
 
 @receiver(post_save, sender=Tag)
 @receiver(post_delete, sender=Tag)
 def clear_tag_cache(sender, instance, **kwargs):
     """清除标签相关缓存"""
-    # 清除包含该标签的所有文章列表缓存
-    cache.delete_pattern(f'blog:list:tag:{instance.slug}:*')
-    # 清除文章列表缓存
-    cache.delete_pattern('blog:list:*')
+    # 标签列表出现在所有文章列表的筛选器中
+    bump('blog:filters', f'blog:tag:{instance.slug}')
+
+
+def reindex_on_commit(post_ids):
+    """事务提交后在后台增量更新这些文章的搜索索引"""
+    post_ids = sorted(set(post_ids))
+    if post_ids:
+        tasks.reindex_posts.enqueue(post_ids)
+
+
+@receiver(post_save, sender=BlogPost)
+def update_search_index(sender, instance, **kwargs):
+    reindex_on_commit([instance.pk])
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def update_search_index_for_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        reindex_on_commit([instance.pk])
+    elif action != 'post_clear':
+        reindex_on_commit(pk_set)
+
+
+@receiver(pre_delete, sender=BlogPost)
+def remove_from_search_index(sender, instance, **kwargs):
+    # 倒排项随文章级联删除前先调整文档频率
+    search.remove_post(instance.pk)
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_tagged_posts(sender, instance, **kwargs):
+    instance._tagged_post_ids = list(instance.posts.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def update_search_index_for_tag(sender, instance, created=False, **kwargs):
+    """标签改名或删除后，重建带有该标签的文章的索引"""
+    if created:
+        return
+    post_ids = getattr(instance, '_tagged_post_ids', None)
+    if post_ids is None:
+        post_ids = instance.posts.values_list('pk', flat=True)
+    reindex_on_commit(post_ids)
+
+
+def refresh_related_on_commit(post_ids):
+    """事务提交后在后台增量更新相关文章"""
+    post_ids = sorted(set(post_ids))
+    if post_ids:
+        tasks.refresh_related.enqueue(post_ids)
+
+
+@receiver(post_save, sender=BlogPost)
+def update_related_posts(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {'category', 'is_published', 'created_at'} & set(update_fields):
+        return
+    refresh_related_on_commit([instance.pk])
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def update_related_posts_for_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # 清空后无法再得知受影响的文章
+        instance._cleared_post_ids = list(instance.posts.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        refresh_related_on_commit([instance.pk])
+    elif action == 'post_clear':
+        refresh_related_on_commit(getattr(instance, '_cleared_post_ids', []))
+    else:
+        refresh_related_on_commit(pk_set)
+
+
+@receiver(pre_delete, sender=BlogPost)
+def remember_referring_posts(sender, instance, **kwargs):
+    # 指向它的相关记录会随文章级联删除，先记下需要补位的文章
+    instance._referring_post_ids = list(
+        RelatedPost.objects.filter(related=instance).values_list('post_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=BlogPost)
+def update_related_posts_on_delete(sender, instance, **kwargs):
+    refresh_related_on_commit(getattr(instance, '_referring_post_ids', []))
+
+
+@receiver(post_delete, sender=Tag)
+def update_related_posts_for_tag(sender, instance, **kwargs):
+    refresh_related_on_commit(getattr(instance, '_tagged_post_ids', []))
+
+
+@receiver(pre_delete, sender=Category)
+def remember_category_posts(sender, instance, **kwargs):
+    # 文章的分类会被置空，但不会触发文章的 post_save
+    instance._category_post_ids = list(instance.posts.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def update_related_posts_for_category(sender, instance, **kwargs):
+    refresh_related_on_commit(getattr(instance, '_category_post_ids', []))
@@ -0,0 +1,24 @@
+"""博客的后台任务"""
+from taskqueue.queue import task
+
+from . import related, search
+from .counters import flush_view_counts, get_flush_interval
+
+
+@task
+def reindex_posts(post_ids):
+    """增量更新这些文章的搜索索引"""
+    for pk in post_ids:
+        search.index_post(pk)
+
+
+@task
+def refresh_related(post_ids):
+    """增量更新这些文章变化后受影响的相关文章"""
+    related.refresh(post_ids)
+
+
+@task(every=get_flush_interval)
+def flush_views():
+    """周期任务：把缓冲的浏览次数写回数据库"""
+    flush_view_counts()
@@ -1,3 +1,1300 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import Http404
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from moyinji.generations import GENERATION_TIMEOUT, bump, generation_token, get_generations
+from moyinji.local_cache import local_cache
+from moyinji.metrics import collector
+from moyinji.queryplan import QueryPlanRecorder
+from moyinji import publish, warm
+from moyinji.stale_cache import get_or_build
+from moyinji.viewmodels import dumps, layout_version, loads
+
+from .counters import _local_counter, flush_view_counts
+from . import related, search
+from .models import BlogPost, Category, RelatedPost, SearchTerm, Tag
+from .pagination import KeysetPaginator
+from .viewmodels import CategoryRef, PostCard, PostDetail, TagRef
+from .views import detail_cache_key
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'blog-tests',
+    }
+}
+
+DUMMY_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    }
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES, VIEW_COUNT_FLUSH_INTERVAL=3600)
+class ViewCounterTest(TestCase):
+    """浏览次数写缓冲测试"""
+
+    def setUp(self):
+        cache.clear()
+        _local_counter.reset()
+        self.post = BlogPost.objects.create(
+            title='春日西湖',
+            slug='spring-west-lake',
+            content='三月春风拂面',
+        )
+        self.url = reverse('blog:detail', kwargs={'slug': self.post.slug})
+
+    def test_cached_detail_does_not_query_database(self):
+        """测试缓存命中时不访问数据库"""
+        self.client.get(self.url)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+
+        self.assertContains(response, '阅读 2')
+
+    def test_flush_writes_buffered_counts(self):
+        """测试批量写回缓冲的浏览次数"""
+        for _ in range(3):
+            self.client.get(self.url)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.view_count, 0)
+
+        with self.assertNumQueries(3):  # SAVEPOINT + UPDATE + RELEASE
+            flushed = flush_view_counts()
+
+        self.assertEqual(flushed, 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.view_count, 3)
+
+    def test_live_count_survives_flush_and_cache_rebuild(self):
+        """测试写回并重建缓存后展示值保持连续"""
+        self.client.get(self.url)
+        self.client.get(self.url)
+        flush_view_counts()
+        cache.clear()
+
+        response = self.client.get(self.url)
+
+        self.assertContains(response, '阅读 3')
+
+
+@override_settings(CACHES=LOCMEM_CACHES, BLOG_PAGE_SIZE=2)
+class KeysetPaginationTest(TestCase):
+    """游标分页测试"""
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='随笔', slug='essay')
+        for i in range(5):
+            BlogPost.objects.create(
+                title=f'文章{i}',
+                slug=f'post-{i}',
+                content='内容',
+                category=self.category if i % 2 == 0 else None,
+            )
+        # 相同的创建时间，依靠 id 决定顺序
+        BlogPost.objects.update(created_at=timezone.now())
+
+    def test_pages_walk_forward_and_backward_without_gaps(self):
+        """测试前后翻页覆盖全部文章且不重复"""
+        paginator = KeysetPaginator(BlogPost.objects.all(), per_page=2)
+
+        pages = [paginator.page()]
+        while pages[-1].has_next:
+            pages.append(paginator.page(after=pages[-1].next_cursor))
+
+        titles = [[post.title for post in page] for page in pages]
+        self.assertEqual(titles, [['文章4', '文章3'], ['文章2', '文章1'], ['文章0']])
+
+        previous = paginator.page(before=pages[-1].previous_cursor)
+        self.assertEqual([post.title for post in previous], ['文章2', '文章1'])
+
+    def test_deep_page_costs_same_queries_as_first(self):
+        """测试深页和第一页查询次数相同"""
+        url = reverse('blog:list')
+        next_url = self.client.get(url).context['next_url']
+        cache.clear()
+
+        with self.assertNumQueries(4):
+            self.client.get(url)
+        cache.clear()
+        with self.assertNumQueries(4):
+            response = self.client.get(url + next_url)
+
+        self.assertContains(response, '文章2')
+        self.assertNotContains(response, '文章4')
+
+    def test_category_filter_is_paginated(self):
+        """测试分类筛选后分页"""
+        response = self.client.get(reverse('blog:list'), {'category': 'essay'})
+
+        self.assertEqual([post.title for post in response.context['posts']], ['文章4', '文章2'])
+        self.assertIn('category=essay', response.context['next_url'])
+
+    def test_invalid_cursor_returns_404(self):
+        """测试无效游标返回404"""
+        response = self.client.get(reverse('blog:list'), {'after': 'not-a-cursor'})
+
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CACHES=DUMMY_CACHES, VIEW_COUNT_FLUSH_INTERVAL=3600)
+class QueryBudgetTest(TestCase):
+    """页面查询次数不随数据量增长"""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='山水意境', slug='landscape')
+        self.tags = [Tag.objects.create(name=f'标签{i}', slug=f'tag-{i}') for i in range(3)]
+        self.count = 0
+
+    def create_posts(self, n):
+        for _ in range(n):
+            self.count += 1
+            with self.captureOnCommitCallbacks(execute=True):
+                post = BlogPost.objects.create(
+                    title=f'文章{self.count}',
+                    slug=f'post-{self.count}',
+                    content='内容',
+                    category=self.category,
+                )
+                post.tags.set(self.tags)
+        return post
+
+    def assertQueryBudget(self, url, budget):
+        """分别在少量和较多数据下请求，查询次数都应等于 budget"""
+        self.create_posts(2)
+        with self.assertNumQueries(budget):
+            self.client.get(url)
+        self.create_posts(10)
+        with self.assertNumQueries(budget):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_blog_list_query_budget(self):
+        """测试文章列表页：文章、标签、分类、全部标签"""
+        self.assertQueryBudget(reverse('blog:list'), 4)
+
+    def test_blog_list_tag_filter_query_budget(self):
+        """测试标签筛选页：多一次标签查询"""
+        self.assertQueryBudget(reverse('blog:list') + '?tag=tag-0', 5)
+
+    def test_blog_detail_query_budget(self):
+        """测试文章详情页：文章、标签、相关文章及其标签"""
+        post = self.create_posts(1)
+        self.assertQueryBudget(post.get_absolute_url(), 4)
+
+    def test_home_query_budget(self):
+        """测试首页：最新文章及其标签、精选相册"""
+        self.assertQueryBudget(reverse('home'), 3)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, VIEW_COUNT_FLUSH_INTERVAL=3600)
+class ViewModelCacheTest(TestCase):
+    """缓存中保存视图模型而非 ORM 对象"""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='山水意境', slug='landscape')
+        tag = Tag.objects.create(name='风光', slug='fengguang')
+        for i in range(3):
+            with self.captureOnCommitCallbacks(execute=True):
+                post = BlogPost.objects.create(
+                    title=f'文章{i}', slug=f'post-{i}', content='内容', category=category,
+                )
+                post.tags.add(tag)
+
+    def test_cached_list_renders_without_queries(self):
+        """测试列表页缓存命中时渲染不触发查询"""
+        url = reverse('blog:list') + '?tag=fengguang'
+        self.client.get(url)
+
+        # 无关的查询参数不影响缓存键
+        with self.assertNumQueries(0):
+            response = self.client.get(url + '&utm_source=feed')
+
+        self.assertContains(response, '#风光')
+        self.assertContains(response, '山水意境')
+
+    def test_cached_detail_round_trips_fields(self):
+        """测试详情页缓存还原后字段完整"""
+        url = reverse('blog:detail', kwargs={'slug': 'post-0'})
+        first = self.client.get(url)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+
+        post = second.context['post']
+        self.assertEqual(post.title, '文章0')
+        self.assertEqual(post.category.slug, 'landscape')
+        self.assertEqual([tag.slug for tag in post.tags], ['fengguang'])
+        self.assertEqual(post.created_at, first.context['post'].created_at)
+        self.assertEqual(len(second.context['related_posts']), 2)
+
+    def test_old_layout_is_never_unpacked(self):
+        """测试字段改名后旧布局的缓存条目不会按新字段解包"""
+        class OldPostDetail(PostCard):
+            FIELDS = PostCard.FIELDS + ('slug', 'content', 'is_photography', 'view_count')
+
+        OldPostDetail.__qualname__ = PostDetail.__qualname__
+        self.assertNotEqual(
+            layout_version(OldPostDetail, PostCard, CategoryRef, TagRef),
+            layout_version(PostDetail, PostCard, CategoryRef, TagRef),
+        )
+
+        # 旧版本写入的条目：同一位置保存的是未经清洗的原始内容
+        url = reverse('blog:detail', kwargs={'slug': 'post-0'})
+        self.client.get(url)
+        key = detail_cache_key('post-0')[0]
+        value, *rest = cache.get(key)
+        data = loads(value)
+        data['post'][PostDetail.FIELDS.index('content_html')] = '<script>alert(1)</script>'
+        cache.set(key.rpartition(':v')[0] + ':v2', (dumps(data), *rest))
+        cache.delete(key)
+
+        response = self.client.get(url)
+        self.assertNotContains(response, '<script>alert(1)</script>')
+        self.assertContains(response, '<p>内容</p>')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GenerationInvalidationTest(TestCase):
+    """基于代数的缓存失效"""
+
+    def setUp(self):
+        cache.clear()
+        self.landscape = Category.objects.create(name='山水意境', slug='landscape')
+        self.essay = Category.objects.create(name='随笔', slug='essay')
+        self.tag = Tag.objects.create(name='风光', slug='fengguang')
+        self.post = BlogPost.objects.create(
+            title='春日西湖', slug='spring', content='内容', category=self.landscape,
+        )
+
+    def test_post_save_bumps_only_its_namespaces(self):
+        """测试保存文章只递增其所在命名空间"""
+        before = get_generations('blog:list', 'blog:category:landscape', 'blog:category:essay')
+
+        self.post.title = '夏日西湖'
+        self.post.save()
+
+        after = get_generations('blog:list', 'blog:category:landscape', 'blog:category:essay')
+        self.assertEqual(after[0], before[0] + 1)
+        self.assertEqual(after[1], before[1] + 1)
+        self.assertEqual(after[2], before[2])
+
+    def test_category_change_bumps_previous_category(self):
+        """测试修改分类时旧分类列表也失效"""
+        before = get_generations('blog:category:landscape')[0]
+
+        self.post.category = self.essay
+        self.post.save()
+
+        self.assertEqual(get_generations('blog:category:landscape')[0], before + 1)
+
+    def test_adding_tag_invalidates_tag_list_page(self):
+        """测试添加标签后标签列表页立即更新"""
+        url = reverse('blog:list')
+        self.assertNotContains(self.client.get(url, {'tag': 'fengguang'}), '春日西湖')
+
+        self.post.tags.add(self.tag)
+
+        self.assertContains(self.client.get(url, {'tag': 'fengguang'}), '春日西湖')
+
+    def test_not_found_requests_leave_no_counters(self):
+        """测试返回 404 的请求不创建代数计数器，成功的请求创建带过期时间的计数器"""
+        for url in [
+            reverse('blog:detail', kwargs={'slug': 'no-such-post'}),
+            reverse('blog:list') + '?category=junk',
+            '/api/posts/no-such-post/',
+        ]:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+        for namespace in ['blog:detail:no-such-post', 'blog:category:junk']:
+            self.assertIsNone(cache.get(f'gen:{namespace}'))
+
+        BlogPost.objects.filter(pk=self.post.pk).update(is_published=True)
+        cache.clear()
+        local_cache.clear()
+        self.assertEqual(self.client.get(self.post.get_absolute_url()).status_code, 200)
+        # 计数器已创建，再次请求命中缓存
+        with self.assertNumQueries(0):
+            self.client.get(self.post.get_absolute_url())
+
+        expired = time.time() + GENERATION_TIMEOUT + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=expired):
+            self.assertIsNone(cache.get('gen:blog:detail:spring'))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConditionalListResponseTest(TestCase):
+    """列表页整页缓存与条件请求"""
+
+    def setUp(self):
+        cache.clear()
+        self.post = BlogPost.objects.create(title='春日西湖', slug='spring', content='内容')
+        self.url = reverse('blog:list')
+
+    def test_matching_etag_returns_304(self):
+        """测试 ETag 匹配时返回304"""
+        response = self.client.get(self.url)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            revalidated = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_last_modified_follows_latest_post(self):
+        """测试 Last-Modified 取自页面内文章最大的 updated_at"""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response['Last-Modified'], http_date(self.post.updated_at.timestamp()))
+        not_modified = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_post_save_invalidates_response_and_etag(self):
+        """测试保存文章后整页缓存失效，旧 ETag 不再匹配"""
+        etag = self.client.get(self.url)['ETag']
+
+        self.post.title = '夏日西湖'
+        self.post.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '夏日西湖')
+
+
+class MarkdownRenderingTest(TestCase):
+    """Markdown 预渲染"""
+
+    def test_save_renders_and_sanitizes_content(self):
+        """测试保存时渲染 Markdown 并清除不安全的标签"""
+        post = BlogPost.objects.create(
+            title='宋代美学', slug='song', content='## 留白\n\n**简约**<script>alert(1)</script>',
+        )
+
+        self.assertIn('<h2>留白</h2>', post.content_html)
+        self.assertIn('<strong>简约</strong>', post.content_html)
+        self.assertNotIn('<script>', post.content_html)
+
+    def test_unchanged_content_is_not_rendered_again(self):
+        """测试内容未变时不重复渲染"""
+        post = BlogPost.objects.create(title='宋代美学', slug='song', content='简约')
+
+        self.assertFalse(post.render_content())
+
+    def test_stale_html_is_rendered_on_first_read(self):
+        """测试绕过 save() 修改的内容在首次读取时补渲染并写回"""
+        post = BlogPost.objects.create(title='宋代美学', slug='song', content='简约')
+        BlogPost.objects.filter(pk=post.pk).update(content='*留白*')
+        post.refresh_from_db()
+
+        self.assertIn('<em>留白</em>', post.get_content_html())
+        self.assertEqual(BlogPost.objects.get(pk=post.pk).content_html, post.content_html)
+
+    def test_command_renders_stale_posts(self):
+        """测试批量渲染命令只处理哈希过期的文章"""
+        post = BlogPost.objects.create(title='宋代美学', slug='song', content='简约')
+        BlogPost.objects.filter(pk=post.pk).update(content='*留白*')
+
+        call_command('render_markdown', workers=1, stdout=io.StringIO())
+
+        post.refresh_from_db()
+        self.assertIn('<em>留白</em>', post.content_html)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PostApiTest(TestCase):
+    """文章只读 API"""
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='山水意境', slug='landscape')
+        self.tag = Tag.objects.create(name='春', slug='spring')
+        for i in range(5):
+            post = BlogPost.objects.create(
+                title=f'文章{i}', slug=f'post-{i}', content=f'# 标题{i}', category=self.category
+            )
+            post.tags.add(self.tag)
+        self.url = reverse('post-list')
+
+    def test_list_query_budget(self):
+        """测试列表：文章连同分类一次取出，标签一次预取"""
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+
+        first = response.json()['results'][0]
+        self.assertEqual(first['title'], '文章4')
+        self.assertEqual(first['category'], {'name': '山水意境', 'slug': 'landscape'})
+        self.assertEqual(first['tags'], [{'name': '春', 'slug': 'spring'}])
+        self.assertNotIn('content_html', first)
+
+    def test_sparse_fields_limit_columns_and_relations(self):
+        """测试稀疏字段集只查询所需的列，不预取标签"""
+        with self.assertNumQueries(1) as queries:
+            response = self.client.get(self.url, {'fields': 'id,title'})
+
+        self.assertEqual(response.json()['results'][0], {'id': 5, 'title': '文章4'})
+        self.assertNotIn('content', queries.captured_queries[0]['sql'])
+        self.assertEqual(self.client.get(self.url, {'fields': 'id,secret'}).status_code, 400)
+
+    def test_cursor_pagination_walks_all_posts(self):
+        """测试游标分页依次取完全部文章"""
+        titles, url = [], f'{self.url}?page_size=2&fields=title'
+        while url:
+            data = self.client.get(url).json()
+            titles.extend(item['title'] for item in data['results'])
+            url = data['next']
+
+        self.assertEqual(titles, [f'文章{i}' for i in range(4, -1, -1)])
+
+    def test_etag_returns_304_without_queries_until_post_changes(self):
+        """测试 ETag 匹配时不查询数据库直接返回304，文章修改后 ETag 变化"""
+        detail = reverse('post-detail', kwargs={'slug': 'post-1'})
+        response = self.client.get(detail)
+        self.assertEqual(response.json()['content_html'], '<h1>标题1</h1>')
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        BlogPost.objects.get(slug='post-1').save()
+        response = self.client.get(detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SearchTest(TestCase):
+    """全文搜索"""
+
+    def setUp(self):
+        cache.clear()
+        self.tag = Tag.objects.create(name='江南', slug='jiangnan')
+
+    def create_post(self, title, content, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = BlogPost.objects.create(
+                title=title, slug=f'post-{BlogPost.objects.count()}', content=content, **kwargs
+            )
+        return post
+
+    def test_tokenize_cjk_bigrams_and_words(self):
+        """测试中文按二元切分，英文按单词切分并转为小写"""
+        self.assertEqual(
+            list(search.tokenize('北京大学 Django')), ['北京', '京大', '大学', 'django']
+        )
+        self.assertEqual(list(search.tokenize('春', unigrams=True)), ['春'])
+
+    def test_ranked_results_prefer_title_matches(self):
+        """测试标题命中排在正文命中之前，所有查询词都必须出现"""
+        body = self.create_post('山间小记', '清晨的西湖断桥笼着薄雾')
+        title = self.create_post('西湖断桥', '一篇游记')
+        self.create_post('西山', '湖边')
+
+        self.assertEqual(search.search_ids('西湖断桥'), [title.pk, body.pk])
+        self.assertEqual(search.search_ids('断桥 雷峰塔'), [])
+
+    def test_incremental_update_and_delete(self):
+        """测试修改正文、修改标签和删除文章后索引随之更新"""
+        post = self.create_post('游记', '苏堤春晓')
+        self.assertEqual(search.search_ids('苏堤'), [post.pk])
+
+        post.content = '平湖秋月'
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+        self.assertEqual(search.search_ids('苏堤'), [])
+        self.assertEqual(SearchTerm.objects.get(term='苏堤').doc_freq, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post.tags.add(self.tag)
+        self.assertEqual(search.search_ids('江南'), [post.pk])
+
+        post.delete()
+        self.assertEqual(search.search_ids('秋月'), [])
+        self.assertEqual(SearchTerm.objects.get(term='秋月').doc_freq, 0)
+
+    def test_public_search_excludes_unpublished(self):
+        """测试公开搜索不包含未发布文章，后台搜索包含"""
+        post = self.create_post('草稿', '钱塘江潮', is_published=False)
+
+        self.assertEqual(search.search_ids('钱塘'), [])
+        self.assertEqual(search.search_ids('钱塘', published_only=False), [post.pk])
+
+    def test_unlimited_search_does_not_truncate_candidates(self):
+        """测试不限条数时不截断候选文章"""
+        posts = [self.create_post(f'游记{i}', '灵隐寺') for i in range(3)]
+
+        with mock.patch.object(search, 'CANDIDATE_LIMIT', 1):
+            self.assertEqual(len(search.search_ids('灵隐')), 1)
+            self.assertEqual(
+                sorted(search.search_ids('灵隐', limit=None)), sorted(post.pk for post in posts)
+            )
+
+    def test_admin_search(self):
+        """测试后台搜索：标题前缀、单字和片段按子串匹配，正文走索引，包括未发布文章"""
+        from django.contrib.auth.models import User
+
+        django = self.create_post('Django 缓存笔记', '代数失效')
+        lake = self.create_post('西湖', '断桥残雪', is_published=False)
+        self.create_post('孤山', '放鹤亭')
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        url = reverse('admin:blog_blogpost_changelist')
+
+        for query, expected in [('Djan', [django]), ('湖', [lake]), ('存笔', [django]), ('残雪', [lake])]:
+            with self.subTest(query=query):
+                response = self.client.get(url, {'q': query})
+                self.assertEqual(
+                    [post.pk for post in response.context['cl'].result_list], [post.pk for post in expected]
+                )
+
+    def test_rebuild_matches_incremental_index(self):
+        """测试重建索引后的结果与增量维护一致"""
+        first = self.create_post('西湖', '断桥残雪')
+        second = self.create_post('断桥', '西湖')
+        expected = search.search_ids('西湖 断桥')
+
+        call_command('rebuild_search_index', stdout=io.StringIO())
+
+        self.assertEqual(search.search_ids('西湖 断桥'), expected)
+        self.assertEqual(set(expected), {first.pk, second.pk})
+
+    def test_search_page(self):
+        """测试搜索页按相关度展示文章卡片，查询次数固定"""
+        self.create_post('孤山访梅', '西泠印社')
+        url = reverse('blog:search')
+
+        with self.assertNumQueries(5):
+            # 索引词、文档总数（随后走缓存）、倒排聚合、本页文章、标签
+            response = self.client.get(url, {'q': '孤山'})
+
+        self.assertContains(response, '孤山访梅')
+        self.assertContains(response, '共找到 1 篇文章')
+        self.assertContains(self.client.get(url, {'q': '不存在的词'}), '没有找到相关文章')
+
+
+class RelatedPostsTest(TestCase):
+    """预先计算的相关文章"""
+
+    def setUp(self):
+        cache.clear()
+        self.landscape = Category.objects.create(name='山水意境', slug='landscape')
+        self.essay = Category.objects.create(name='随笔', slug='essay')
+        self.tags = {
+            slug: Tag.objects.create(name=slug, slug=slug) for slug in ('lake', 'snow', 'bridge', 'tea')
+        }
+
+    def create_post(self, slug, category=None, tags=(), **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = BlogPost.objects.create(title=slug, slug=slug, content='内容', category=category, **kwargs)
+            post.tags.set([self.tags[tag] for tag in tags])
+        return post
+
+    def related_slugs(self, post):
+        return list(
+            RelatedPost.objects.filter(post=post).order_by('rank').values_list('related__slug', flat=True)
+        )
+
+    def test_tags_outrank_category(self):
+        """测试共同标签越多越相关，同分类无共同标签的排在后面"""
+        post = self.create_post('west-lake', self.landscape, ['lake', 'snow', 'bridge'])
+        self.create_post('same-category', self.landscape)
+        self.create_post('two-tags', self.essay, ['lake', 'snow'])
+        self.create_post('one-tag', self.essay, ['bridge', 'tea'])
+        self.create_post('unrelated', self.essay, ['tea'])
+
+        self.assertEqual(self.related_slugs(post), ['two-tags', 'same-category', 'one-tag'])
+
+    def test_posts_without_category_are_not_related(self):
+        """测试分类为空的文章不会因为都没有分类而互相关联"""
+        first = self.create_post('no-category-1')
+        self.create_post('no-category-2')
+
+        self.assertEqual(self.related_slugs(first), [])
+
+    def test_incremental_refresh(self):
+        """测试修改标签、取消发布和删除文章后相关列表随之更新"""
+        post = self.create_post('west-lake', tags=['lake'])
+        other = self.create_post('lake-side', tags=['snow'])
+        self.assertEqual(self.related_slugs(post), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.tags.add(self.tags['lake'])
+        self.assertEqual(self.related_slugs(post), ['lake-side'])
+        self.assertEqual(self.related_slugs(other), ['west-lake'])
+
+        third = self.create_post('lake-snow', tags=['lake', 'snow'])
+        self.assertEqual(self.related_slugs(other), ['lake-snow', 'west-lake'])
+
+        third.is_published = False
+        with self.captureOnCommitCallbacks(execute=True):
+            third.save()
+        self.assertEqual(self.related_slugs(other), ['west-lake'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        self.assertEqual(self.related_slugs(other), [])
+
+    def test_rebuild_matches_incremental(self):
+        """测试全量重建与增量维护的结果一致"""
+        posts = [
+            self.create_post(f'post-{i}', self.landscape if i % 2 else None, list(self.tags)[:i % 4 + 1])
+            for i in range(8)
+        ]
+        expected = {post.pk: self.related_slugs(post) for post in posts}
+
+        call_command('rebuild_related_posts', stdout=io.StringIO())
+
+        self.assertEqual({post.pk: self.related_slugs(post) for post in posts}, expected)
+        self.assertEqual(related.refresh([posts[0].pk]), 0)
+
+    def test_refresh_reads_only_neighbourhood(self):
+        """测试增量更新只读出有共同标签或分类的文章，结果与全量重建一致"""
+        post = self.create_post('west-lake', self.landscape, ['lake'])
+        neighbour = self.create_post('lake-side', tags=['lake', 'snow'])
+        self.create_post('same-category', self.landscape)
+        unrelated = [self.create_post(f'tea-{i}', self.essay, ['tea']) for i in range(5)]
+
+        loaded = set()
+        load = related.Corpus.load.__func__
+
+        def spy(cls, around=None):
+            corpus = load(cls, around)
+            loaded.update(corpus.posts)
+            return corpus
+
+        with mock.patch.object(related.Corpus, 'load', classmethod(spy)):
+            with self.captureOnCommitCallbacks(execute=True):
+                post.tags.add(self.tags['snow'])
+
+        self.assertIn(neighbour.pk, loaded)
+        self.assertFalse(loaded & {other.pk for other in unrelated})
+        expected = {pk: self.related_slugs(pk) for pk in BlogPost.objects.values_list('pk', flat=True)}
+        related.rebuild()
+        self.assertEqual(
+            {pk: self.related_slugs(pk) for pk in BlogPost.objects.values_list('pk', flat=True)}, expected
+        )
+
+    def test_detail_page_shows_precomputed_posts(self):
+        """测试详情页展示预先算好的相关文章"""
+        post = self.create_post('west-lake', tags=['lake'])
+        self.create_post('lake-side', tags=['lake'])
+
+        response = self.client.get(post.get_absolute_url())
+
+        self.assertEqual([card.url for card in response.context['related_posts']], ['/blog/lake-side/'])
+
+
+class HealthCheckTest(TestCase):
+    """健康检查"""
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_healthy(self):
+        """测试数据库和缓存可用时返回 200 且不被缓存"""
+        response = self.client.get(reverse('health'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['checks']['database']['status'], 'ok')
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    @override_settings(CACHES=DUMMY_CACHES)
+    def test_unavailable_cache_returns_503(self):
+        """测试缓存读不回写入的值时返回 503"""
+        response = self.client.get(reverse('health'))
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['checks']['cache']['status'], 'error: ConnectionError')
+
+
+@override_settings(CACHES=DUMMY_CACHES)
+class QueryPlanTest(TestCase):
+    """在较大的数据量下，页面查询都应走索引而非顺序扫描"""
+
+    # 筛选器本来就要列出全部分类和标签
+    FULL_LISTINGS = {'blog_category', 'blog_tag'}
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = Category.objects.bulk_create(
+            Category(name=f'分类{i}', slug=f'category-{i}') for i in range(20)
+        )
+        tags = Tag.objects.bulk_create(Tag(name=f'标签{i}', slug=f'tag-{i}') for i in range(50))
+        now = timezone.now()
+        posts = BlogPost.objects.bulk_create(
+            BlogPost(
+                title=f'文章{i}', slug=f'post-{i}', content='内容', content_html='<p>内容</p>',
+                category=categories[i % 20], is_published=i % 10 != 0,
+                created_at=now - timedelta(hours=i),
+            )
+            for i in range(2000)
+        )
+        through = BlogPost.tags.through
+        through.objects.bulk_create(
+            through(blogpost_id=post.pk, tag_id=tags[(post.pk + k) % 50].pk)
+            for post in posts for k in range(3)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertIndexedQueries(self, url):
+        with QueryPlanRecorder() as recorder:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(recorder.queries)
+        scans = recorder.sequential_scans(allow=self.FULL_LISTINGS)
+        self.assertEqual(scans, [], '\n'.join(map(str, scans)))
+
+    def test_blog_pages(self):
+        """测试首页、列表页、分类和标签筛选、详情页"""
+        for url in [
+            reverse('home'),
+            reverse('blog:list'),
+            reverse('blog:list') + '?category=category-3',
+            reverse('blog:list') + '?tag=tag-4',
+            reverse('blog:detail', kwargs={'slug': 'post-5'}),
+            reverse('post-list'),
+        ]:
+            with self.subTest(url=url):
+                self.assertIndexedQueries(url)
+
+    def test_recorder_reports_sequential_scan(self):
+        """测试没有可用索引的查询会被报告"""
+        with QueryPlanRecorder() as recorder:
+            list(BlogPost.objects.filter(excerpt='摘要'))
+        self.assertEqual([scan.table for scan in recorder.sequential_scans()], ['blog_blogpost'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SyntheticDataTest(TestCase):
+    """合成数据生成与页面基准测试"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.tmp)
+        cls.media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_override.disable()
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+        super().tearDownClass()
+
+    def generate(self, **options):
+        options = {'posts': 30, 'photos': 60, 'albums': 4, 'tags': 10, 'placeholders': 2,
+                   'bodies': 5, 'batch_size': 7, 'seed': 1, **options}
+        call_command('generate_synthetic_data', stdout=io.StringIO(), **options)
+
+    def test_generate(self):
+        """测试按数量批量生成，时间分散且不晚于当前，相册汇总字段已校正"""
+        from gallery.models import Photo, PhotoAlbum
+
+        self.generate()
+
+        self.assertEqual(BlogPost.objects.count(), 30)
+        self.assertEqual(Photo.objects.count(), 60)
+        self.assertTrue(BlogPost.tags.through.objects.filter(blogpost__slug='synthetic-post-0').exists())
+        self.assertGreater(BlogPost.objects.dates('created_at', 'day').count(), 1)
+        self.assertFalse(BlogPost.objects.filter(updated_at__gt=timezone.now()).exists())
+        self.assertTrue(BlogPost.objects.exclude(content_html='').exists())
+        for album in PhotoAlbum.objects.all():
+            self.assertEqual(album.photo_count, album.photos.count())
+            self.assertEqual(album.cover_id is None, album.photo_count == 0)
+
+        # 再次运行时追加，而不是与已有的 slug 冲突
+        self.generate(posts=5, photos=5, albums=1)
+        self.assertEqual(BlogPost.objects.count(), 35)
+
+    def test_benchmark_baseline(self):
+        """测试保存基准后对比，查询数增加视为回退"""
+        self.generate(posts=5, photos=5, albums=1)
+        baseline = Path(self.tmp) / 'baseline.json'
+        options = {'requests': 2, 'warmup': 0, 'baseline': str(baseline), 'stdout': io.StringIO()}
+
+        call_command('benchmark_views', save_baseline=True, **options)
+        stored = json.loads(baseline.read_text())
+        self.assertEqual(stored['environment']['posts'], 5)
+        self.assertIn('blog_detail:uncached', stored['results'])
+
+        stored['results']['blog_detail:uncached']['queries'] -= 1
+        baseline.write_text(json.dumps(stored))
+        with self.assertRaisesMessage(CommandError, 'blog_detail:uncached: queries'):
+            call_command('benchmark_views', compare=True, **options)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PerformanceMetricsTest(TestCase):
+    """请求性能指标"""
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post = BlogPost.objects.create(
+                title='西湖晨雾', slug='west-lake', content='正文', is_published=True
+            )
+
+    @override_settings(SERVER_TIMING=True)
+    def test_server_timing(self):
+        """测试响应头包含查询、渲染、各命名空间缓存命中和总耗时"""
+        first = self.client.get(self.post.get_absolute_url())['Server-Timing']
+        second = self.client.get(self.post.get_absolute_url())['Server-Timing']
+
+        self.assertRegex(first, r'^db;dur=[\d.]+;desc="[1-9]\d* queries", render;dur=[\d.]+')
+        self.assertIn('cache-blog.detail;desc="0 hit 1 miss"', first)
+        self.assertIn('cache-blog.detail;desc="1 hit 0 miss"', second)
+        self.assertRegex(second, r'total;dur=[\d.]+$')
+
+    def test_server_timing_only_for_staff(self):
+        """测试默认只对管理员输出 Server-Timing 头"""
+        from django.contrib.auth.models import User
+
+        self.assertNotIn('Server-Timing', self.client.get(reverse('about')))
+
+        self.client.force_login(User.objects.create_user('reader'))
+        self.assertNotIn('Server-Timing', self.client.get(reverse('about')))
+
+        self.client.force_login(User.objects.create_user('editor', is_staff=True))
+        self.assertIn('Server-Timing', self.client.get(reverse('about')))
+
+    def test_metrics_aggregate_worker_files(self):
+        """测试 /metrics/ 汇总 METRICS_DIR 中其他 worker 写入的累计值"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        labels = [['method', 'GET'], ['status', '200'], ['view', 'about']]
+        Path(directory, '1.json').write_text(json.dumps({
+            'samples': [['moyinji_http_requests_total', labels, 5]],
+        }))
+
+        with override_settings(METRICS_DIR=directory):
+            self.client.get(reverse('about'))
+            response = self.client.get(reverse('metrics'))
+
+        own = collector.samples['moyinji_http_requests_total', tuple(map(tuple, labels))]
+        body = response.content.decode()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE moyinji_http_request_duration_seconds histogram', body)
+        self.assertIn(
+            f'moyinji_http_requests_total{{method="GET",status="200",view="about"}} {own + 5}', body
+        )
+        self.assertIn('moyinji_http_request_duration_seconds_bucket{le="+Inf",view="about"}', body)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class StaleCacheTest(TestCase):
+    """过期兜底与防击穿"""
+
+    def setUp(self):
+        cache.clear()
+        self.builds = {}
+        self.lock = threading.Lock()
+
+    def builder(self, key, value, delay=0.2):
+        def build():
+            with self.lock:
+                self.builds[key] = self.builds.get(key, 0) + 1
+            time.sleep(delay)
+            return value
+        return build
+
+    def concurrently(self, calls):
+        """所有线程同时开始调用，返回各自的结果"""
+        barrier = threading.Barrier(len(calls))
+        results = [None] * len(calls)
+
+        def run(index, call):
+            barrier.wait()
+            results[index] = call()
+
+        threads = [threading.Thread(target=run, args=item) for item in enumerate(calls)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_one_rebuild_per_key_when_empty(self):
+        """测试冷启动时每个键只重建一次，其余请求等待重建结果"""
+        calls = [
+            lambda key=key: get_or_build(key, [key], self.builder(key, f'{key}-value'), 60)
+            for key in ['page:a', 'page:b'] * 8
+        ]
+
+        results = self.concurrently(calls)
+
+        self.assertEqual(self.builds, {'page:a': 1, 'page:b': 1})
+        self.assertEqual(results, ['page:a-value', 'page:b-value'] * 8)
+
+    def test_invalidated_entry_served_stale_during_rebuild(self):
+        """测试失效后只有一个请求重建，其余请求直接返回旧数据"""
+        get_or_build('page:a', ['page:a'], lambda: 'old', 60)
+        bump('page:a')
+
+        results = self.concurrently([
+            lambda: get_or_build('page:a', ['page:a'], self.builder('page:a', 'new'), 60)
+        ] * 10)
+
+        self.assertEqual(self.builds, {'page:a': 1})
+        self.assertEqual(sorted(results), ['new'] + ['old'] * 9)
+        self.assertEqual(get_or_build('page:a', ['page:a'], self.builder('page:a', 'newer'), 60), 'new')
+
+    def test_failed_rebuild_drops_stale_entry(self):
+        """测试重建失败（如文章已删除）后不再返回旧数据"""
+        get_or_build('page:a', ['page:a'], lambda: 'old', 60)
+        bump('page:a')
+
+        def missing():
+            raise Http404
+
+        with self.assertRaises(Http404):
+            get_or_build('page:a', ['page:a'], missing, 60)
+        self.assertIsNone(cache.get('page:a'))
+
+    def test_probabilistic_early_expiry(self):
+        """测试临近过期且重建较慢的条目会被提前重建"""
+        token = generation_token('page:a')
+        cache.set('page:a', ('old', token, time.time() + 1, 0.5))
+
+        with mock.patch('moyinji.stale_cache.random.random', return_value=0.0):
+            self.assertEqual(get_or_build('page:a', ['page:a'], lambda: 'new', 60), 'old')
+        with mock.patch('moyinji.stale_cache.random.random', return_value=0.9):
+            self.assertEqual(get_or_build('page:a', ['page:a'], lambda: 'new', 60), 'new')
+
+
+class LocalCacheTest(TestCase):
+    """共享缓存前的进程内缓存层"""
+
+    def setUp(self):
+        # 文件缓存与 Redis 一样在进程外，本地层会生效
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        override = override_settings(
+            CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': directory,
+            }},
+            LOCAL_CACHE_MAX_AGE=60,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_hot_key_served_locally(self):
+        """测试再次读取时不访问共享缓存"""
+        self.assertEqual(get_or_build('page:a', ['page:a'], lambda: 'value', 60), 'value')
+
+        with mock.patch.object(FileBasedCache, 'get', side_effect=AssertionError), \
+                mock.patch.object(FileBasedCache, 'get_many', side_effect=AssertionError):
+            self.assertEqual(get_or_build('page:a', ['page:a'], lambda: 'rebuilt', 60), 'value')
+
+    @override_settings(LOCAL_CACHE_MAX_AGE=0.2)
+    def test_invalidation_bounded_by_max_age(self):
+        """测试其他 worker 的失效最迟在 LOCAL_CACHE_MAX_AGE 后可见，本进程的失效立即可见"""
+        get_or_build('page:a', ['page:a'], lambda: 'old', 60)
+        # 另一个 worker 中的信号只递增了共享缓存中的代数
+        cache.incr('gen:page:a')
+
+        self.assertEqual(get_or_build('page:a', ['page:a'], lambda: 'new', 60), 'old')
+        time.sleep(0.25)
+        self.assertEqual(get_or_build('page:a', ['page:a'], lambda: 'new', 60), 'new')
+
+        bump('page:a')
+        self.assertEqual(get_or_build('page:a', ['page:a'], lambda: 'newest', 60), 'newest')
+
+    @override_settings(LOCAL_CACHE_MAX_BYTES=10)
+    def test_evicts_least_recently_used(self):
+        """测试总大小超过上限时淘汰最久未用的值"""
+        local_cache.set('a', 'x', size=4)
+        local_cache.set('b', 'y', size=4)
+        local_cache.get('a')
+        local_cache.set('c', 'z', size=4)
+
+        self.assertEqual((local_cache.get('a'), local_cache.get('b'), local_cache.get('c')), ('x', None, 'z'))
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_disabled_for_in_process_backend(self):
+        """测试默认缓存本身在进程内时不再保留副本"""
+        local_cache.set('a', 'x')
+        self.assertIsNone(local_cache.get('a'))
+
+
+@override_settings(CACHES=DUMMY_CACHES)
+class AsyncViewsTest(TestCase):
+    """ASGI 部署使用的异步视图"""
+
+    @classmethod
+    def setUpTestData(cls):
+        from gallery.models import PhotoAlbum
+
+        category = Category.objects.create(name='山水', slug='landscape')
+        tag = Tag.objects.create(name='湖', slug='lake')
+        for i in range(3):
+            post = BlogPost.objects.create(
+                title=f'文章{i}', slug=f'post-{i}', content='正文', category=category, is_published=True
+            )
+            post.tags.add(tag)
+        PhotoAlbum.objects.create(title='西湖', slug='west-lake', is_featured=True)
+        related.rebuild()
+
+    def get_async(self, url):
+        with override_settings(ROOT_URLCONF='moyinji.urls_async'):
+            return async_to_sync(self.async_client.get)(url)
+
+    def test_routes_to_async_views(self):
+        """测试异步 URL 配置中的页面都是协程视图"""
+        for url in ['/', '/blog/', '/blog/post-0/', '/gallery/', '/gallery/west-lake/']:
+            with self.subTest(url=url):
+                self.assertTrue(iscoroutinefunction(resolve(url, urlconf='moyinji.urls_async').func))
+
+    def test_same_output_as_sync_views(self):
+        """测试经 ASGI 处理的异步视图与同步视图输出相同"""
+        for url in [
+            reverse('home'),
+            reverse('blog:list'),
+            reverse('blog:list') + '?category=landscape&tag=lake',
+            reverse('gallery:list'),
+            reverse('gallery:detail', kwargs={'slug': 'west-lake'}),
+        ]:
+            with self.subTest(url=url):
+                expected = self.client.get(url)
+                response = self.get_async(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, expected.content)
+
+    def test_detail_and_not_found(self):
+        """测试详情页及不存在的文章、分类、相册返回 404"""
+        response = self.get_async(reverse('blog:detail', kwargs={'slug': 'post-1'}))
+        self.assertContains(response, '文章1')
+        self.assertEqual(len(response.context['related_posts']), 2)
+        self.assertNotIn('Server-Timing', response)
+
+        # 管理员的请求在异步上下文中读取用户
+        from django.contrib.auth.models import User
+
+        self.async_client.force_login(User.objects.create_user('editor', is_staff=True))
+        response = self.get_async(reverse('blog:detail', kwargs={'slug': 'post-1'}))
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+        for url in ['/blog/missing/', '/blog/?category=missing', '/gallery/missing/']:
+            with self.subTest(url=url):
+                self.assertEqual(self.get_async(url).status_code, 404)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class FragmentCacheTest(TestCase):
+    """模板片段缓存"""
+
+    def setUp(self):
+        cache.clear()
+
+    def render(self, source, **context):
+        return Template('{% load fragments %}' + source).render(Context(context))
+
+    def card(self, title):
+        return PostCard(1, title, '/blog/a/', '', [], '', None, None, [])
+
+    def test_reuses_fragment_for_same_record(self):
+        """测试同一条记录再次渲染时直接使用缓存的 HTML，记录变化后重新渲染"""
+        source = '{% cachefragment "card" post %}{{ post.title }}{{ extra }}{% endcachefragment %}'
+        self.assertEqual(self.render(source, post=self.card('西湖'), extra='1'), '西湖1')
+        # 块内不依赖 post 的部分不会重新渲染
+        self.assertEqual(self.render(source, post=self.card('西湖'), extra='2'), '西湖1')
+        self.assertEqual(self.render(source, post=self.card('断桥'), extra='2'), '断桥2')
+
+    def test_template_change_uses_new_key(self):
+        """测试片段模板修改后不会读到旧的 HTML"""
+        post = self.card('西湖')
+        self.render('{% cachefragment "card" post %}<b>{{ post.title }}</b>{% endcachefragment %}', post=post)
+        self.assertEqual(
+            self.render('{% cachefragment "card" post %}<i>{{ post.title }}</i>{% endcachefragment %}', post=post),
+            '<i>西湖</i>',
+        )
+
+    def test_list_cards_follow_category_rename(self):
+        """测试分类改名后列表中的文章卡片随之更新"""
+        category = Category.objects.create(name='山水', slug='landscape')
+        for i in range(2):
+            BlogPost.objects.create(
+                title=f'文章{i}', slug=f'post-{i}', content='正文', category=category, is_published=True
+            )
+        response = self.client.get(reverse('blog:list'))
+        self.assertContains(response, '山水', count=3)
+
+        category.name = '园林'
+        category.save()
+        response = self.client.get(reverse('blog:list'))
+        self.assertNotContains(response, '山水')
+        self.assertContains(response, '园林', count=3)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, VIEW_COUNT_FLUSH_INTERVAL=3600)
+class PublishTest(TestCase):
+    """静态发布"""
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.root = Path(directory)
+        override = override_settings(PUBLISH_DIR=directory)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.category = Category.objects.create(name='山水', slug='landscape')
+        self.posts = [
+            BlogPost.objects.create(
+                title=f'文章{i}', slug=f'post-{i}', content='正文', category=self.category, is_published=True
+            )
+            for i in range(2)
+        ]
+        related.rebuild()
+
+    def read(self, *parts):
+        return self.root.joinpath(*parts).read_text()
+
+    def test_publish_site(self):
+        """测试全量发布各页面，不计入浏览次数，并删除已不存在的页面"""
+        orphan = self.root / 'blog' / 'removed' / 'index.html'
+        orphan.parent.mkdir(parents=True)
+        orphan.write_text('old')
+
+        with mock.patch('blog.views.record_view') as record_view:
+            call_command('publish_site', stdout=io.StringIO())
+        record_view.assert_not_called()
+
+        self.assertIn('最新文章', self.read('index.html'))
+        self.assertIn('文章1', self.read('blog', 'index.html'))
+        self.assertIn('文章0', self.read('blog', 'index@category=landscape.html'))
+        self.assertIn('文章0', self.read('blog', 'post-0', 'index.html'))
+        self.assertTrue((self.root / 'about' / 'index.html').exists())
+        self.assertTrue((self.root / 'gallery' / 'index.html').exists())
+        self.assertFalse(orphan.exists())
+
+    def test_republishes_affected_pages_after_commit(self):
+        """测试修改文章后只重新发布受影响的页面，包括在相关文章中展示它的详情页"""
+        call_command('publish_site', stdout=io.StringIO())
+        about = self.root / 'about' / 'index.html'
+        about.write_text('untouched')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.posts[0].title = '新标题'
+            self.posts[0].save()
+
+        self.assertIn('新标题', self.read('blog', 'post-0', 'index.html'))
+        self.assertIn('新标题', self.read('blog', 'index.html'))
+        self.assertIn('新标题', self.read('blog', 'index@category=landscape.html'))
+        self.assertIn('新标题', self.read('index.html'))
+        # post-1 的相关文章中有 post-0 的卡片
+        self.assertIn('新标题', self.read('blog', 'post-1', 'index.html'))
+        self.assertEqual(about.read_text(), 'untouched')
+
+    @override_settings(CACHES=LOCMEM_CACHES, VIEW_COUNT_FLUSH_INTERVAL=3600)
+    def test_published_detail_counts_views(self):
+        """测试发布的详情页加载后向计数接口计入浏览，动态页面不重复计数"""
+        _local_counter.reset()
+        call_command('publish_site', stdout=io.StringIO())
+        beacon = reverse('blog:record_view', kwargs={'slug': 'post-0'})
+        self.assertIn(beacon, self.read('blog', 'post-0', 'index.html'))
+        self.assertNotContains(self.client.get(self.posts[0].get_absolute_url()), beacon)
+
+        response = self.client.post(beacon)
+        self.assertEqual(response.json(), {'view_count': 2})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.post(beacon).json(), {'view_count': 3})
+        flush_view_counts()
+        self.posts[0].refresh_from_db()
+        self.assertEqual(self.posts[0].view_count, 3)
+
+        self.assertEqual(self.client.get(beacon).status_code, 405)
+        self.assertEqual(self.client.post(reverse('blog:record_view', kwargs={'slug': 'missing'})).status_code, 404)
+
+    def test_filter_pages_do_not_read_posts(self):
+        """测试筛选器失效时只按分类和标签生成列表页，不逐篇读取文章"""
+        Tag.objects.create(name='风光', slug='fengguang')
+        list_url = reverse('blog:list')
+
+        with self.assertNumQueries(2):
+            pages = publish.affected_pages(['blog:filters'])
+
+        self.assertEqual(
+            sorted(pages), sorted([list_url, f'{list_url}?category=landscape', f'{list_url}?tag=fengguang'])
+        )
+
+    def test_unpublished_post_removed(self):
+        """测试文章下线后删除其发布文件"""
+        call_command('publish_site', stdout=io.StringIO())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.posts[0].is_published = False
+            self.posts[0].save()
+
+        self.assertFalse((self.root / 'blog' / 'post-0' / 'index.html').exists())
+        self.assertNotIn('文章0', self.read('blog', 'index.html'))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, VIEW_COUNT_FLUSH_INTERVAL=3600)
+class WarmCacheTest(TestCase):
+    """缓存预热"""
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='山水', slug='landscape')
+        self.quiet = BlogPost.objects.create(
+            title='冷门', slug='quiet', content='正文', category=self.category, is_published=True, view_count=1
+        )
+        self.popular = BlogPost.objects.create(
+            title='热门', slug='popular', content='正文', is_published=True, view_count=500
+        )
+
+    def test_pages_ordered_by_views(self):
+        """测试列表页最先预热，之后按浏览次数从高到低"""
+        pages = warm.warm_pages()
+        self.assertEqual(pages[:3], ['/', '/blog/', '/gallery/'])
+        self.assertLess(pages.index('/blog/popular/'), pages.index('/blog/?category=landscape'))
+        self.assertLess(pages.index('/blog/?category=landscape'), pages.index('/blog/quiet/'))
+
+    def test_warm_cache_command(self):
+        """测试预热写入列表和详情缓存、不计入浏览次数，再次运行不重复构建"""
+        out = io.StringIO()
+        with mock.patch('blog.views.record_view') as record_view:
+            call_command('warm_cache', concurrency=1, stdout=out)
+        record_view.assert_not_called()
+        self.assertRegex(out.getvalue(), r'wrote [1-9]\d* keys')
+        self.assertIsNotNone(cache.get(detail_cache_key('popular')[0]))
+        self.assertIsNotNone(cache.get('response:blog:list:category:landscape:tag:all:first'))
+
+        out = io.StringIO()
+        call_command('warm_cache', concurrency=1, stdout=out)
+        self.assertIn('wrote 0 keys', out.getvalue())
+
+    @override_settings(CACHE_WARM_ON_INVALIDATION=True, TASK_QUEUE_EAGER=True)
+    def test_rewarms_after_invalidation(self):
+        """测试修改文章后重新预热受影响的页面"""
+        call_command('warm_cache', concurrency=1, stdout=io.StringIO())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.quiet.title = '新标题'
+            self.quiet.save()
+
+        entry = cache.get(detail_cache_key('quiet')[0])
+        self.assertEqual(entry[1], generation_token('blog:detail:quiet'))
+        self.assertEqual(PostDetail.unpack(loads(entry[0])['post']).title, '新标题')
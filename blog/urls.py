@@ -1,9 +1,18 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'blog'
 
-urlpatterns = [
-    path('', views.blog_list, name='list'),
-    path('<slug:slug>/', views.blog_detail, name='detail'),
-]
+
+def url_patterns(use_async=False):
+    """use_async 为 True 时列表页和详情页使用 blog.async_views 中的异步视图"""
+    pages = async_views if use_async else views
+    return [
+        path('', pages.blog_list, name='list'),
+        path('search/', views.blog_search, name='search'),
+        path('<slug:slug>/', pages.blog_detail, name='detail'),
+        path('<slug:slug>/views/', views.record_post_view, name='record_view'),
+    ]
+
+
+urlpatterns = url_patterns()
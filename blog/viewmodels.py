@@ -0,0 +1,85 @@
+"""
+博客页面的视图模型
+"""
+from moyinji.variants import image_sources
+from moyinji.viewmodels import ViewModel, decode_datetime, encode_datetime
+
+
+def image_url(field):
+    """ImageField 的 URL，未上传时返回空字符串"""
+    return field.url if field else ''
+
+
+class CategoryRef(ViewModel):
+    """分类引用"""
+    FIELDS = ('name', 'slug')
+    __slots__ = FIELDS
+
+    @classmethod
+    def from_category(cls, category):
+        return cls(category.name, category.slug) if category else None
+
+    @classmethod
+    def unpack(cls, data):
+        return cls(*data) if data else None
+
+
+class TagRef(ViewModel):
+    """标签引用"""
+    FIELDS = ('name', 'slug')
+    __slots__ = FIELDS
+
+    @classmethod
+    def from_tag(cls, tag):
+        return cls(tag.name, tag.slug)
+
+
+class PostCard(ViewModel):
+    """文章卡片：列表页、首页、相关文章"""
+    FIELDS = ('id', 'title', 'url', 'cover_url', 'cover_sources', 'excerpt', 'created_at', 'category', 'tags')
+    __slots__ = FIELDS
+
+    @classmethod
+    def from_post(cls, post):
+        """由 BlogPost.objects.cards() 取出的文章构建"""
+        return cls(
+            post.pk,
+            post.title,
+            post.get_absolute_url(),
+            image_url(post.cover_image),
+            image_sources(post.cover_image, post.cover_variants),
+            post.excerpt,
+            post.created_at,
+            CategoryRef.from_category(post.category),
+            [TagRef.from_tag(tag) for tag in post.tags.all()],
+        )
+
+    def pack(self):
+        data = super().pack()
+        data[6] = encode_datetime(self.created_at)
+        data[7] = self.category.pack() if self.category else None
+        data[8] = TagRef.pack_many(self.tags)
+        return data
+
+    @classmethod
+    def unpack(cls, data):
+        record = cls(*data)
+        record.created_at = decode_datetime(record.created_at)
+        record.category = CategoryRef.unpack(record.category)
+        record.tags = TagRef.unpack_many(record.tags)
+        return record
+
+
+class PostDetail(PostCard):
+    """文章详情"""
+    FIELDS = PostCard.FIELDS + ('slug', 'content_html', 'is_photography', 'view_count')
+    __slots__ = ('slug', 'content_html', 'is_photography', 'view_count')
+
+    @classmethod
+    def from_post(cls, post):
+        record = super().from_post(post)
+        record.slug = post.slug
+        record.content_html = post.get_content_html()
+        record.is_photography = post.is_photography
+        record.view_count = post.view_count
+        return record
@@ -1,88 +1,239 @@
+import hashlib
+
+from django.http import Http404, JsonResponse, QueryDict
 from django.shortcuts import render, get_object_or_404
-from django.views.decorators.cache import cache_page
-from django.core.cache import cache
+from django.utils.http import http_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.conf import settings
+from django.db.models import Prefetch
+from .counters import record_view, seed_view_count
 from .models import BlogPost, Category, Tag
+from .pagination import InvalidCursor, KeysetPaginator
+from .search import MAX_RESULTS, search_ids
+from .viewmodels import CategoryRef, PostCard, PostDetail, TagRef
+from moyinji.response_cache import cache_response
+from moyinji.stale_cache import get_or_build
+from moyinji.viewmodels import dumps, layout_version, loads
+
+
+def _page_url(category_slug, tag_slug, **cursor):
+    """生成保留筛选参数的翻页链接"""
+    params = QueryDict(mutable=True)
+    if category_slug:
+        params['category'] = category_slug
+    if tag_slug:
+        params['tag'] = tag_slug
+    params.update(cursor)
+    return f'?{params.urlencode()}'
+
+
+def list_cache_key(request):
+    """
+    列表页整页缓存的键：只取真正影响输出的参数（分类、标签、游标），
+    并依赖筛选器与所在列表的命名空间
+    """
+    category_slug = request.GET.get('category')
+    tag_slug = request.GET.get('tag')
+    before = request.GET.get('before')
+    after = request.GET.get('after')
+
+    if before:
+        page_key = f'before:{before}'
+    elif after:
+        page_key = f'after:{after}'
+    else:
+        page_key = 'first'
+
+    namespaces = ['blog:filters']
+    if category_slug:
+        namespaces.append(f'blog:category:{category_slug}')
+    if tag_slug:
+        namespaces.append(f'blog:tag:{tag_slug}')
+    if len(namespaces) == 1:
+        namespaces.append('blog:list')
+
+    key = f'blog:list:category:{category_slug or "all"}:tag:{tag_slug or "all"}:{page_key}'
+    return key, namespaces
 
 
-@cache_page(60 * 15)  # 缓存15分钟
+def _list_params(request):
+    """列表页的筛选和翻页参数：(分类, 标签, after, before)"""
+    return (
+        request.GET.get('category'),
+        request.GET.get('tag'),
+        request.GET.get('after'),
+        request.GET.get('before'),
+    )
+
+
+def _page_size():
+    return getattr(settings, 'BLOG_PAGE_SIZE', 12)
+
+
+def _render_list(request, page, categories, tags, category_slug, tag_slug):
+    context = {
+        'posts': [PostCard.from_post(post) for post in page],
+        'next_url': _page_url(category_slug, tag_slug, after=page.next_cursor) if page.has_next else None,
+        'previous_url': _page_url(category_slug, tag_slug, before=page.previous_cursor) if page.has_previous else None,
+        'categories': [CategoryRef.from_category(c) for c in categories],
+        'tags': [TagRef.from_tag(t) for t in tags],
+        'current_category': category_slug,
+        'current_tag': tag_slug,
+    }
+
+    response = render(request, 'blog/blog_list.html', context)
+    if page.object_list:
+        last_modified = max(post.updated_at for post in page.object_list)
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
+@cache_response(list_cache_key, 60 * 15)  # 缓存15分钟
 def blog_list(request):
     """文章列表页"""
-    # 生成缓存键，包含筛选参数
-    cache_key = f'blog:list:category:{request.GET.get("category", "all")}:tag:{request.GET.get("tag", "all")}'
+    category_slug, tag_slug, after, before = _list_params(request)
 
-    # 尝试从缓存获取
-    cached_context = cache.get(cache_key)
-    if cached_context:
-        return render(request, 'blog/blog_list.html', cached_context)
-
-    posts = BlogPost.objects.filter(is_published=True)
+    posts = BlogPost.objects.published().cards()
 
     # 按分类筛选
-    category_slug = request.GET.get('category')
     if category_slug:
         category = get_object_or_404(Category, slug=category_slug)
         posts = posts.filter(category=category)
 
     # 按标签筛选
-    tag_slug = request.GET.get('tag')
     if tag_slug:
         tag = get_object_or_404(Tag, slug=tag_slug)
         posts = posts.filter(tags=tag)
 
+    paginator = KeysetPaginator(posts, _page_size())
+    try:
+        page = paginator.page(after=after, before=before)
+    except InvalidCursor:
+        raise Http404('无效的分页参数')
+
     # 获取所有分类和标签用于筛选器
-    categories = Category.objects.all()
-    tags = Tag.objects.all()
+    categories = Category.objects.only('name', 'slug')
+    tags = Tag.objects.only('name', 'slug')
+
+    return _render_list(request, page, categories, tags, category_slug, tag_slug)
+
+
+def search_cache_key(request):
+    """搜索结果页整页缓存的键：规范化后的查询词和页码，任何文章变化都会失效"""
+    query = ' '.join(request.GET.get('q', '').split())
+    digest = hashlib.md5(query.encode(), usedforsecurity=False).hexdigest()
+    return f'blog:search:{digest}:{request.GET.get("page", "1")}', ['blog:list', 'blog:filters']
+
+
+@cache_response(search_cache_key, 60 * 15)  # 缓存15分钟
+def blog_search(request):
+    """文章搜索页"""
+    query = ' '.join(request.GET.get('q', '').split())[:100]
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        raise Http404('无效的页码')
+    if page < 1:
+        raise Http404('无效的页码')
+
+    page_size = getattr(settings, 'BLOG_PAGE_SIZE', 12)
+    hits = search_ids(query) if query else []
+    page_ids = hits[(page - 1) * page_size:page * page_size]
+    if page > 1 and not page_ids:
+        raise Http404('无效的页码')
+
+    # 按相关度顺序排列本页文章
+    posts = BlogPost.objects.published().cards().in_bulk(page_ids)
+    params = QueryDict(mutable=True)
+    params['q'] = query
+
+    def page_url(number):
+        params['page'] = number
+        return f'?{params.urlencode()}'
 
     context = {
-        'posts': posts,
-        'categories': categories,
-        'tags': tags,
-        'current_category': category_slug,
-        'current_tag': tag_slug,
+        'query': query,
+        'posts': [PostCard.from_post(posts[pk]) for pk in page_ids if pk in posts],
+        'total': len(hits),
+        'truncated': len(hits) >= MAX_RESULTS,
+        'previous_url': page_url(page - 1) if page > 1 else None,
+        'next_url': page_url(page + 1) if page * page_size < len(hits) else None,
     }
+    return render(request, 'blog/search.html', context)
 
-    # 缓存上下文
-    cache.set(cache_key, context, 60 * 15)
 
-    return render(request, 'blog/blog_list.html', context)
+# 详情缓存中打包的视图模型布局
+DETAIL_LAYOUT = layout_version(PostDetail, PostCard, CategoryRef, TagRef)
 
 
-def blog_detail(request, slug):
-    """文章详情页"""
-    cache_key = f'blog:detail:{slug}'
-
-    # 尝试从缓存获取文章
-    cached_data = cache.get(cache_key)
-    if cached_data and not request.GET.get('no-cache'):
-        # 即使有缓存，也需要更新浏览次数（异步）
-        post = BlogPost.objects.get(slug=slug, is_published=True)
-        post.view_count += 1
-        post.save(update_fields=['view_count'])
-        cached_data['post'].view_count = post.view_count
-        return render(request, 'blog/blog_detail.html', cached_data)
-
-    post = get_object_or_404(BlogPost, slug=slug, is_published=True)
-
-    # 增加浏览次数
-    post.view_count += 1
-    post.save(update_fields=['view_count'])
-
-    # 获取相关文章（相同分类或标签）
-    related_posts = BlogPost.objects.filter(
-        is_published=True
-    ).exclude(
-        id=post.id
-    ).filter(
-        category=post.category
-    )[:3]
+def detail_cache_key(slug):
+    return f'blog:detail:{slug}:v{DETAIL_LAYOUT}', [f'blog:detail:{slug}']
 
-    context = {
+
+def _detail_queryset():
+    return BlogPost.objects.published().select_related('category').prefetch_related(
+        Prefetch('tags', queryset=Tag.objects.only('name', 'slug'))
+    )
+
+
+def _related_queryset():
+    # 相关文章由 blog.related 预先算好，按 (post, rank) 索引一次读出
+    return BlogPost.objects.published().cards().order_by('related_by__rank')
+
+
+def _pack_detail(post, related_posts):
+    # 缓存文章详情（保存数据库中的浏览次数，展示值由计数器给出）
+    return dumps({
+        'post': PostDetail.from_post(post).pack(),
+        'related_posts': PostCard.pack_many([PostCard.from_post(related) for related in related_posts]),
+    })
+
+
+def _render_detail(request, post, data):
+    return render(request, 'blog/blog_detail.html', {
         'post': post,
-        'related_posts': related_posts,
-    }
+        'related_posts': PostCard.unpack_many(data['related_posts']),
+        # 静态发布的页面由 nginx 直接返回，加载后由页面中的脚本计入浏览次数
+        'count_view': getattr(request, 'prerendering', False),
+    })
+
+
+def _detail_data(request, slug):
+    """文章详情的缓存数据"""
+    def build():
+        post = get_object_or_404(_detail_queryset(), slug=slug)
+        related_posts = _related_queryset().filter(related_by__post_id=post.id)
+        # 以数据库值重置实时计数
+        seed_view_count(post.id, post.view_count)
+        return _pack_detail(post, related_posts)
 
-    # 缓存文章详情
-    cache.set(cache_key, context, 60 * 30)  # 缓存30分钟
+    # 缓存过期或失效时只有一个请求重建，其余请求先使用旧数据
+    key, namespaces = detail_cache_key(slug)
+    return loads(get_or_build(
+        key, namespaces, build, 60 * 30,  # 缓存30分钟
+        refresh=bool(request.GET.get('no-cache')),
+    ))
 
-    return render(request, 'blog/blog_detail.html', context)
+
+def blog_detail(request, slug):
+    """文章详情页"""
+    data = _detail_data(request, slug)
+    post = PostDetail.unpack(data['post'])
+    # 浏览次数写入缓冲计数器，由定期任务批量写回数据库；静态发布和缓存预热时不计入
+    if not getattr(request, 'prerendering', False):
+        post.view_count = record_view(post.id, post.view_count)
+    return _render_detail(request, post, data)
+
+
+@csrf_exempt
+@require_POST
+def record_post_view(request, slug):
+    """
+    计入一次浏览，返回实时浏览次数
+
+    静态发布的详情页不经过 blog_detail，由页面加载后的脚本请求这里。
+    文章 id 和数据库浏览次数读自详情页的缓存，命中时不访问数据库。
+    """
+    post = PostDetail.unpack(_detail_data(request, slug)['post'])
+    return JsonResponse({'view_count': record_view(post.id, post.view_count)})
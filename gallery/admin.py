@@ -1,7 +1,18 @@
 from django.contrib import admin
+from moyinji.variants import generate_variants_task
+from taskqueue.queue import enqueue_many
+from . import tasks
 from .models import PhotoAlbum, Photo
 
 
+def enqueue_image_generation(photos):
+    """把照片的缩略图和响应式图片重新生成加入后台任务"""
+    image_names = [name for name in photos.values_list('image', flat=True) if name]
+    enqueue_many(tasks.generate_thumbnails, [(name, True) for name in image_names])
+    enqueue_many(generate_variants_task, [(Photo._meta.label, name, True) for name in image_names])
+    return len(image_names)
+
+
 class PhotoInline(admin.TabularInline):
     model = Photo
     extra = 1
@@ -18,10 +29,12 @@ class PhotoAlbumAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('title',)}
     inlines = [PhotoInline]
     date_hierarchy = 'created_at'
+    actions = ['regenerate_images']
 
-    def photo_count(self, obj):
-        return obj.photo_count
-    photo_count.short_description = '照片数量'
+    @admin.action(description='在后台重新生成所选相册的缩略图和响应式图片')
+    def regenerate_images(self, request, queryset):
+        count = enqueue_image_generation(Photo.objects.filter(album__in=queryset))
+        self.message_user(request, f'已为 {count} 张照片加入后台任务')
 
 
 @admin.register(Photo)
@@ -32,6 +45,7 @@ class PhotoAdmin(admin.ModelAdmin):
     list_editable = ['order']
     readonly_fields = ['thumbnail_preview', 'created_at']
     date_hierarchy = 'date_taken'
+    actions = ['regenerate_images']
 
     fieldsets = (
         ('基本信息', {
@@ -56,3 +70,8 @@ class PhotoAdmin(admin.ModelAdmin):
             return format_html('<img src="{}" style="width: 200px; height: auto;" />', obj.image.url)
         return "无图片"
     thumbnail_preview.short_description = '预览'
+
+    @admin.action(description='在后台重新生成所选照片的缩略图和响应式图片')
+    def regenerate_images(self, request, queryset):
+        count = enqueue_image_generation(queryset)
+        self.message_user(request, f'已为 {count} 张照片加入后台任务')
@@ -0,0 +1,43 @@
+"""
+相册只读 API
+"""
+from moyinji.api import ReadOnlyViewSet
+
+from .models import Photo, PhotoAlbum
+from .serializers import AlbumSerializer, PhotoSerializer
+
+
+class AlbumViewSet(ReadOnlyViewSet):
+    """相册，可用 ?featured=1 只取精选"""
+    serializer_class = AlbumSerializer
+
+    def get_base_queryset(self):
+        albums = PhotoAlbum.objects.all()
+        if self.request.query_params.get('featured'):
+            albums = albums.filter(is_featured=True)
+        return albums
+
+    def etag_namespaces(self):
+        if self.action == 'retrieve':
+            return [f'gallery:album:{self.kwargs["slug"]}']
+        return ['gallery:list']
+
+
+class PhotoViewSet(ReadOnlyViewSet):
+    """照片，可用 ?album= 只取某个相册"""
+    serializer_class = PhotoSerializer
+    lookup_field = 'pk'
+    cursor_ordering = ('order', 'id')
+
+    def get_base_queryset(self):
+        photos = Photo.objects.all()
+        if self.request.query_params.get('album'):
+            photos = photos.filter(album__slug=self.request.query_params['album'])
+        return photos
+
+    def etag_namespaces(self):
+        # 每次照片变化都会递增 gallery:list，按相册筛选时只依赖该相册
+        album = self.request.query_params.get('album')
+        if album and self.action == 'list':
+            return [f'gallery:album:{album}']
+        return ['gallery:list']
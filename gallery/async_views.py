@@ -0,0 +1,49 @@
+"""
+相册的异步视图
+
+ASGI 部署（``ASYNC_VIEWS=True``）时代替 ``gallery.views`` 中的同名视图，
+输出完全相同。
+"""
+import asyncio
+
+from django.http import Http404
+
+from moyinji.response_cache import cache_response
+from moyinji.stale_cache import aget_or_build
+from moyinji.viewmodels import loads
+
+from .models import Photo, PhotoAlbum
+from .views import _pack_detail, _render_detail, _render_list, detail_cache_key, list_cache_key
+
+
+@cache_response(list_cache_key, 60 * 15)  # 缓存15分钟
+async def gallery_list(request):
+    """相册列表页"""
+    albums = [album async for album in PhotoAlbum.objects.with_cover()]
+    return _render_list(request, albums)
+
+
+async def _album(slug):
+    try:
+        return await PhotoAlbum.objects.aget(slug=slug)
+    except PhotoAlbum.DoesNotExist:
+        raise Http404('No PhotoAlbum matches the given query.')
+
+
+async def _photos(slug):
+    return [photo async for photo in Photo.objects.filter(album__slug=slug).defer('exif_data')]
+
+
+async def gallery_detail(request, slug):
+    """相册详情页"""
+    async def build():
+        # 照片按相册的 slug 连接查询，与相册本身同时取出
+        album, photos = await asyncio.gather(_album(slug), _photos(slug))
+        return _pack_detail(album, photos)
+
+    key, namespaces = detail_cache_key(slug)
+    data = loads(await aget_or_build(
+        key, namespaces, build, 60 * 30,  # 缓存30分钟
+        refresh=bool(request.GET.get('no-cache')),
+    ))
+    return _render_detail(request, data)
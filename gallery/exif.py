@@ -0,0 +1,135 @@
+"""
+照片 EXIF 提取
+
+Pillow 的 ``Image.open`` 只解析文件头，``getexif()`` 读取 APP1 段，
+都不会解码像素数据，所以即使是几十兆的原图也只需读取开头的少量字节。
+"""
+from datetime import datetime
+from fractions import Fraction
+
+from PIL import ExifTags, Image, UnidentifiedImageError
+
+# 提取结果中对应 Photo 字段的键及其最大长度
+FIELD_LENGTHS = {
+    'camera': 50,
+    'lens': 50,
+    'focal_length': 20,
+    'aperture': 10,
+    'shutter_speed': 20,
+    'iso': 10,
+}
+
+EXIF_FIELDS = tuple(FIELD_LENGTHS) + ('date_taken', 'exif_data')
+
+
+def _to_json(value):
+    """将 EXIF 值转换为可 JSON 序列化的形式"""
+    if isinstance(value, bytes):
+        return None
+    if isinstance(value, (tuple, list)):
+        return [_to_json(v) for v in value]
+    if hasattr(value, 'numerator') and hasattr(value, 'denominator') and not isinstance(value, int):
+        return float(value) if value.denominator else None
+    if isinstance(value, str):
+        return value.strip('\x00 ').strip()
+    return value
+
+
+def _format_number(value):
+    number = float(value)
+    return f'{number:g}'
+
+
+def _format_shutter(value):
+    """曝光时间：小于1秒的显示为分数"""
+    seconds = float(value)
+    if seconds <= 0:
+        return ''
+    if seconds >= 1:
+        return _format_number(seconds)
+    return f'1/{round(1 / seconds)}'
+
+
+def read_exif(fileobj):
+    """
+    从图片文件对象中读取 EXIF
+
+    Returns:
+        包含 EXIF_FIELDS 中各键的字典；图片无法识别或没有 EXIF 时返回空字典
+    """
+    try:
+        with Image.open(fileobj) as image:
+            exif = image.getexif()
+    except (UnidentifiedImageError, OSError, ValueError):
+        return {}
+    if not exif:
+        return {}
+
+    tags = dict(exif)
+    tags.update(exif.get_ifd(ExifTags.IFD.Exif))
+    raw = {}
+    for tag_id, value in tags.items():
+        name = ExifTags.TAGS.get(tag_id)
+        value = _to_json(value)
+        # 跳过指向子 IFD 的偏移量，它们对展示没有意义
+        if name and not name.endswith('Offset') and value not in (None, '', []):
+            raw[name] = value
+
+    make = raw.get('Make', '')
+    model = raw.get('Model', '')
+    camera = model if make and model.startswith(make) else f'{make} {model}'.strip()
+
+    result = {'camera': camera, 'lens': raw.get('LensModel', ''), 'exif_data': raw}
+    if 'FocalLength' in raw:
+        result['focal_length'] = f'{_format_number(raw["FocalLength"])}mm'
+    if 'FNumber' in raw:
+        result['aperture'] = _format_number(raw['FNumber'])
+    if 'ExposureTime' in raw:
+        result['shutter_speed'] = _format_shutter(Fraction(raw['ExposureTime']).limit_denominator(10000))
+    iso = raw.get('ISOSpeedRatings') or raw.get('PhotographicSensitivity')
+    if iso:
+        result['iso'] = str(iso[0] if isinstance(iso, list) else iso)
+    if 'DateTimeOriginal' in raw:
+        try:
+            result['date_taken'] = datetime.strptime(raw['DateTimeOriginal'], '%Y:%m:%d %H:%M:%S').date()
+        except (TypeError, ValueError):
+            pass
+
+    for field, length in FIELD_LENGTHS.items():
+        if field in result:
+            result[field] = str(result[field])[:length]
+    return result
+
+
+def apply_exif(photo, data, overwrite=False):
+    """
+    将提取结果写入照片，默认只填充空白字段，保留手工录入的值
+
+    Returns:
+        被修改的字段名列表
+    """
+    changed = []
+    for field in EXIF_FIELDS:
+        value = data.get(field)
+        if value in (None, '', {}):
+            continue
+        if overwrite or not getattr(photo, field):
+            setattr(photo, field, value)
+            changed.append(field)
+    return changed
+
+
+def read_exif_for_image(image_name):
+    """
+    进程池任务：按存储中的文件名读取 EXIF，不访问数据库
+
+    Returns:
+        (image_name, 提取结果, 错误信息或 None)
+    """
+    from django.core.files.storage import default_storage
+
+    try:
+        with default_storage.open(image_name, 'rb') as fileobj:
+            return image_name, read_exif(fileobj), None
+    except OSError as exc:
+        return image_name, {}, f'{image_name}: {exc}'
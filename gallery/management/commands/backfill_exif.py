@@ -0,0 +1,96 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from moyinji.generations import bump
+from moyinji.pool import create_pool
+
+from gallery.exif import EXIF_FIELDS, apply_exif, read_exif_for_image
+from gallery.models import Photo
+
+
+class Command(BaseCommand):
+    help = 'Extract EXIF for existing gallery photos in a process pool and save it in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help=f'Worker processes, 0 to run inline (default: IMAGE_WORKERS={settings.IMAGE_WORKERS})',
+        )
+        parser.add_argument('--batch-size', type=int, default=200, help='Photos per bulk_update')
+        parser.add_argument(
+            '--overwrite',
+            action='store_true',
+            help='Reprocess every photo and overwrite fields that already have values',
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        workers = settings.IMAGE_WORKERS if workers is None else workers
+        overwrite = options['overwrite']
+        batch_size = options['batch_size']
+
+        photos = Photo.objects.exclude(image='')
+        if not overwrite:
+            photos = photos.filter(exif_data__isnull=True)
+
+        started = time.perf_counter()
+        processed = updated = 0
+        errors = []
+        albums = set()
+        last_pk = 0
+        pool = create_pool(workers) if workers else None
+        try:
+            while True:
+                # 按主键分段读取，边读边写也不会漏掉或重复
+                batch = dict(
+                    photos.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'image')[:batch_size]
+                )
+                if not batch:
+                    break
+                last_pk = max(batch)
+                if pool:
+                    results = pool.map(read_exif_for_image, batch.values(), chunksize=8)
+                else:
+                    results = map(read_exif_for_image, batch.values())
+                extracted = {}
+                for name, data, error in results:
+                    if error:
+                        errors.append(error)
+                    extracted[name] = data
+
+                changed = []
+                for photo in (
+                    Photo.objects.filter(pk__in=batch)
+                    .select_related('album')
+                    .order_by()
+                    .only('pk', 'image', 'album__slug', *EXIF_FIELDS)
+                ):
+                    apply_exif(photo, extracted.get(photo.image.name) or {}, overwrite=overwrite)
+                    # 没有 EXIF 的照片记为空字典，下次回填不再读取
+                    if photo.exif_data is None:
+                        photo.exif_data = {}
+                    changed.append(photo)
+                    albums.add(photo.album.slug)
+                Photo.objects.bulk_update(changed, EXIF_FIELDS)
+                processed += len(batch)
+                updated += sum(1 for photo in changed if photo.exif_data)
+        finally:
+            if pool:
+                pool.shutdown()
+
+        # bulk_update 不触发信号，手动让相关相册的缓存失效
+        if albums:
+            bump('gallery:list', *(f'gallery:album:{slug}' for slug in albums))
+
+        elapsed = time.perf_counter() - started
+        rate = processed / elapsed if elapsed else 0
+        for error in errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} photos, {updated} with EXIF, {len(errors)} errors '
+            f'in {elapsed:.2f}s ({rate:.1f} photos/s).'
+        ))
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from gallery.models import Photo
+from gallery.thumbnails import generate_many
+
+
+class Command(BaseCommand):
+    help = 'Pre-generate thumbnail specs for gallery photos in a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help=f'Worker processes, 0 to run inline (default: IMAGE_WORKERS={settings.IMAGE_WORKERS})',
+        )
+        parser.add_argument('--album', help='Only process photos of this album slug')
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate specs even if the files already exist',
+        )
+
+    def handle(self, *args, **options):
+        photos = Photo.objects.exclude(image='')
+        if options['album']:
+            photos = photos.filter(album__slug=options['album'])
+        image_names = photos.values_list('image', flat=True).iterator()
+
+        stats = generate_many(image_names, workers=options['workers'], force=options['force'])
+
+        for error in stats.errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {stats.items} photos, generated {stats.generated} thumbnails, '
+            f'{len(stats.errors)} errors in {stats.elapsed:.2f}s ({stats.rate:.1f} photos/s).'
+        ))
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from moyinji import variants
+
+
+class Command(BaseCommand):
+    help = 'Generate responsive AVIF/WebP variants for blog covers and gallery photos in a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            action='append',
+            help='Only process this model label, e.g. blog.BlogPost (repeatable, default: all registered)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help=f'Worker processes, 0 to run inline (default: IMAGE_WORKERS={settings.IMAGE_WORKERS})',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate every variant, not only images whose manifest is missing or stale',
+        )
+
+    def handle(self, *args, **options):
+        sources = variants.sources()
+        labels = options['model'] or list(sources)
+        unknown = set(labels) - set(sources)
+        if unknown:
+            raise CommandError(f'Unknown model: {", ".join(sorted(unknown))} (choose from {", ".join(sources)})')
+        self.stdout.write(f'Formats: {", ".join(variants.available_formats()) or "none"}')
+
+        for label in labels:
+            source = sources[label]
+            rows = (
+                source.model._default_manager.exclude(**{source.source_field: ''})
+                .values_list(source.source_field, source.manifest_field)
+                .iterator()
+            )
+            image_names = {
+                name for name, manifest in rows
+                if options['force'] or not variants.is_current(manifest, name)
+            }
+            stats = variants.generate_many(
+                label, sorted(image_names), workers=options['workers'], force=options['force']
+            )
+
+            for error in stats.errors:
+                self.stderr.write(error)
+            self.stdout.write(self.style.SUCCESS(
+                f'{label}: processed {stats.items} images, generated {stats.generated} variants, '
+                f'{len(stats.errors)} errors in {stats.elapsed:.2f}s ({stats.rate:.1f} images/s).'
+            ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from gallery.models import PhotoAlbum
+from moyinji.generations import bump
+
+
+class Command(BaseCommand):
+    help = 'Recount photos and recompute the display cover of every album from the photo table'
+
+    def handle(self, *args, **options):
+        fixed = PhotoAlbum.objects.reconcile()
+        if fixed:
+            bump('gallery:list', *(f'gallery:album:{slug}' for slug in fixed))
+            self.stdout.write(f'Corrected: {", ".join(fixed)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Reconciled {PhotoAlbum.objects.count()} albums, {len(fixed)} corrected.'
+        ))
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gallery', '0002_photo_variants'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(fields=['album', 'order', '-created_at'], name='gallery_photo_album_order'),
+        ),
+        migrations.AddIndex(
+            model_name='photoalbum',
+            index=models.Index(fields=['-created_at'], name='gallery_album_recent'),
+        ),
+        migrations.AddIndex(
+            model_name='photoalbum',
+            index=models.Index(condition=models.Q(('is_featured', True)), fields=['-created_at'], name='gallery_album_featured_recent'),
+        ),
+    ]
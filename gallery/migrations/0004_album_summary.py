@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_album_summary(apps, schema_editor):
+    """按现有照片填充照片数量和展示封面"""
+    PhotoAlbum = apps.get_model('gallery', 'PhotoAlbum')
+    Photo = apps.get_model('gallery', 'Photo')
+    photos = Photo.objects.filter(album=OuterRef('pk'))
+    PhotoAlbum.objects.update(
+        photo_count=Coalesce(
+            Subquery(photos.order_by().values('album').annotate(total=Count('pk')).values('total')), 0
+        ),
+        cover=Coalesce('cover_photo', Subquery(photos.order_by('order', '-created_at').values('pk')[:1])),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gallery', '0003_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photoalbum',
+            name='cover',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='gallery.photo', verbose_name='展示封面'),
+        ),
+        migrations.AddField(
+            model_name='photoalbum',
+            name='photo_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='照片数量'),
+        ),
+        migrations.RunPython(fill_album_summary, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,50 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.utils.text import slugify
 from imagekit.models import ImageSpecField
 from imagekit.processors import ResizeToFill, ResizeToFit
 
 
+def first_photo_id():
+    """相册中排序第一的照片，用作未指定封面时的展示封面"""
+    return models.Subquery(
+        Photo.objects.filter(album=models.OuterRef('pk')).order_by('order', '-created_at').values('pk')[:1]
+    )
+
+
+class PhotoAlbumQuerySet(models.QuerySet):
+    """相册查询集"""
+
+    def with_cover(self):
+        """一次性带出展示封面，照片数量已保存在相册行中"""
+        return self.select_related('cover')
+
+    def refresh_covers(self):
+        """重新计算展示封面：指定的封面照片，未指定时为排序第一的照片"""
+        return self.update(cover=Coalesce('cover_photo', first_photo_id()))
+
+    def reconcile(self):
+        """
+        按照片表重新计算照片数量和展示封面
+
+        Returns:
+            数据有变化的相册 slug 列表
+        """
+        before = {pk: (count, cover) for pk, count, cover in self.values_list('pk', 'photo_count', 'cover')}
+        photo_total = Photo.objects.filter(album=models.OuterRef('pk')).order_by().values(
+            'album'
+        ).annotate(total=models.Count('pk')).values('total')
+        self.update(
+            photo_count=Coalesce(models.Subquery(photo_total), 0),
+            cover=Coalesce('cover_photo', first_photo_id()),
+        )
+        return [
+            slug for pk, slug, count, cover in self.values_list('pk', 'slug', 'photo_count', 'cover')
+            if before.get(pk) != (count, cover)
+        ]
+
+
 class PhotoAlbum(models.Model):
     """相册"""
     THEME_COLOR_CHOICES = [
@@ -13,6 +53,8 @@ class PhotoAlbum(models.Model):
         ('#2A5CAA', '黛蓝'),
         ('#D03B40', '朱砂'),
     ]
+    # 由信号维护的字段，保存相册时不写回内存中可能已过期的值
+    SUMMARY_FIELDS = ('cover', 'photo_count')
 
     title = models.CharField(max_length=100, verbose_name='相册名称')
     slug = models.SlugField(unique=True, verbose_name='URL别名')
@@ -31,13 +73,35 @@ class PhotoAlbum(models.Model):
         related_name='album_cover',
         verbose_name='封面照片'
     )
+    # 以下两个字段由 gallery.signals 维护，可用 reconcile_albums 命令按照片表校正
+    cover = models.ForeignKey(
+        'Photo',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='+',
+        verbose_name='展示封面'
+    )
+    photo_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='照片数量')
     created_at = models.DateField(auto_now_add=True, verbose_name='创建日期')
     is_featured = models.BooleanField(default=False, verbose_name='是否精选')
 
+    objects = PhotoAlbumQuerySet.as_manager()
+
     class Meta:
         verbose_name = '相册'
         verbose_name_plural = '相册'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='gallery_album_recent'),
+            # 首页只取精选相册
+            models.Index(
+                fields=['-created_at'],
+                condition=models.Q(is_featured=True),
+                name='gallery_album_featured_recent',
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -45,15 +109,16 @@ class PhotoAlbum(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.SUMMARY_FIELDS
+            ]
         super().save(*args, **kwargs)
 
     def get_absolute_url(self):
         return reverse('gallery:detail', kwargs={'slug': self.slug})
 
-    @property
-    def photo_count(self):
-        return self.photos.count()
-
 
 class Photo(models.Model):
     """照片"""
@@ -78,6 +143,7 @@ class Photo(models.Model):
         format='JPEG',
         options={'quality': 90}
     )
+    variants = models.JSONField(null=True, blank=True, editable=False, verbose_name='响应式图片清单')
     description = models.TextField(blank=True, verbose_name='描述')
     location = models.CharField(max_length=100, blank=True, verbose_name='拍摄地点')
     date_taken = models.DateField(blank=True, null=True, verbose_name='拍摄日期')
@@ -98,6 +164,10 @@ class Photo(models.Model):
         verbose_name = '照片'
         verbose_name_plural = '照片'
         ordering = ['order', '-created_at']
+        indexes = [
+            # 相册详情按默认排序读取照片
+            models.Index(fields=['album', 'order', '-created_at'], name='gallery_photo_album_order'),
+        ]
 
     def __str__(self):
         return self.title
@@ -0,0 +1,58 @@
+"""
+相册 API 的序列化器
+"""
+from moyinji.api import Field, RecordSerializer, attr, datetime_attr
+
+EXIF_FIELDS = ('camera', 'lens', 'focal_length', 'aperture', 'shutter_speed', 'iso')
+
+
+def _spec_url(spec):
+    def get(photo, serializer):
+        return serializer.absolute_url(getattr(photo, spec).url) if photo.image else None
+    return Field(get, columns=('image',))
+
+
+def _cover_url(album, serializer):
+    photo = album.cover
+    if photo is None or not photo.image:
+        return None
+    return serializer.absolute_url(photo.thumbnail_large.url)
+
+
+class AlbumSerializer(RecordSerializer):
+    FIELDS = {
+        'id': attr('id'),
+        'slug': attr('slug'),
+        'title': attr('title'),
+        'url': Field(
+            lambda album, s: s.absolute_url(album.get_absolute_url()), columns=('slug',)
+        ),
+        'description': attr('description'),
+        'theme_color': attr('theme_color'),
+        'cover_url': Field(_cover_url, columns=('cover__image',), related=('cover',)),
+        'photo_count': attr('photo_count'),
+        'is_featured': attr('is_featured'),
+        'created_at': datetime_attr('created_at'),
+    }
+
+
+class PhotoSerializer(RecordSerializer):
+    FIELDS = {
+        'id': attr('id'),
+        'album': Field(lambda photo, s: photo.album.slug, columns=('album__slug',), related=('album',)),
+        'title': attr('title'),
+        'image_url': Field(
+            lambda photo, s: s.absolute_url(photo.image.url) if photo.image else None,
+            columns=('image',),
+        ),
+        'thumbnail_url': _spec_url('thumbnail_square'),
+        'large_url': _spec_url('thumbnail_large'),
+        'description': attr('description'),
+        'location': attr('location'),
+        'date_taken': datetime_attr('date_taken'),
+        'exif': Field(
+            lambda photo, s: {name: getattr(photo, name) for name in EXIF_FIELDS},
+            columns=EXIF_FIELDS,
+        ),
+        'order': attr('order'),
+    }
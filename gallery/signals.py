@@ -1,27 +1,148 @@
-from django.db.models.signals import post_save, post_delete
+import math
+
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
-from django.core.cache import cache
+from django.urls import reverse
+from moyinji import publish, variants, warm
+from moyinji.generations import bump
 from .models import PhotoAlbum, Photo
+from . import tasks
+from .exif import apply_exif, read_exif
+
+
+def photo_namespaces(photo):
+    """照片会出现的缓存命名空间：所属相册详情，以及列表中的封面"""
+    return [f'gallery:album:{photo.album.slug}', 'gallery:list']
+
+
+# 照片保存后在后台生成响应式变体，完成后失效所属相册的缓存
+variants.register(Photo, 'image', 'variants', photo_namespaces)
+
+
+def published_pages():
+    """静态发布的相册页面：相册列表和全部相册"""
+    return [reverse('gallery:list')] + [
+        reverse('gallery:detail', kwargs={'slug': slug})
+        for slug in PhotoAlbum.objects.values_list('slug', flat=True)
+    ]
+
+
+def namespace_pages(namespace):
+    """命名空间失效后需要重新发布的页面"""
+    if namespace == 'gallery:list':
+        return [reverse('gallery:list')]
+    if namespace.startswith('gallery:album:'):
+        return [reverse('gallery:detail', kwargs={'slug': namespace.removeprefix('gallery:album:')})]
+    return []
+
+
+# 内容变化后重新发布受影响的静态页面
+publish.register(published_pages, namespace_pages)
+
+
+def warm_pages():
+    """缓存预热的相册页面：列表页最先；相册没有浏览次数，排在文章之后，精选和照片多的在前"""
+    albums = PhotoAlbum.objects.order_by('-is_featured', '-photo_count').values_list('slug', flat=True)
+    return [(math.inf, reverse('gallery:list'))] + [
+        (0, reverse('gallery:detail', kwargs={'slug': slug})) for slug in albums
+    ]
+
+
+warm.register(warm_pages)
+
+
+def adjust_photo_count(album_id, delta):
+    """原子地增减相册的照片数量，不读取当前值；计数有偏差时不会减到负数"""
+    PhotoAlbum.objects.filter(pk=album_id).update(
+        photo_count=Greatest(F('photo_count') + delta, Value(0))
+    )
+
+
+@receiver(pre_save, sender=Photo)
+def remember_previous_album(sender, instance, **kwargs):
+    """记录修改前所属的相册，照片移到其他相册时两边的数量和缓存都要处理"""
+    instance._previous_album_id = None
+    instance._previous_namespaces = []
+    if not instance._state.adding:
+        previous = Photo.objects.filter(pk=instance.pk).values('album_id', 'album__slug').first()
+        if previous:
+            instance._previous_album_id = previous['album_id']
+            instance._previous_namespaces = [f'gallery:album:{previous["album__slug"]}']
+
+
+@receiver(post_save, sender=Photo)
+def update_album_summary(sender, instance, created, **kwargs):
+    """维护所属相册的照片数量和展示封面"""
+    previous = getattr(instance, '_previous_album_id', None)
+    if created:
+        adjust_photo_count(instance.album_id, 1)
+    elif previous and previous != instance.album_id:
+        adjust_photo_count(previous, -1)
+        adjust_photo_count(instance.album_id, 1)
+    # 新增、移动或调整排序都可能改变排序第一的照片
+    PhotoAlbum.objects.filter(pk__in={instance.album_id, previous} - {None}).refresh_covers()
+
+
+@receiver(post_delete, sender=Photo)
+def update_album_summary_on_delete(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, PhotoAlbum):
+        # 随相册级联删除，相册本身也即将删除
+        return
+    adjust_photo_count(instance.album_id, -1)
+    # 被删照片作为封面时外键已被置空，重新选出展示封面
+    PhotoAlbum.objects.filter(pk=instance.album_id).refresh_covers()
+
+
+@receiver(post_save, sender=PhotoAlbum)
+def update_album_cover(sender, instance, **kwargs):
+    """指定或取消封面照片后重新计算展示封面"""
+    PhotoAlbum.objects.filter(pk=instance.pk).refresh_covers()
+
+
+@receiver(pre_save, sender=PhotoAlbum)
+def remember_previous_album_slug(sender, instance, **kwargs):
+    """记录修改前的 slug，改名后旧地址的缓存和静态页面一并失效"""
+    instance._previous_namespaces = []
+    if instance.pk:
+        previous = PhotoAlbum.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+        if previous:
+            instance._previous_namespaces = [f'gallery:album:{previous}']
 
 
 @receiver(post_save, sender=PhotoAlbum)
 @receiver(post_delete, sender=PhotoAlbum)
 def clear_album_cache(sender, instance, **kwargs):
     """清除相册相关缓存"""
-    # 清除相册详情缓存
-    cache.delete(f'gallery:album:{instance.slug}:photos')
-
-    # 清除相册列表缓存
-    cache.delete('gallery:list:all')
+    # 相册详情（含改名前的地址）和相册列表
+    bump(f'gallery:album:{instance.slug}', 'gallery:list', *getattr(instance, '_previous_namespaces', []))
 
 
 @receiver(post_save, sender=Photo)
 @receiver(post_delete, sender=Photo)
-def clear_photo_cache(sender, instance, **kwargs):
+def clear_photo_cache(sender, instance, origin=None, **kwargs):
     """清除照片相关缓存"""
-    # 清除所属相册的详情缓存
-    if instance.album:
-        cache.delete(f'gallery:album:{instance.album.slug}:photos')
+    if isinstance(origin, PhotoAlbum):
+        # 随相册级联删除，由相册的信号统一失效
+        return
+    # 所属相册（含移入前的相册）的详情，以及列表中的照片数量和封面
+    bump(*photo_namespaces(instance), *getattr(instance, '_previous_namespaces', []))
+
+
+@receiver(post_save, sender=Photo)
+def pregenerate_thumbnails(sender, instance, **kwargs):
+    """事务提交后在后台生成缩略图，保存请求不等待缩放"""
+    if instance.image:
+        tasks.generate_thumbnails.enqueue(instance.image.name)
+
 
-    # 清除相册列表缓存
-    cache.delete('gallery:list:all')
+@receiver(pre_save, sender=Photo)
+def extract_exif(sender, instance, **kwargs):
+    """新上传的图片在保存前从文件头提取 EXIF，只填充空白字段"""
+    image = instance.image
+    if not image or image._committed:
+        return
+    image.seek(0)
+    apply_exif(instance, read_exif(image))
+    image.seek(0)
@@ -0,0 +1,12 @@
+"""相册的后台任务"""
+from taskqueue.queue import task
+
+from . import thumbnails
+
+
+@task
+def generate_thumbnails(image_name, force=False):
+    """为一张原图生成缩略图，失败时抛出异常以便重试"""
+    _, error = thumbnails.generate_for_image(image_name, force)
+    if error:
+        raise RuntimeError(error)
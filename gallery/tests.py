@@ -1,3 +1,504 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import ExifTags, Image
+
+from moyinji import variants
+from moyinji.generations import bump
+from moyinji.queryplan import QueryPlanRecorder
+
+from .models import Photo, PhotoAlbum
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'gallery-tests',
+    }
+}
+
+DUMMY_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    }
+}
+
+
+def make_image(name='photo.jpg', size=(64, 48), color='#3C4856', exif=None):
+    """生成一张测试用 JPEG 图片，可附带 EXIF"""
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='JPEG', exif=exif or Image.Exif())
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class MediaTestCase(TestCase):
+    """使用临时 MEDIA_ROOT 的测试基类"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+
+@override_settings(CACHES=DUMMY_CACHES)
+class QueryBudgetTest(MediaTestCase):
+    """页面查询次数不随数据量增长"""
+
+    def setUp(self):
+        self.count = 0
+
+    def create_albums(self, n, photos=2):
+        for _ in range(n):
+            self.count += 1
+            album = PhotoAlbum.objects.create(
+                title=f'相册{self.count}',
+                slug=f'album-{self.count}',
+                is_featured=True,
+            )
+            for i in range(photos):
+                photo = Photo.objects.create(album=album, title=f'照片{i}', image=make_image())
+            album.cover_photo = photo
+            album.save()
+        return album
+
+    def assertQueryBudget(self, url_func, budget):
+        """分别在少量和较多数据下请求，查询次数都应等于 budget"""
+        self.create_albums(1)
+        with self.assertNumQueries(budget):
+            self.client.get(url_func())
+        self.create_albums(4, photos=4)
+        with self.assertNumQueries(budget):
+            response = self.client.get(url_func())
+        self.assertEqual(response.status_code, 200)
+
+    def test_gallery_list_query_budget(self):
+        """测试相册列表页：相册连同封面和数量一次取出"""
+        self.assertQueryBudget(lambda: reverse('gallery:list'), 1)
+
+    def test_gallery_detail_query_budget(self):
+        """测试相册详情页：相册、照片"""
+        album = self.create_albums(1, photos=6)
+        self.assertQueryBudget(album.get_absolute_url, 2)
+
+    def test_home_query_budget(self):
+        """测试首页：最新文章、精选相册"""
+        self.assertQueryBudget(lambda: reverse('home'), 2)
+
+    def test_photo_count_is_stored(self):
+        """测试照片数量保存在相册行中，读取不再查询"""
+        self.create_albums(2, photos=3)
+        albums = list(PhotoAlbum.objects.with_cover())
+
+        with self.assertNumQueries(0):
+            counts = [album.photo_count for album in albums]
+            covers = [album.cover.title for album in albums]
+
+        self.assertEqual(counts, [3, 3])
+        self.assertEqual(covers, ['照片2', '照片2'])
+
+
+@override_settings(CACHES=DUMMY_CACHES)
+class AlbumSummaryTest(TestCase):
+    """相册的照片数量和展示封面"""
+
+    def setUp(self):
+        self.album = PhotoAlbum.objects.create(title='西湖四季', slug='west-lake')
+        self.other = PhotoAlbum.objects.create(title='古镇时光', slug='old-town')
+
+    def add_photo(self, title, album=None, order=0):
+        return Photo.objects.create(album=album or self.album, title=title, image='gallery/x.jpg', order=order)
+
+    def summary(self, album=None):
+        album = PhotoAlbum.objects.select_related('cover').get(pk=(album or self.album).pk)
+        return album.photo_count, album.cover.title if album.cover else None
+
+    def test_count_and_cover_follow_photo_changes(self):
+        """测试新增、调整排序、移动和删除照片后数量与封面随之更新"""
+        first = self.add_photo('断桥', order=2)
+        second = self.add_photo('苏堤', order=1)
+        self.assertEqual(self.summary(), (2, '苏堤'))
+
+        second.album = self.other
+        second.save()
+        self.assertEqual(self.summary(), (1, '断桥'))
+        self.assertEqual(self.summary(self.other), (1, '苏堤'))
+
+        first.delete()
+        self.assertEqual(self.summary(), (0, None))
+
+    def test_chosen_cover_takes_precedence(self):
+        """测试指定的封面照片优先，被删除后回退到排序第一的照片"""
+        self.add_photo('断桥', order=1)
+        chosen = self.add_photo('雷峰塔', order=2)
+        self.album.cover_photo = chosen
+        self.album.save()
+        self.assertEqual(self.summary(), (2, '雷峰塔'))
+
+        chosen.delete()
+        self.assertEqual(self.summary(), (1, '断桥'))
+
+    def test_reconcile_fixes_drift(self):
+        """测试绕过信号写入的照片由 reconcile_albums 命令校正"""
+        Photo.objects.bulk_create([
+            Photo(album=self.album, title=f'照片{i}', image='gallery/x.jpg', order=i) for i in range(3)
+        ])
+        self.assertEqual(self.summary(), (0, None))
+
+        out = io.StringIO()
+        call_command('reconcile_albums', stdout=out)
+
+        self.assertEqual(self.summary(), (3, '照片0'))
+        self.assertIn('1 corrected', out.getvalue())
+
+    def test_deleting_album_skips_per_photo_updates(self):
+        """测试删除相册时级联删除照片不再逐张更新相册"""
+        for i in range(3):
+            self.add_photo(f'照片{i}')
+        with self.assertNumQueries(5):
+            # 读取照片、置空两个封面外键、删除照片、删除相册
+            self.album.delete()
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GalleryListResponseCacheTest(TestCase):
+    """相册列表整页缓存"""
+
+    def setUp(self):
+        cache.clear()
+        self.album = PhotoAlbum.objects.create(title='西湖四季', slug='west-lake')
+        self.url = reverse('gallery:list')
+
+    def test_cached_list_supports_conditional_get(self):
+        """测试缓存命中不查询数据库，ETag 匹配时返回304"""
+        etag = self.client.get(self.url)['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_album_save_invalidates_list(self):
+        """测试保存相册后列表页立即更新"""
+        self.client.get(self.url)
+
+        self.album.title = '古镇时光'
+        self.album.save()
+
+        self.assertContains(self.client.get(self.url), '古镇时光')
+
+    def test_album_cards_follow_counter_updates(self):
+        """测试照片数等不经过 save 的变化也会反映到缓存的相册卡片中"""
+        PhotoAlbum.objects.create(title='古镇时光', slug='old-town')
+        response = self.client.get(self.url)
+        self.assertContains(response, '0 张照片', count=2)
+        # 卡片外按循环位置变化的样式不随卡片缓存
+        self.assertContains(response, 'stagger-1')
+
+        PhotoAlbum.objects.filter(pk=self.album.pk).update(photo_count=5)
+        bump('gallery:list')
+
+        response = self.client.get(self.url)
+        self.assertContains(response, '5 张照片')
+        self.assertContains(response, '0 张照片', count=1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, IMAGE_WORKERS=0)
+class AlbumPublishTest(MediaTestCase):
+    """相册页面的静态发布"""
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.root = directory
+        override = override_settings(PUBLISH_DIR=directory)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.album = PhotoAlbum.objects.create(title='西湖四季', slug='west-lake')
+        self.other = PhotoAlbum.objects.create(title='古镇时光', slug='old-town')
+        self.photo = Photo.objects.create(album=self.album, title='断桥残雪', image=make_image())
+        call_command('publish_site', stdout=io.StringIO())
+
+    def page(self, slug):
+        return os.path.join(self.root, 'gallery', slug, 'index.html')
+
+    def read(self, slug):
+        with open(self.page(slug), encoding='utf-8') as f:
+            return f.read()
+
+    def test_renamed_album_removes_old_page(self):
+        """测试相册改名后发布新地址并删除旧地址的页面"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.album.slug = 'west-lake-seasons'
+            self.album.save()
+
+        self.assertFalse(os.path.exists(self.page('west-lake')))
+        self.assertIn('断桥残雪', self.read('west-lake-seasons'))
+
+    def test_moved_photo_republishes_both_albums(self):
+        """测试照片移到其他相册后两个相册的页面都重新发布"""
+        self.assertIn('断桥残雪', self.read('west-lake'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.photo.album = self.other
+            self.photo.save()
+
+        self.assertNotIn('断桥残雪', self.read('west-lake'))
+        self.assertIn('断桥残雪', self.read('old-town'))
+
+
+@override_settings(CACHES=DUMMY_CACHES, IMAGE_WORKERS=0)
+class ThumbnailPregenerationTest(MediaTestCase):
+    """缩略图预生成"""
+
+    def setUp(self):
+        self.album = PhotoAlbum.objects.create(title='西湖四季', slug='west-lake')
+        self.photo = Photo.objects.create(album=self.album, title='断桥', image=make_image())
+
+    def spec_exists(self, spec):
+        file = getattr(self.photo, spec)
+        return file.storage.exists(file.name)
+
+    def test_request_path_does_not_generate_thumbnails(self):
+        """测试请求相册详情不会生成缩略图"""
+        response = self.client.get(self.album.get_absolute_url())
+
+        self.assertContains(response, self.photo.thumbnail_large.url)
+        self.assertFalse(self.spec_exists('thumbnail_large'))
+
+    def test_command_generates_missing_specs_and_skips_current(self):
+        """测试命令生成缺失的缩略图，再次运行时跳过"""
+        out = io.StringIO()
+        call_command('generate_thumbnails', workers=0, stdout=out)
+
+        self.assertTrue(self.spec_exists('thumbnail_square'))
+        self.assertTrue(self.spec_exists('thumbnail_large'))
+        self.assertIn('generated 2 thumbnails', out.getvalue())
+
+        out = io.StringIO()
+        call_command('generate_thumbnails', workers=0, stdout=out)
+        self.assertIn('generated 0 thumbnails', out.getvalue())
+
+    def test_photo_save_schedules_generation_after_commit(self):
+        """测试保存照片并提交事务后生成缩略图"""
+        with self.captureOnCommitCallbacks(execute=True):
+            photo = Photo.objects.create(album=self.album, title='雷峰塔', image=make_image('tower.jpg'))
+
+        large = photo.thumbnail_large
+        self.assertTrue(os.path.exists(large.path))
+
+
+def make_exif():
+    """一组典型的相机 EXIF"""
+    exif = Image.Exif()
+    exif[ExifTags.Base.Make] = 'FUJIFILM'
+    exif[ExifTags.Base.Model] = 'X-T4'
+    ifd = exif.get_ifd(ExifTags.IFD.Exif)
+    ifd[ExifTags.Base.LensModel] = 'XF23mmF1.4 R'
+    ifd[ExifTags.Base.FocalLength] = 23.0
+    ifd[ExifTags.Base.FNumber] = 1.4
+    ifd[ExifTags.Base.ExposureTime] = 0.004
+    ifd[ExifTags.Base.ISOSpeedRatings] = 400
+    ifd[ExifTags.Base.DateTimeOriginal] = '2024:03:15 08:30:00'
+    return exif
+
+
+@override_settings(CACHES=DUMMY_CACHES, IMAGE_WORKERS=0)
+class ExifExtractionTest(MediaTestCase):
+    """EXIF 提取"""
+
+    def setUp(self):
+        self.album = PhotoAlbum.objects.create(title='西湖四季', slug='west-lake')
+
+    def test_upload_fills_exif_fields(self):
+        """测试上传时从文件头提取 EXIF 并格式化"""
+        photo = Photo.objects.create(album=self.album, title='断桥', image=make_image(exif=make_exif()))
+        photo.refresh_from_db()
+
+        self.assertEqual(photo.camera, 'FUJIFILM X-T4')
+        self.assertEqual(photo.lens, 'XF23mmF1.4 R')
+        self.assertEqual(photo.focal_length, '23mm')
+        self.assertEqual(photo.aperture, '1.4')
+        self.assertEqual(photo.shutter_speed, '1/250')
+        self.assertEqual(photo.iso, '400')
+        self.assertEqual(str(photo.date_taken), '2024-03-15')
+        self.assertEqual(photo.exif_data['Model'], 'X-T4')
+
+    def test_upload_keeps_manual_values(self):
+        """测试手工填写的字段不被 EXIF 覆盖"""
+        photo = Photo.objects.create(
+            album=self.album, title='断桥', camera='胶片机', image=make_image(exif=make_exif())
+        )
+
+        self.assertEqual(photo.camera, '胶片机')
+        self.assertEqual(photo.iso, '400')
+
+    def test_backfill_updates_existing_photos(self):
+        """测试回填命令批量写入已有照片，没有 EXIF 的照片不再重复读取"""
+        with_exif = Photo.objects.create(album=self.album, title='断桥', image=make_image(exif=make_exif()))
+        without_exif = Photo.objects.create(album=self.album, title='雷峰塔', image=make_image('tower.jpg'))
+        Photo.objects.update(camera='', iso='', exif_data=None)
+
+        out = io.StringIO()
+        with self.assertNumQueries(4):
+            # 读取一批、取出照片、bulk_update，再读取下一批
+            call_command('backfill_exif', workers=0, stdout=out)
+
+        with_exif.refresh_from_db()
+        without_exif.refresh_from_db()
+        self.assertEqual(with_exif.camera, 'FUJIFILM X-T4')
+        self.assertEqual(with_exif.iso, '400')
+        self.assertEqual(without_exif.exif_data, {})
+        self.assertIn('Processed 2 photos, 1 with EXIF', out.getvalue())
+
+        out = io.StringIO()
+        call_command('backfill_exif', workers=0, stdout=out)
+        self.assertIn('Processed 0 photos', out.getvalue())
+
+
+@override_settings(CACHES=DUMMY_CACHES, IMAGE_WORKERS=0, IMAGE_VARIANT_FORMATS=['webp'])
+class ResponsiveVariantTest(MediaTestCase):
+    """响应式图片变体"""
+
+    def setUp(self):
+        self.album = PhotoAlbum.objects.create(title='西湖四季', slug='west-lake')
+
+    def create_photo(self, size=(700, 300)):
+        with self.captureOnCommitCallbacks(execute=True):
+            photo = Photo.objects.create(album=self.album, title='断桥', image=make_image(size=size))
+        photo.refresh_from_db()
+        return photo
+
+    def test_save_generates_variants_and_manifest(self):
+        """测试保存照片后生成各宽度的变体，不放大原图"""
+        photo = self.create_photo()
+
+        self.assertEqual(photo.variants['widths'], [320, 640, 700])
+        self.assertEqual(photo.variants['formats'], ['webp'])
+        for width in (320, 640, 700):
+            name = variants.variant_name(photo.image.name, width, 'webp')
+            self.assertTrue(os.path.exists(os.path.join(self.media_root, name)))
+
+    def test_template_uses_manifest_without_storage_access(self):
+        """测试页面按清单输出 srcset，渲染时不检查文件是否存在"""
+        photo = self.create_photo()
+        srcset_entry = variants.variant_name(photo.image.name, 640, 'webp')
+
+        with mock.patch.object(FileSystemStorage, 'exists', side_effect=AssertionError('storage hit')):
+            response = self.client.get(self.album.get_absolute_url())
+
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, f'{srcset_entry} 640w')
+
+    def test_stale_manifest_is_ignored(self):
+        """测试清单与当前原图不符时只输出原图"""
+        photo = self.create_photo()
+        Photo.objects.filter(pk=photo.pk).update(variants={**photo.variants, 'source': 'other.jpg'})
+
+        response = self.client.get(self.album.get_absolute_url())
+
+        self.assertNotContains(response, '<source')
+        self.assertContains(response, photo.thumbnail_large.url)
+
+    def test_command_restores_missing_manifest(self):
+        """测试命令只处理缺少清单的图片，已有的变体文件直接复用"""
+        photo = self.create_photo(size=(64, 48))
+        Photo.objects.update(variants=None)
+
+        out = io.StringIO()
+        call_command('generate_variants', model=['gallery.Photo'], workers=0, stdout=out)
+
+        photo.refresh_from_db()
+        self.assertEqual(photo.variants['widths'], [64])
+        self.assertIn('processed 1 images, generated 0 variants', out.getvalue())
+
+        out = io.StringIO()
+        call_command('generate_variants', model=['gallery.Photo'], workers=0, stdout=out)
+        self.assertIn('processed 0 images', out.getvalue())
+
+
+@override_settings(CACHES=LOCMEM_CACHES, IMAGE_WORKERS=0)
+class GalleryApiTest(MediaTestCase):
+    """相册只读 API"""
+
+    def setUp(self):
+        cache.clear()
+        for i in range(3):
+            album = PhotoAlbum.objects.create(title=f'相册{i}', slug=f'album-{i}')
+            for j in range(2):
+                photo = Photo.objects.create(album=album, title=f'照片{j}', image=make_image(), order=j)
+            album.cover_photo = photo
+            album.save()
+
+    def test_album_list_single_query(self):
+        """测试相册列表连同封面和照片数量一次取出"""
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('album-list'))
+
+        album = response.json()['results'][0]
+        self.assertEqual(album['photo_count'], 2)
+        self.assertTrue(album['cover_url'].startswith('http://testserver/media/'))
+
+    def test_photos_filtered_by_album(self):
+        """测试按相册筛选照片，照片变化后相册的 ETag 失效"""
+        url = reverse('photo-list')
+        response = self.client.get(url, {'album': 'album-1'})
+        self.assertEqual([p['title'] for p in response.json()['results']], ['照片0', '照片1'])
+        self.assertEqual(response.json()['results'][0]['album'], 'album-1')
+
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, {'album': 'album-1'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Photo.objects.filter(album__slug='album-1').first().save()
+        self.assertEqual(self.client.get(url, {'album': 'album-1'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(CACHES=DUMMY_CACHES)
+class QueryPlanTest(TestCase):
+    """在较大的数据量下，相册页面的查询都应走索引而非顺序扫描"""
+
+    @classmethod
+    def setUpTestData(cls):
+        albums = PhotoAlbum.objects.bulk_create(
+            PhotoAlbum(title=f'相册{i}', slug=f'album-{i}', is_featured=i % 10 == 0) for i in range(100)
+        )
+        Photo.objects.bulk_create(
+            Photo(album=album, title=f'照片{j}', image=f'gallery/{album.pk}-{j}.jpg', order=j)
+            for album in albums for j in range(30)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_gallery_pages(self):
+        """测试首页精选、相册列表、相册详情及照片 API"""
+        for url in [
+            reverse('home'),
+            reverse('gallery:list'),
+            reverse('gallery:detail', kwargs={'slug': 'album-3'}),
+            reverse('album-list') + '?featured=1',
+            reverse('photo-list') + '?album=album-3',
+        ]:
+            with self.subTest(url=url):
+                with QueryPlanRecorder() as recorder:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                scans = recorder.sequential_scans()
+                self.assertEqual(scans, [], '\n'.join(map(str, scans)))
@@ -0,0 +1,63 @@
+"""
+照片缩略图预生成
+
+imagekit 默认在首次访问缩略图 URL 时同步生成（JustInTime），第一个访问
+相册的用户要为整页原图的解码和缩放买单。这里把生成移出请求路径：
+
+- ``Pregenerated`` 缓存文件策略：访问 URL 时既不检查也不生成文件
+- ``generate_thumbnails`` 命令：在有界进程池中批量生成，已存在的跳过
+- 照片保存后把该照片加入后台任务队列，由 worker 生成（见 gallery/tasks.py）
+"""
+from moyinji.pool import run_batched
+
+SPEC_FIELDS = ('thumbnail_square', 'thumbnail_large')
+
+
+class Pregenerated:
+    """缩略图已预先生成，请求路径只拼接 URL，不检查存在性也不生成"""
+
+    def should_verify_existence(self, file):
+        return False
+
+
+def generate_for_image(image_name, force=False):
+    """
+    为一张原图生成全部缩略图规格，已存在的规格跳过
+
+    只依赖原图文件名，不访问数据库，可以在子进程中执行。
+
+    Returns:
+        (生成的规格数, 错误信息或 None)
+    """
+    # spawn 子进程先导入本模块再执行 django.setup()，模型只能延迟导入
+    from .models import Photo
+
+    photo = Photo(image=image_name)
+    generated = 0
+    try:
+        for spec in SPEC_FIELDS:
+            file = getattr(photo, spec)
+            exists = file.storage.exists(file.name)
+            if exists and not force:
+                continue
+            if exists:
+                # 存储在同名文件存在时会另起文件名，强制重建前先删除
+                file.storage.delete(file.name)
+            file.generate(force=True)
+            generated += 1
+    except (OSError, ValueError) as exc:
+        return generated, f'{image_name}: {exc}'
+    return generated, None
+
+
+def generate_many(image_names, workers=None, force=False):
+    """
+    批量生成缩略图
+
+    Args:
+        image_names: 原图文件名的可迭代对象
+        workers: 进程数，0 表示在当前进程中执行
+        force: 是否重新生成已存在的规格
+    """
+    return run_batched(generate_for_image, image_names, force, workers=workers)
+
@@ -1,9 +1,16 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'gallery'
 
-urlpatterns = [
-    path('', views.gallery_list, name='list'),
-    path('<slug:slug>/', views.gallery_detail, name='detail'),
-]
+
+def url_patterns(use_async=False):
+    """use_async 为 True 时使用 gallery.async_views 中的异步视图"""
+    pages = async_views if use_async else views
+    return [
+        path('', pages.gallery_list, name='list'),
+        path('<slug:slug>/', pages.gallery_detail, name='detail'),
+    ]
+
+
+urlpatterns = url_patterns()
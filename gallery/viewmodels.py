@@ -0,0 +1,77 @@
+"""
+相册页面的视图模型
+"""
+from moyinji.variants import image_sources
+from moyinji.viewmodels import ViewModel, decode_date, encode_datetime
+
+
+def spec_url(photo, spec):
+    """照片某个缩略图规格的 URL，没有图片时返回空字符串"""
+    if photo is None or not photo.image:
+        return ''
+    return getattr(photo, spec).url
+
+
+def photo_sources(photo):
+    """照片响应式变体的 <source> 列表"""
+    if photo is None:
+        return []
+    return image_sources(photo.image, photo.variants)
+
+
+class AlbumCard(ViewModel):
+    """相册卡片：相册列表、首页精选"""
+    FIELDS = ('title', 'url', 'description', 'cover_url', 'cover_sources', 'photo_count', 'created_at')
+    __slots__ = FIELDS
+
+    @classmethod
+    def from_album(cls, album, cover_spec='thumbnail_large'):
+        """由 PhotoAlbum.objects.with_cover() 取出的相册构建"""
+        return cls(
+            album.title,
+            album.get_absolute_url(),
+            album.description,
+            spec_url(album.cover, cover_spec),
+            photo_sources(album.cover),
+            album.photo_count,
+            album.created_at,
+        )
+
+    def pack(self):
+        data = super().pack()
+        data[6] = encode_datetime(self.created_at)
+        return data
+
+    @classmethod
+    def unpack(cls, data):
+        record = cls(*data)
+        record.created_at = decode_date(record.created_at)
+        return record
+
+
+class AlbumDetail(ViewModel):
+    """相册详情页头部"""
+    FIELDS = ('title', 'slug', 'description')
+    __slots__ = FIELDS
+
+    @classmethod
+    def from_album(cls, album):
+        return cls(album.title, album.slug, album.description)
+
+
+class PhotoItem(ViewModel):
+    """相册详情中的一张照片"""
+    FIELDS = ('title', 'image_url', 'large_url', 'sources', 'description', 'location', 'exif')
+    __slots__ = FIELDS
+
+    @classmethod
+    def from_photo(cls, photo):
+        return cls(
+            photo.title,
+            photo.image.url if photo.image else '',
+            spec_url(photo, 'thumbnail_large'),
+            photo_sources(photo),
+            photo.description,
+            photo.location,
+            photo.get_exif_display(),
+        )
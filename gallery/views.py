@@ -1,49 +1,62 @@
 from django.shortcuts import render, get_object_or_404
-from django.views.decorators.cache import cache_page
-from django.core.cache import cache
-from .models import PhotoAlbum, Photo
+from moyinji.response_cache import cache_response
+from moyinji.stale_cache import get_or_build
+from moyinji.viewmodels import dumps, layout_version, loads
+from .models import PhotoAlbum
+from .viewmodels import AlbumCard, AlbumDetail, PhotoItem
 
 
-@cache_page(60 * 15)  # 缓存15分钟
-def gallery_list(request):
-    """相册列表页"""
-    cache_key = 'gallery:list:all'
-
-    # 尝试从缓存获取
-    cached_context = cache.get(cache_key)
-    if cached_context:
-        return render(request, 'gallery/gallery_list.html', cached_context)
+def list_cache_key(request):
+    """相册列表页整页缓存的键"""
+    return 'gallery:list:all', ['gallery:list']
 
-    albums = PhotoAlbum.objects.all()
 
+def _render_list(request, albums):
     context = {
-        'albums': albums,
+        'albums': [AlbumCard.from_album(album) for album in albums],
     }
 
-    # 缓存上下文
-    cache.set(cache_key, context, 60 * 15)
-
     return render(request, 'gallery/gallery_list.html', context)
 
 
-def gallery_detail(request, slug):
-    """相册详情页"""
-    cache_key = f'gallery:album:{slug}:photos'
+@cache_response(list_cache_key, 60 * 15)  # 缓存15分钟
+def gallery_list(request):
+    """相册列表页"""
+    return _render_list(request, PhotoAlbum.objects.with_cover())
 
-    # 尝试从缓存获取相册
-    cached_data = cache.get(cache_key)
-    if cached_data and not request.GET.get('no-cache'):
-        return render(request, 'gallery/gallery_detail.html', cached_data)
 
-    album = get_object_or_404(PhotoAlbum, slug=slug)
-    photos = album.photos.all()
+# 详情缓存中打包的视图模型布局
+DETAIL_LAYOUT = layout_version(AlbumDetail, PhotoItem)
 
-    context = {
-        'album': album,
-        'photos': photos,
-    }
 
-    # 缓存相册详情
-    cache.set(cache_key, context, 60 * 30)  # 缓存30分钟
+def detail_cache_key(slug):
+    return f'gallery:album:{slug}:photos:v{DETAIL_LAYOUT}', [f'gallery:album:{slug}']
+
+
+def _pack_detail(album, photos):
+    return dumps({
+        'album': AlbumDetail.from_album(album).pack(),
+        'photos': PhotoItem.pack_many([PhotoItem.from_photo(photo) for photo in photos]),
+    })
+
 
-    return render(request, 'gallery/gallery_detail.html', context)
+def _render_detail(request, data):
+    return render(request, 'gallery/gallery_detail.html', {
+        'album': AlbumDetail.unpack(data['album']),
+        'photos': PhotoItem.unpack_many(data['photos']),
+    })
+
+
+def gallery_detail(request, slug):
+    """相册详情页"""
+    def build():
+        album = get_object_or_404(PhotoAlbum, slug=slug)
+        return _pack_detail(album, album.photos.defer('exif_data'))
+
+    # 缓存过期或失效时只有一个请求重建，其余请求先使用旧数据
+    key, namespaces = detail_cache_key(slug)
+    data = loads(get_or_build(
+        key, namespaces, build, 60 * 30,  # 缓存30分钟
+        refresh=bool(request.GET.get('no-cache')),
+    ))
+    return _render_detail(request, data)
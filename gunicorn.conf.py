@@ -0,0 +1,40 @@
+"""
+Gunicorn 配置，在项目根目录运行 ``gunicorn`` 时自动加载
+
+SERVER_PROFILE 选择部署方式：
+
+- ``wsgi``（默认）：同步 worker，同步视图
+- ``asgi``：uvicorn worker，首页、博客和相册页面使用异步视图（ASYNC_VIEWS=True）
+"""
+import os
+import shutil
+
+profile = os.environ.get('SERVER_PROFILE', 'wsgi')
+if profile not in ('wsgi', 'asgi'):
+    raise ValueError(f'Unknown SERVER_PROFILE: {profile}')
+
+if profile == 'asgi':
+    wsgi_app = 'moyinji.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'moyinji.wsgi:application'
+    worker_class = 'sync'
+
+# worker 导入 Django 设置之前确定使用哪一套视图
+os.environ.setdefault('ASYNC_VIEWS', str(profile == 'asgi'))
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 3))
+
+
+def on_starting(server):
+    # 清空上次运行留下的各 worker 指标文件（见 moyinji.metrics）
+    metrics_dir = os.environ.get('METRICS_DIR')
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+def post_worker_init(worker):
+    # 接受请求前编译好模板（cached 加载器按进程保存）
+    from moyinji.template_backends import precompile
+    precompile()
@@ -0,0 +1,188 @@
+"""
+只读 REST API 的公共部分
+
+- ``RecordSerializer``：按字段表直接构建字典，不经过 DRF 字段对象的
+  逐字段校验与转换，列表序列化开销接近手写 dict
+- 稀疏字段集：``?fields=id,title`` 只输出并只查询所需的列和关联
+- 游标分页（``moyinji.pagination``）：不执行 COUNT，翻页深度不影响开销
+- ``ReadOnlyViewSet``：ETag 由请求路径和所依赖缓存命名空间的代数算出，
+  If-None-Match 命中时在查询数据库之前直接返回 304
+"""
+import hashlib
+
+from django.db.models import Prefetch
+from django.utils.cache import get_conditional_response, patch_cache_control
+from rest_framework import serializers, viewsets
+from rest_framework.exceptions import ParseError
+
+from .generations import versioned_key
+
+
+class Field:
+    """
+    记录字段
+
+    Args:
+        getter: ``getter(obj, serializer)`` 返回字段值
+        columns: 该字段需要加载的列（传给 ``QuerySet.only``）
+        related: 需要 select_related 的关联
+        prefetch: 需要 prefetch_related 的关联（字符串或 Prefetch）
+    """
+    __slots__ = ('getter', 'columns', 'related', 'prefetch')
+
+    def __init__(self, getter, columns=(), related=(), prefetch=()):
+        self.getter = getter
+        self.columns = tuple(columns)
+        self.related = tuple(related)
+        self.prefetch = tuple(prefetch)
+
+
+def attr(name):
+    """直接读取同名模型字段"""
+    return Field(lambda obj, s: getattr(obj, name), columns=(name,))
+
+
+def datetime_attr(name):
+    def get(obj, s):
+        value = getattr(obj, name)
+        return value.isoformat() if value else None
+    return Field(get, columns=(name,))
+
+
+class RecordSerializer(serializers.BaseSerializer):
+    """
+    只读的字段表序列化器
+
+    子类声明 ``FIELDS``（字段名到 Field 的有序映射）和 ``LIST_FIELDS``
+    （列表接口默认输出的字段，未声明时输出全部）。
+    """
+    FIELDS = {}
+    LIST_FIELDS = None
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        names = fields or list(self.FIELDS)
+        self._fields = [(name, self.FIELDS[name].getter) for name in names]
+
+    @classmethod
+    def parse_fields(cls, value, default=None):
+        """解析 ``?fields=`` 参数，未知字段返回 400"""
+        if not value:
+            return list(default or cls.FIELDS)
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = [name for name in names if name not in cls.FIELDS]
+        if unknown:
+            raise ParseError(
+                f'Unknown fields: {", ".join(unknown)}. Available: {", ".join(cls.FIELDS)}'
+            )
+        return names
+
+    @classmethod
+    def optimize(cls, queryset, names, extra_columns=()):
+        """只加载所选字段需要的列，并预取所需的关联"""
+        columns, related, prefetch = ['pk', *extra_columns], [], []
+        for name in names:
+            field = cls.FIELDS[name]
+            columns.extend(field.columns)
+            related.extend(r for r in field.related if r not in related)
+            prefetch.extend(p for p in field.prefetch if p not in prefetch)
+        if related:
+            queryset = queryset.select_related(*related)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset.only(*dict.fromkeys(columns))
+
+    def absolute_url(self, url):
+        """相对地址转为绝对地址，前缀每个请求只计算一次"""
+        if not url or not url.startswith('/'):
+            return url
+        base = self.context.get('base_url')
+        if base is None:
+            request = self.context.get('request')
+            base = request.build_absolute_uri('/')[:-1] if request else ''
+            self.context['base_url'] = base
+        return base + url
+
+    def to_representation(self, instance):
+        return {name: getter(instance, self) for name, getter in self._fields}
+
+
+def tags_prefetch(model):
+    """只取名称和 slug 的标签预取"""
+    return Prefetch('tags', queryset=model.objects.only('name', 'slug'))
+
+
+class ReadOnlyViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    只读视图集
+
+    子类实现 ``get_base_queryset()`` 和 ``etag_namespaces()``，
+    序列化器的列和关联由所选字段决定。
+    """
+    lookup_field = 'slug'
+    cursor_ordering = ('-created_at', '-id')
+
+    def get_base_queryset(self):
+        raise NotImplementedError
+
+    def etag_namespaces(self):
+        """响应内容依赖的缓存命名空间"""
+        raise NotImplementedError
+
+    def get_fields(self):
+        if not hasattr(self, '_selected_fields'):
+            serializer_class = self.get_serializer_class()
+            default = serializer_class.LIST_FIELDS if self.action == 'list' else None
+            self._selected_fields = serializer_class.parse_fields(
+                self.request.query_params.get('fields'), default
+            )
+        return self._selected_fields
+
+    def get_queryset(self):
+        ordering = self.cursor_ordering if self.action == 'list' else ()
+        columns = [field.lstrip('-') for field in ordering]
+        return self.get_serializer_class().optimize(
+            self.get_base_queryset(), self.get_fields(), columns
+        )
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def get_etag(self, request, create=True):
+        """当前代数下的 ETag；``create`` 为 False 且计数器缺失时返回 None"""
+        key = versioned_key(
+            f'api:{request.accepted_renderer.format}:{request.get_full_path()}',
+            *self.etag_namespaces(), create=create,
+        )
+        if key is None:
+            return None
+        return '"%s"' % hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+
+    def _conditional(self, request, handler, *args, **kwargs):
+        # 计数器缺失时客户端不可能持有有效的 ETag，直接处理请求，
+        # 成功后才创建计数器（见 finalize_response），返回 404 的请求不留下计数器
+        self.etag = self.get_etag(request, create=False)
+        if self.etag is not None:
+            not_modified = get_conditional_response(request, etag=self.etag)
+            if not_modified is not None:
+                return not_modified
+        response = handler(request, *args, **kwargs)
+        if self.etag is None and response.status_code == 200:
+            self.etag = self.get_etag(request)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(request, super().retrieve, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        etag = getattr(self, 'etag', None)
+        if etag and response.status_code in (200, 304):
+            response['ETag'] = etag
+            # 允许客户端保存，但每次使用前都要带 If-None-Match 重新验证
+            patch_cache_control(response, no_cache=True)
+        return response
@@ -0,0 +1,22 @@
+"""
+首页的异步视图
+
+ASGI 部署（``ASYNC_VIEWS=True``）时代替 ``moyinji.views.home``。
+"""
+import asyncio
+
+from .views import featured_albums_queryset, latest_posts_queryset, render_home
+
+
+async def alist(queryset):
+    """异步取出查询集的全部结果"""
+    return [obj async for obj in queryset]
+
+
+async def home(request):
+    """首页：最新文章和精选相册两组查询同时发出"""
+    latest_posts, featured_albums = await asyncio.gather(
+        alist(latest_posts_queryset()),
+        alist(featured_albums_queryset()),
+    )
+    return render_home(request, latest_posts, featured_albums)
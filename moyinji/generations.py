@@ -0,0 +1,150 @@
+"""
+基于命名空间代数（generation）的缓存失效
+
+每个命名空间（如 ``blog:list``、``blog:tag:<slug>``）在缓存中有一个
+代数计数器，缓存键会带上它所依赖的各命名空间的当前代数。失效时只需
+对计数器做一次 INCR，旧键不再被命中，等待自然过期即可，
+不需要像 delete_pattern 那样 SCAN 整个键空间。
+
+代数在每个 worker 内保留至多 ``LOCAL_CACHE_MAX_AGE`` 秒（见
+``moyinji.local_cache``），其他 worker 的失效最迟在这段时间后可见；
+本进程中的 ``bump`` 立即生效。
+
+命名空间来自请求的 URL（文章 slug、分类参数等），计数器只在条目构建
+成功后（``create=True``）或失效时创建，返回 404 的请求不会留下计数器；
+计数器带有 ``GENERATION_TIMEOUT``，不会在缓存中无限累积。
+"""
+import time
+
+from django.core.cache import cache
+from django.dispatch import Signal
+
+from .local_cache import local_cache
+from .metrics import record_cache
+
+GENERATION_PREFIX = 'gen'
+# 计数器自创建起的过期时间（INCR 不改变它），须长于依赖它的条目的最长保留
+# 时间（stale_cache 中为软过期加 STALE_TIMEOUT）：计数器过期时按它构建的条目
+# 早已过期，重新计数不会命中旧条目，代价只是每个周期一次未命中
+GENERATION_TIMEOUT = 60 * 60 * 24 * 7
+
+# bump 之后发送，参数 namespaces 为失效的命名空间（静态发布据此重新生成页面）
+invalidated = Signal()
+
+
+def _generation_key(namespace):
+    return f'{GENERATION_PREFIX}:{namespace}'
+
+
+def _initial_generation():
+    # 计数器丢失（如 Redis 重启或被淘汰）后用时间戳重新开始，
+    # 保证不会与丢失前已经用过的代数重复
+    return int(time.time() * 1000)
+
+
+def get_generations(*namespaces, create=True):
+    """
+    批量读取命名空间的当前代数
+
+    Args:
+        create: 初始化缺失的计数器；为 False 时缺失的代数为 None
+    """
+    keys = [_generation_key(ns) for ns in namespaces]
+    values = _local_generations(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        values.update(cache.get_many(missing))
+
+    generations = []
+    for key in keys:
+        value = values.get(key)
+        record_cache(GENERATION_PREFIX, 'miss' if value is None else 'hit')
+        if value is None:
+            if not create:
+                generations.append(None)
+                continue
+            value = _initial_generation()
+            if not cache.add(key, value, GENERATION_TIMEOUT):
+                value = cache.get(key, value)
+        if key in missing:
+            local_cache.set(key, value)
+        generations.append(value)
+    return generations
+
+
+async def aget_generations(*namespaces, create=True):
+    """get_generations 的异步版本"""
+    keys = [_generation_key(ns) for ns in namespaces]
+    values = _local_generations(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        values.update(await cache.aget_many(missing))
+
+    generations = []
+    for key in keys:
+        value = values.get(key)
+        record_cache(GENERATION_PREFIX, 'miss' if value is None else 'hit')
+        if value is None:
+            if not create:
+                generations.append(None)
+                continue
+            value = _initial_generation()
+            if not await cache.aadd(key, value, GENERATION_TIMEOUT):
+                value = await cache.aget(key, value)
+        if key in missing:
+            local_cache.set(key, value)
+        generations.append(value)
+    return generations
+
+
+def _local_generations(keys):
+    values = {}
+    for key in keys:
+        value = local_cache.get(key)
+        if value is not None:
+            values[key] = value
+    return values
+
+
+def generation_token(*namespaces, create=True):
+    """
+    所依赖命名空间的当前代数合成的标记，任一命名空间失效后标记随之改变
+
+    ``create`` 为 False 且有计数器缺失时返回 None：尚没有按当前代数构建的条目。
+    """
+    return _token(get_generations(*namespaces, create=create))
+
+
+async def ageneration_token(*namespaces, create=True):
+    return _token(await aget_generations(*namespaces, create=create))
+
+
+def _token(generations):
+    if None in generations:
+        return None
+    return 'g' + '.'.join(str(g) for g in generations)
+
+
+def versioned_key(key, *namespaces, create=True):
+    """
+    为缓存键附加所依赖命名空间的代数，``create`` 为 False 且有计数器缺失时返回 None
+
+    Examples:
+        >>> versioned_key('blog:detail:spring', 'blog:detail:spring')
+        'blog:detail:spring:g1700000000000'
+    """
+    token = generation_token(*namespaces, create=create)
+    return None if token is None else f'{key}:{token}'
+
+
+def bump(*namespaces):
+    """使命名空间失效：每个命名空间一次 INCR"""
+    for namespace in dict.fromkeys(namespaces):
+        key = _generation_key(namespace)
+        local_cache.delete(key)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # 计数器不存在，说明尚无依赖它的缓存键
+            cache.add(key, _initial_generation(), GENERATION_TIMEOUT)
+    invalidated.send(sender=bump, namespaces=namespaces)
@@ -0,0 +1,108 @@
+"""
+进程内缓存层
+
+热点键（列表页、热门文章）每次命中都要经过一次 Redis 往返、zlib 解压和
+反序列化。``local_cache`` 在每个 worker 内按 LRU 保留最近读到的值：
+
+- 每个值最多保留 ``LOCAL_CACHE_MAX_AGE`` 秒，之后重新从 Redis 读取；
+- 总大小超过 ``LOCAL_CACHE_MAX_BYTES`` 时淘汰最久未用的值。
+
+失效不需要广播：视图缓存的条目记有构建时的代数标记，代数计数器本身也只在
+本地保留 ``LOCAL_CACHE_MAX_AGE`` 秒（``moyinji.generations``），信号递增
+代数后，其他 worker 最迟在这段时间之后就会发现本地条目已经过期。
+
+默认缓存本身就在进程内（locmem、dummy）时这一层不起作用。
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+# 本身就在进程内的缓存后端，前面不需要再加一层
+IN_PROCESS_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def enabled():
+    return (
+        getattr(settings, 'LOCAL_CACHE_MAX_AGE', 0) > 0
+        and settings.CACHES['default']['BACKEND'] not in IN_PROCESS_BACKENDS
+    )
+
+
+class LocalCache:
+    """线程安全、按大小和存活时间淘汰的 LRU"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # 键 -> (值, 过期时间, 大小)
+        self._bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        """读取未超过存活时间的值，没有时返回 None"""
+        if not enabled():
+            return None
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            if time.monotonic() > item[1]:
+                self._pop(key)
+                return None
+            self._data.move_to_end(key)
+            return item[0]
+
+    def set(self, key, value, size=0, max_age=None):
+        """
+        写入一个值
+
+        Args:
+            size: 值的大致字节数，用于 ``LOCAL_CACHE_MAX_BYTES`` 限制
+            max_age: 保留时间（秒），默认 ``LOCAL_CACHE_MAX_AGE``；
+                只有内容不会变化的值（如按内容摘要命名的片段）才应加长
+        """
+        if not enabled():
+            return
+        limit = getattr(settings, 'LOCAL_CACHE_MAX_BYTES', 32 * 1024 * 1024)
+        if size > limit:
+            return
+        with self._lock:
+            self._pop(key)
+            expires = time.monotonic() + (max_age or settings.LOCAL_CACHE_MAX_AGE)
+            self._data[key] = (value, expires, size)
+            self._bytes += size
+            while self._bytes > limit:
+                self._pop(next(iter(self._data)))
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _pop(self, key):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._bytes -= item[2]
+
+
+local_cache = LocalCache()
+
+
+@receiver(setting_changed)
+def clear_on_cache_settings_change(setting, **kwargs):
+    # 测试中切换缓存后端时，本地保留的值不再对应新的后端
+    if setting in ('CACHES', 'LOCAL_CACHE_MAX_AGE', 'LOCAL_CACHE_MAX_BYTES'):
+        local_cache.clear()
@@ -0,0 +1,314 @@
+"""
+请求性能指标
+
+``PerformanceMiddleware`` 为每个请求记录：
+
+- 数据库查询次数和耗时（每个数据库连接上的 execute wrapper）
+- 各缓存命名空间的命中与未命中（读缓存处调用 ``record_cache``）
+- 模板渲染耗时（``moyinji.template_backends.DjangoTemplates``）
+- 请求总耗时
+
+本次请求的数据写入 ``Server-Timing`` 响应头，浏览器开发者工具可以直接查看。
+响应头会暴露查询次数和缓存命中情况，默认只对已登录的管理员输出，
+``SERVER_TIMING`` 为 True 时对所有请求输出；运维统一从 ``/metrics/`` 获取。
+累计值由 ``/metrics/`` 以 Prometheus 文本格式输出。gunicorn 有多个 worker
+进程时，各进程把自己的累计值定期写入 ``METRICS_DIR`` 下以 pid 命名的文件，
+``/metrics/`` 汇总目录中的全部文件，因此无论请求落在哪个 worker 上，
+看到的都是所有进程的合计。
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# 请求耗时直方图的桶（秒）
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 指标名 -> (类型, 说明)
+FAMILIES = {
+    'moyinji_http_requests_total': ('counter', 'HTTP requests by view, method and status'),
+    'moyinji_http_request_duration_seconds': ('histogram', 'Request latency by view'),
+    'moyinji_db_queries_total': ('counter', 'Database queries by view'),
+    'moyinji_db_query_duration_seconds_total': ('counter', 'Time spent in database queries by view'),
+    'moyinji_template_render_duration_seconds_total': ('counter', 'Time spent rendering templates by view'),
+    'moyinji_cache_requests_total': ('counter', 'Cache lookups by key namespace and result'),
+}
+
+_current = ContextVar('moyinji_request_timings', default=None)
+
+
+@dataclass
+class RequestTimings:
+    """一个请求内累计的耗时和计数"""
+    queries: int = 0
+    query_seconds: float = 0.0
+    render_seconds: float = 0.0
+    render_depth: int = 0
+    # 命名空间 -> {结果: 次数}，结果为 hit / miss / stale
+    cache: dict = field(default_factory=dict)
+
+    def server_timing(self, total_seconds):
+        """Server-Timing 响应头的值"""
+        entries = [
+            f'db;dur={self.query_seconds * 1000:.2f};desc="{self.queries} queries"',
+            f'render;dur={self.render_seconds * 1000:.2f}',
+        ]
+        for namespace, counts in sorted(self.cache.items()):
+            # 指标名只能是 token，命名空间中的冒号换成点
+            name = namespace.replace(':', '.')
+            desc = f'{counts.get("hit", 0)} hit {counts.get("miss", 0)} miss'
+            if counts.get('stale'):
+                desc += f' {counts["stale"]} stale'
+            entries.append(f'cache-{name};desc="{desc}"')
+        entries.append(f'total;dur={total_seconds * 1000:.2f}')
+        return ', '.join(entries)
+
+
+def _time_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries += 1
+        timings.query_seconds += time.perf_counter() - started
+
+
+def _install_query_timer(connection):
+    # 常驻在连接上，按上下文变量找到当前请求：异步视图的查询在 sync_to_async
+    # 的线程中执行，用的是那个线程的连接，中间件所在线程的连接上看不到它们。
+    # 放在最外层，不影响 execute_wrapper() 上下文管理器按后进先出移除自己的包装
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _time_query)
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    _install_query_timer(connection)
+
+
+def record_cache(namespace, result):
+    """
+    记录一次缓存读取，请求之外（如管理命令中）的调用被忽略
+
+    Args:
+        result: ``'hit'``、``'miss'``，或 ``'stale'``（返回了过期数据）
+    """
+    timings = _current.get()
+    if timings is not None:
+        counts = timings.cache.setdefault(namespace, {})
+        counts[result] = counts.get(result, 0) + 1
+
+
+@contextmanager
+def render_timer():
+    """统计模板渲染耗时，模板中嵌套的渲染只计最外层一次"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    timings.render_depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.render_depth -= 1
+        if timings.render_depth == 0:
+            timings.render_seconds += time.perf_counter() - started
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _sample_order(key):
+    # 同一序列的桶排在一起，按上界的数值排列
+    name, labels = key
+    values = dict(labels)
+    return name, [label for label in labels if label[0] != 'le'], float(values.get('le', 0))
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+class Collector:
+    """
+    一个进程内的累计指标
+
+    样本以 ``(样本名, 标签)`` 为键，标签是排好序的 ``(名, 值)`` 元组。
+    直方图展开成 ``_bucket`` / ``_sum`` / ``_count`` 样本，
+    这样各进程的快照可以直接逐项相加。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.last_flush = 0.0
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.samples[key] = self.samples.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        # 每个桶都要输出，未落入的桶加 0
+        for bound in DURATION_BUCKETS:
+            self.inc(f'{name}_bucket', {**labels, 'le': _format_value(bound)}, int(value <= bound))
+        self.inc(f'{name}_bucket', {**labels, 'le': '+Inf'})
+        self.inc(f'{name}_sum', labels, value)
+        self.inc(f'{name}_count', labels)
+
+    def record_request(self, request, response, total_seconds, timings):
+        match = request.resolver_match
+        view = {'view': match.view_name if match else 'unresolved'}
+        self.inc('moyinji_http_requests_total', {
+            **view, 'method': request.method, 'status': str(response.status_code),
+        })
+        self.observe('moyinji_http_request_duration_seconds', view, total_seconds)
+        self.inc('moyinji_db_queries_total', view, timings.queries)
+        self.inc('moyinji_db_query_duration_seconds_total', view, timings.query_seconds)
+        self.inc('moyinji_template_render_duration_seconds_total', view, timings.render_seconds)
+        for namespace, counts in timings.cache.items():
+            for result, count in counts.items():
+                self.inc('moyinji_cache_requests_total', {'namespace': namespace, 'result': result}, count)
+        self.flush()
+
+    def snapshot(self):
+        with self.lock:
+            return [[name, list(labels), value] for (name, labels), value in self.samples.items()]
+
+    def flush(self, force=False):
+        """把本进程的累计值写入 METRICS_DIR，未配置目录时什么也不做"""
+        directory = getattr(settings, 'METRICS_DIR', None)
+        if not directory:
+            return
+        now = time.monotonic()
+        if not force and now - self.last_flush < getattr(settings, 'METRICS_FLUSH_INTERVAL', 5):
+            return
+        self.last_flush = now
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'{os.getpid()}.json'
+        # 先写临时文件再替换，读取方不会看到写了一半的文件
+        temporary = path.with_suffix('.tmp')
+        temporary.write_text(json.dumps({'samples': self.snapshot()}))
+        os.replace(temporary, path)
+
+    def collect(self):
+        """所有进程的合计；未配置 METRICS_DIR 时只有本进程"""
+        directory = getattr(settings, 'METRICS_DIR', None)
+        if not directory:
+            return {(name, tuple(map(tuple, labels))): value for name, labels, value in self.snapshot()}
+
+        self.flush(force=True)
+        totals = {}
+        # 已退出的 worker 的文件保留，计数器的合计才不会回退；部署时清空目录
+        for path in Path(directory).glob('*.json'):
+            try:
+                samples = json.loads(path.read_text())['samples']
+            except (OSError, ValueError, KeyError):
+                continue
+            for name, labels, value in samples:
+                key = (name, tuple(map(tuple, labels)))
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def render(self):
+        """Prometheus 文本格式"""
+        totals = self.collect()
+        lines = []
+        for family, (kind, help_text) in FAMILIES.items():
+            names = (
+                {f'{family}_bucket', f'{family}_sum', f'{family}_count'}
+                if kind == 'histogram' else {family}
+            )
+            samples = sorted((key for key in totals if key[0] in names), key=_sample_order)
+            lines.append(f'# HELP {family} {help_text}')
+            lines.append(f'# TYPE {family} {kind}')
+            for name, labels in samples:
+                label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels)
+                lines.append(f'{name}{{{label_text}}} {_format_value(totals[name, labels])}')
+        return '\n'.join(lines) + '\n'
+
+
+collector = Collector()
+
+
+class PerformanceMiddleware:
+    """
+    记录每个请求的查询、缓存和渲染耗时，累计到 collector，并对管理员写入 Server-Timing
+
+    同时支持同步和异步调用，ASGI 部署下不会让请求在中间件处切换到线程中执行。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # 本线程中早于本模块建立的连接没有收到 connection_created
+        for connection in connections.all():
+            _install_query_timer(connection)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total_seconds = time.perf_counter() - started
+        return self.finish(request, response, total_seconds, timings, show_server_timing(request))
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        total_seconds = time.perf_counter() - started
+        return self.finish(request, response, total_seconds, timings, await ashow_server_timing(request))
+
+    def finish(self, request, response, total_seconds, timings, server_timing):
+        collector.record_request(request, response, total_seconds, timings)
+        if server_timing:
+            response['Server-Timing'] = timings.server_timing(total_seconds)
+        return response
+
+
+def show_server_timing(request):
+    """SERVER_TIMING 为 True 时对所有请求输出 Server-Timing，否则只对管理员输出"""
+    if getattr(settings, 'SERVER_TIMING', False):
+        return True
+    # 用户由内层的 AuthenticationMiddleware 设置，响应返回后才读取，不计入本次请求
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_staff)
+
+
+async def ashow_server_timing(request):
+    """show_server_timing 的异步版本，异步上下文中不能同步查询会话和用户"""
+    if getattr(settings, 'SERVER_TIMING', False):
+        return True
+    auser = getattr(request, 'auser', None)
+    return bool(auser is not None and (await auser()).is_staff)
@@ -0,0 +1,17 @@
+"""
+API 游标分页
+
+DRF 的 CursorPagination 按排序字段的值翻页（WHERE ... LIMIT），
+不执行 COUNT，也不会像 OFFSET 分页那样扫描并丢弃前面的行。
+"""
+from rest_framework import pagination
+
+
+class CursorPagination(pagination.CursorPagination):
+    """游标分页，排序由视图的 ``cursor_ordering`` 指定"""
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, 'cursor_ordering', self.ordering)
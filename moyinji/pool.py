@@ -0,0 +1,82 @@
+"""
+图片处理进程池
+
+子进程使用 spawn 启动，避免从 gunicorn worker 或持有数据库连接的进程中
+fork；每个子进程启动时执行 django.setup()，之后才能导入模型。
+
+任务函数返回 ``(生成的文件数, 错误信息或 None)``，由 ``BatchStats`` 汇总。
+"""
+import itertools
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def create_pool(workers):
+    """创建有界进程池"""
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+    )
+
+
+class BatchStats:
+    """批量处理的统计"""
+
+    def __init__(self):
+        self.items = 0
+        self.generated = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+    def add(self, generated, error):
+        self.items += 1
+        self.generated += generated
+        if error:
+            self.errors.append(error)
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        return self.items / self.elapsed if self.elapsed else 0
+
+
+def run_batched(func, items, *args, workers=None, chunksize=8):
+    """
+    对每个元素执行 ``func(item, *args)``
+
+    Args:
+        items: 任务参数的可迭代对象
+        workers: 进程数，0 表示在当前进程中执行，默认 IMAGE_WORKERS
+    """
+    workers = settings.IMAGE_WORKERS if workers is None else workers
+    stats = BatchStats()
+    if workers == 0:
+        for item in items:
+            stats.add(*func(item, *args))
+        return stats
+
+    # Executor.map 会一次提交全部任务，按窗口分批提交以限制内存占用
+    items = iter(items)
+    window = workers * chunksize * 4
+    extra = [itertools.repeat(arg) for arg in args]
+    with create_pool(workers) as pool:
+        while True:
+            batch = list(itertools.islice(items, window))
+            if not batch:
+                break
+            for result in pool.map(func, batch, *extra, chunksize=chunksize):
+                stats.add(*result)
+    return stats
+
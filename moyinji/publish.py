@@ -0,0 +1,204 @@
+"""
+静态发布：把页面渲染成 HTML 文件，由 nginx 直接返回
+
+站点以读为主，匿名访问的页面对所有人都一样。设置 ``PUBLISH_DIR`` 后：
+
+- ``publish_site`` 命令渲染首页、关于页、文章列表（含各分类、标签的第一页）、
+  文章详情、相册列表和相册详情，写入发布目录，并删除已不存在的页面；
+- 之后每次缓存失效（``generations.bump``）都会把受影响的页面加入后台任务
+  队列重新发布：失效的命名空间由各应用映射为页面路径（见 ``register``），
+  每个页面一个任务，尚未执行的同一页面只发布一次，页面不存在（404）时
+  删除对应文件；
+- nginx 对不带查询参数的 GET 请求（以及只带 ``category``/``tag`` 的列表页）
+  先查找发布目录中的文件，找不到才转给 Django（配置见 nginx.conf）。
+
+页面 ``/blog/x/`` 写入 ``<PUBLISH_DIR>/blog/x/index.html``，
+``/blog/?category=y`` 写入 ``<PUBLISH_DIR>/blog/index@category=y.html``。
+发布时不经过视图缓存，直接以数据库中的最新数据渲染。
+"""
+import logging
+import os
+import tempfile
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.dispatch import receiver
+from django.http import Http404
+from django.test import RequestFactory
+from django.urls import Resolver404, resolve, reverse
+from taskqueue.queue import PRIORITY_HIGH, enqueue_many, task
+
+from . import stale_cache
+from .generations import invalidated
+
+logger = logging.getLogger(__name__)
+
+# 发布和预热时使用同步视图
+PUBLISH_URLCONF = 'moyinji.urls'
+
+# 各应用注册的 (全部页面, 命名空间 -> 页面)
+_registry = []
+
+
+def register(pages, namespace_pages):
+    """
+    注册一组可发布的页面
+
+    Args:
+        pages: 无参函数，返回全部页面路径
+        namespace_pages: ``namespace_pages(namespace)`` 返回该命名空间失效后
+            需要重新发布的页面路径，与之无关时返回空列表
+    """
+    _registry.append((pages, namespace_pages))
+
+
+def _site_pages():
+    return [reverse('home'), reverse('about')]
+
+
+def _site_namespace_pages(namespace):
+    # 首页展示最新文章和精选相册
+    return [reverse('home')] if namespace in ('blog:list', 'gallery:list') else []
+
+
+register(_site_pages, _site_namespace_pages)
+
+
+def enabled():
+    return bool(getattr(settings, 'PUBLISH_DIR', None))
+
+
+def all_pages():
+    return [path for pages, _ in _registry for path in pages()]
+
+
+def affected_pages(namespaces):
+    paths = {}
+    for _, namespace_pages in _registry:
+        for namespace in namespaces:
+            paths.update(dict.fromkeys(namespace_pages(namespace)))
+    return list(paths)
+
+
+def page_file(path):
+    """页面路径对应的发布文件"""
+    url = urlsplit(path)
+    name = f'index@{unquote(url.query)}.html' if url.query else 'index.html'
+    root = Path(settings.PUBLISH_DIR).resolve()
+    target = (root / unquote(url.path).lstrip('/') / name).resolve()
+    if not target.is_relative_to(root):
+        raise ValueError(f'Page {path!r} resolves outside PUBLISH_DIR')
+    return target
+
+
+def render_page(path, cached=False):
+    """
+    渲染一个页面
+
+    Args:
+        cached: 经过视图的缓存（缓存预热），默认不读写缓存，直接以数据库中的
+            最新数据渲染（静态发布）
+
+    Returns:
+        ``(状态码, HTML)``，页面不存在时为 ``(404, None)``
+    """
+    request = RequestFactory().get(path)
+    # 站内预渲染不是一次浏览，详情页不计入浏览次数
+    request.prerendering = True
+    try:
+        match = resolve(request.path_info, urlconf=PUBLISH_URLCONF)
+        with nullcontext() if cached else stale_cache.bypass():
+            response = match.func(request, *match.args, **match.kwargs)
+    except (Http404, Resolver404):
+        return 404, None
+    if response.status_code != 200:
+        return response.status_code, None
+    return 200, response.content
+
+
+def _write(target, content):
+    # 先写临时文件再替换，nginx 不会读到写了一半的页面
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=target.parent, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, target)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+@dataclass
+class PublishStats:
+    written: int = 0
+    removed: int = 0
+    errors: list = field(default_factory=list)
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def publish(paths, stats=None):
+    """
+    重新发布这些页面：渲染成功的写入文件，不存在的删除文件
+
+    单个页面失败只记录错误，不影响其余页面。
+    """
+    stats = stats or PublishStats()
+    for path in paths:
+        try:
+            target = page_file(path)
+            status, content = render_page(path)
+            if status == 200:
+                _write(target, content)
+                stats.written += 1
+            elif status in (404, 410):
+                if target.exists():
+                    target.unlink()
+                    stats.removed += 1
+            else:
+                stats.errors.append(f'{path}: HTTP {status}')
+        except Exception as exc:
+            logger.exception('发布页面 %s 失败', path)
+            stats.errors.append(f'{path}: {exc.__class__.__name__}: {exc}')
+    return stats
+
+
+def publish_site():
+    """发布全部页面，并删除发布目录中已不存在的页面"""
+    paths = all_pages()
+    stats = publish(paths)
+    current = {page_file(path) for path in paths}
+    root = Path(settings.PUBLISH_DIR)
+    for existing in root.rglob('*.html') if root.exists() else ():
+        if existing.resolve() not in current:
+            existing.unlink()
+            stats.removed += 1
+    return stats
+
+
+@task(priority=PRIORITY_HIGH)
+def publish_page(path):
+    """后台任务：重新发布一个页面，失败时抛出异常以便重试"""
+    stats = publish([path])
+    if stats.errors:
+        raise RuntimeError(stats.errors[0])
+
+
+def schedule(paths):
+    """在当前事务提交后于后台重新发布这些页面"""
+    enqueue_many(publish_page, [(path,) for path in paths])
+
+
+@receiver(invalidated)
+def publish_invalidated_pages(sender, namespaces, **kwargs):
+    if enabled():
+        schedule(affected_pages(namespaces))
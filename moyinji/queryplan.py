@@ -0,0 +1,96 @@
+"""
+查询计划检查
+
+记录一段代码执行的所有 SELECT，逐条 EXPLAIN，找出其中对整张表的
+顺序扫描。用于测试中确认页面的查询都能走索引：
+
+    with QueryPlanRecorder() as recorder:
+        client.get('/blog/')
+    assert not recorder.sequential_scans(allow={'blog_category'})
+
+支持 SQLite（``EXPLAIN QUERY PLAN`` 中不带 USING 的 ``SCAN``）和
+PostgreSQL（``EXPLAIN (FORMAT JSON)`` 中的 ``Seq Scan`` 节点）。
+PostgreSQL 对小表总会选择顺序扫描，检查前应写入足够的数据并执行 ANALYZE。
+"""
+import json
+import re
+from dataclasses import dataclass
+
+from django.db import connection as default_connection
+
+# SQLite 的全表扫描："SCAN blog_blogpost"；
+# "SCAN t USING INDEX i" 是按索引顺序读取（配合 LIMIT 提前结束），不算在内
+_SQLITE_SCAN = re.compile(r'^SCAN (?P<table>\w+)(?: AS \w+)?$')
+
+
+@dataclass
+class SequentialScan:
+    """一次顺序扫描：扫描的表及所在的查询"""
+    table: str
+    sql: str
+
+    def __str__(self):
+        return f'{self.table}: {self.sql}'
+
+
+class QueryPlanRecorder:
+    """记录执行过的 SELECT 语句，退出上下文后可检查它们的查询计划"""
+
+    def __init__(self, connection=None):
+        self.connection = connection or default_connection
+        self.queries = []
+
+    def __enter__(self):
+        self._wrapper = self.connection.execute_wrapper(self._record)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    def _record(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    def scanned_tables(self, sql, params):
+        """一条查询中被顺序扫描的表"""
+        vendor = self.connection.vendor
+        with self.connection.cursor() as cursor:
+            if vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                return [
+                    match['table']
+                    for match in (_SQLITE_SCAN.match(row[-1]) for row in cursor.fetchall())
+                    if match
+                ]
+            if vendor == 'postgresql':
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                return list(_postgres_seq_scans(plan[0]['Plan']))
+        raise NotImplementedError(f'Query plan inspection is not supported on {vendor}')
+
+    def sequential_scans(self, allow=()):
+        """
+        所有查询中的顺序扫描
+
+        Args:
+            allow: 允许整表读取的表名，如本来就要列出全部行的小表
+        """
+        scans = []
+        for sql, params in self.queries:
+            scans.extend(
+                SequentialScan(table, sql)
+                for table in self.scanned_tables(sql, params)
+                if table not in allow
+            )
+        return scans
+
+
+def _postgres_seq_scans(node):
+    if node.get('Node Type') == 'Seq Scan':
+        yield node['Relation Name']
+    for child in node.get('Plans', ()):
+        yield from _postgres_seq_scans(child)
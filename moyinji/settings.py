@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 import os
+from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -43,9 +44,12 @@ INSTALLED_APPS = [
     # Local apps
     'blog',
     'gallery',
+    'taskqueue',
 ]
 
 MIDDLEWARE = [
+    # 放在最前面，总耗时覆盖其余全部中间件
+    'moyinji.metrics.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,20 +59,35 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'moyinji.urls'
+# ASGI 部署（uvicorn worker）时设置 ASYNC_VIEWS=True，首页、博客和相册页面使用异步视图；
+# WSGI 部署保持同步视图，避免每个请求都在同步线程中另起事件循环
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', 'False').lower() == 'true'
+
+ROOT_URLCONF = 'moyinji.urls_async' if ASYNC_VIEWS else 'moyinji.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # 内置后端的子类，额外统计模板渲染耗时
+        'BACKEND': 'moyinji.template_backends.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # 模板编译一次后在进程内复用；开发服务器在模板文件修改后自动清空
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            'libraries': {
+                'responsive': 'moyinji.templatetags.responsive',
+                'fragments': 'moyinji.templatetags.fragments',
+            },
         },
     },
 ]
@@ -79,12 +98,50 @@ WSGI_APPLICATION = 'moyinji.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# 由环境变量选择数据库，未设置 DB_ENGINE 时使用本地 SQLite。
+# 生产环境（docker-compose）使用 PostgreSQL：
+#   DB_ENGINE=django.db.backends.postgresql DB_NAME DB_USER DB_PASSWORD DB_HOST DB_PORT
+DB_ENGINE = os.environ.get('DB_ENGINE', 'django.db.backends.sqlite3')
+
+if DB_ENGINE == 'django.db.backends.sqlite3':
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        }
     }
-}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': os.environ.get('DB_NAME', 'moyinji_db'),
+            'USER': os.environ.get('DB_USER', 'moyinji'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            # 持久连接：每个 worker 线程复用连接，不再为每个请求建立 TCP 连接和认证。
+            # 复用前先检查连接是否可用，数据库重启后自动重连
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 300)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 5)),
+            },
+        }
+    }
+
+    if os.environ.get('DB_POOL', 'False').lower() == 'true':
+        # 进程内连接池（Django 5.1+，需要 psycopg[pool]），与持久连接互斥。
+        # 适合线程较多的 worker：连接数由池的上限约束，而不是线程数
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        }
+
+    if os.environ.get('DB_PGBOUNCER', 'False').lower() == 'true':
+        # 经 PgBouncer 事务模式连接时，服务端游标和预备语句无法跨事务使用
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
 
 
 # Password validation
@@ -136,13 +193,25 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # REST Framework configuration
 REST_FRAMEWORK = {
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'moyinji.pagination.CursorPagination',
     'PAGE_SIZE': 12,
+    # API 只读且公开，不需要会话认证和 CSRF 检查
+    'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.AllowAny'],
+    'UNAUTHENTICATED_USER': None,
 }
 
 # ImageKit configuration
 IMAGEKIT_CACHEFILE_DIR = 'cache'
-IMAGEKIT_DEFAULT_CACHEFILE_BACKEND = 'imagekit.cachefiles.backends.Default'
+IMAGEKIT_DEFAULT_CACHEFILE_BACKEND = 'imagekit.cachefiles.backends.Simple'
+# 缩略图由 generate_thumbnails 命令和保存后的后台任务预先生成，请求路径不缩放图片
+IMAGEKIT_DEFAULT_CACHEFILE_STRATEGY = 'gallery.thumbnails.Pregenerated'
+# 批量生成缩略图、响应式图片的命令使用的进程数，0 表示在当前进程中同步处理
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+# 响应式图片：生成的宽度和格式，Pillow 不支持的格式会被跳过
+IMAGE_VARIANT_DIR = 'variants'
+IMAGE_VARIANT_WIDTHS = [320, 640, 960, 1280, 1920]
+IMAGE_VARIANT_FORMATS = ['avif', 'webp']
 
 
 # Redis Cache Configuration
@@ -172,5 +241,48 @@ else:
     CACHES = {
         "default": {
             "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        }
+        },
+        # 模板片段单独存放：locmem 默认只保留 300 个键，相册列表的几百张卡片
+        # 会把整页缓存挤出去
+        "template_fragments": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "template-fragments",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        },
     }
+
+# 进程内缓存层：热点键在每个 worker 内保留的最长时间（秒）和总大小上限，
+# 也是其他 worker 的失效最迟多久可见；0 表示关闭。默认缓存在进程内时不起作用
+LOCAL_CACHE_MAX_AGE = float(os.environ.get('LOCAL_CACHE_MAX_AGE', 2))
+LOCAL_CACHE_MAX_BYTES = int(os.environ.get('LOCAL_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+# 静态发布目录：设置后页面渲染为 HTML 文件由 nginx 直接返回，内容变化后
+# 自动重新发布受影响的页面（见 moyinji/publish.py）；未设置时不发布
+PUBLISH_DIR = os.environ.get('PUBLISH_DIR') or None
+
+# 后台任务队列（见 taskqueue/queue.py）：开发环境默认在事务提交后于当前进程中
+# 直接执行任务；部署时设为 False，任务写入数据库，由 run_tasks 命令启动的 worker 执行
+TASK_QUEUE_EAGER = os.environ.get('TASK_QUEUE_EAGER', str(DEBUG)).lower() == 'true'
+# worker 队列为空时的轮询间隔、首次重试的等待时间（之后每次翻倍），
+# 以及任务执行多久未完成视为 worker 已退出而重新入队（秒）
+TASK_POLL_INTERVAL = float(os.environ.get('TASK_POLL_INTERVAL', 1))
+TASK_RETRY_DELAY = int(os.environ.get('TASK_RETRY_DELAY', 30))
+TASK_LOCK_TIMEOUT = int(os.environ.get('TASK_LOCK_TIMEOUT', 15 * 60))
+
+# 缓存失效后由后台任务重新预热受影响的页面（见 moyinji/warm.py）；直接执行任务时
+# 默认关闭，预热会在保存请求的事务提交后同步进行
+CACHE_WARM_ON_INVALIDATION = os.environ.get(
+    'CACHE_WARM_ON_INVALIDATION', str(not TASK_QUEUE_EAGER)
+).lower() == 'true'
+
+# 文章浏览次数写回数据库的间隔（秒）
+VIEW_COUNT_FLUSH_INTERVAL = int(os.environ.get('VIEW_COUNT_FLUSH_INTERVAL', 60))
+
+# 性能指标：是否对所有请求加入 Server-Timing 头（默认只对已登录的管理员加入）；
+# 多个 worker 进程时各进程的累计值写入 METRICS_DIR，由 /metrics/ 汇总
+SERVER_TIMING = os.environ.get('SERVER_TIMING', 'False').lower() == 'true'
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+
+# 文章列表每页数量
+BLOG_PAGE_SIZE = 12
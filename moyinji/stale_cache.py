@@ -0,0 +1,256 @@
+"""
+带过期兜底与防击穿的缓存读取
+
+视图缓存过期或被信号失效时，所有并发请求会同时未命中，各自重建同一份
+数据，热门页面的重建请求一起压到数据库上。``get_or_build`` 改为：
+
+- 条目存放在不带代数的键下，条目中记下构建时依赖命名空间的代数标记。
+  标记与当前代数不一致（被信号失效）或超过软过期时间的条目视为过期，
+  但在硬过期前仍保留在缓存中；
+- 条目过期时，只有抢到锁（``cache.add``）的请求重建，其余请求先返回旧数据；
+- 冷启动时没有任何数据可用，没抢到锁的请求短暂轮询等待重建结果；
+- 概率提前过期（XFetch）：离过期越近、上次重建越慢，越可能由某个请求
+  提前重建，热门键不会在同一时刻集中过期；
+- 读到的条目在本 worker 内保留一小段时间（``moyinji.local_cache``），
+  热点键的命中不必每次访问 Redis。
+
+``aget_or_build`` 是供异步视图使用的同一套逻辑，使用缓存的异步接口。
+"""
+import asyncio
+import math
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.cache import cache
+
+from .generations import ageneration_token, generation_token
+from .local_cache import local_cache
+from .metrics import record_cache
+
+# 软过期之后条目继续保留、可作为旧数据返回的时间（秒）
+STALE_TIMEOUT = 60 * 60
+# 重建锁的超时，应大于最慢的一次重建
+LOCK_TIMEOUT = 10
+# 冷启动时等待其他请求重建的最长时间和轮询间隔（秒）
+WAIT_TIMEOUT = 3
+POLL_INTERVAL = 0.05
+# XFetch 的 beta，越大越倾向于提前重建
+EARLY_EXPIRY_BETA = 1.0
+
+_bypass = ContextVar('stale_cache_bypass', default=False)
+_recorder = ContextVar('stale_cache_recorder', default=None)
+
+
+@contextmanager
+def bypass():
+    """在此范围内直接调用 build，不读写缓存，得到数据库中的最新数据（如静态发布）"""
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+@contextmanager
+def recording():
+    """记录此范围内重建并写入缓存的条目，得到 ``[(键, 值的字节数)]``（如缓存预热的统计）"""
+    written = []
+    token = _recorder.set(written)
+    try:
+        yield written
+    finally:
+        _recorder.reset(token)
+
+
+def _record(key, entry):
+    written = _recorder.get()
+    if written is not None:
+        written.append((key, _size(entry)))
+
+
+def _expires_early(expires, delta, now):
+    """XFetch：now - delta * beta * ln(rand) >= expires 时提前重建"""
+    return now - delta * EARLY_EXPIRY_BETA * math.log(1 - random.random()) >= expires
+
+
+def _is_fresh(entry, token, refresh):
+    if entry is None or refresh:
+        return False
+    value, built_with, expires, delta = entry
+    return built_with == token and not _expires_early(expires, delta, time.time())
+
+
+def _rebuilt_meanwhile(current, entry, token):
+    """取得锁后读到的条目是否是别人刚刚重建好的"""
+    return current is not None and current[1] == token and (entry is None or current[2] != entry[2])
+
+
+def _new_entry(value, token, timeout, started):
+    return (value, token, time.time() + timeout, time.perf_counter() - started)
+
+
+def _size(entry):
+    value = entry[0]
+    return len(value) if isinstance(value, (str, bytes)) else 0
+
+
+def _lock_acquired(added):
+    # django-redis 在 IGNORE_EXCEPTIONS 下连接失败时 add 返回 None 而不是 False：
+    # 缓存不可用，也就没有别人的重建结果可等，直接重建
+    return added is not False
+
+
+def _read(key):
+    """先读本地，再读共享缓存"""
+    entry = local_cache.get(key)
+    if entry is None:
+        entry = cache.get(key)
+        if entry is not None:
+            local_cache.set(key, entry, _size(entry))
+    return entry
+
+
+async def _aread(key):
+    entry = local_cache.get(key)
+    if entry is None:
+        entry = await cache.aget(key)
+        if entry is not None:
+            local_cache.set(key, entry, _size(entry))
+    return entry
+
+
+def get_or_build(key, namespaces, build, timeout, label=None, refresh=False):
+    """
+    读取缓存，缺失或过期时由一个请求调用 ``build`` 重建
+
+    Args:
+        key: 不带代数的缓存键
+        namespaces: 依赖的命名空间，任一命名空间失效后条目视为过期
+        build: 无参函数，返回要缓存的值；抛出异常时同时丢弃旧条目
+            （例如文章已删除，不能继续返回旧页面）
+        timeout: 软过期时间（秒），之后条目还保留 ``STALE_TIMEOUT`` 秒作兜底
+        label: 统计缓存命中时的命名空间，默认取 key 的前两段
+        refresh: 视为已过期，要求重建（同样受锁保护）
+
+    Returns:
+        缓存的值，或本次重建的值
+    """
+    if _bypass.get():
+        return build()
+    label = label or ':'.join(key.split(':')[:2])
+    # 计数器缺失时为 None，构建成功后才创建，返回 404 的请求不留下计数器
+    token = generation_token(*namespaces, create=False)
+    lock_key = f'lock:{key}'
+    deadline = time.monotonic() + WAIT_TIMEOUT
+
+    while True:
+        entry = _read(key)
+        if token is None and entry is not None:
+            # 冷启动时等待的条目由持锁的请求构建，计数器也随之创建
+            token = generation_token(*namespaces, create=False)
+        if _is_fresh(entry, token, refresh):
+            record_cache(label, 'hit')
+            return entry[0]
+
+        lock = uuid.uuid4().hex
+        if _lock_acquired(cache.add(lock_key, lock, LOCK_TIMEOUT)):
+            break
+        lock = None
+        if entry is not None:
+            # 其他请求正在重建，先返回旧数据
+            record_cache(label, 'stale')
+            return entry[0]
+        if time.monotonic() >= deadline:
+            # 持锁的请求迟迟没有写回（可能已失败），不再等待
+            break
+        time.sleep(POLL_INTERVAL)
+
+    try:
+        # 读取条目和取得锁之间其他请求可能刚好重建完，
+        # 或者本地条目已过期而其他 worker 早已重建好
+        current = cache.get(key) if lock else None
+        if _rebuilt_meanwhile(current, entry, token):
+            local_cache.set(key, current, _size(current))
+            record_cache(label, 'hit')
+            return current[0]
+
+        record_cache(label, 'miss')
+        started = time.perf_counter()
+        try:
+            value = build()
+        except Exception:
+            if entry is not None:
+                cache.delete(key)
+                local_cache.delete(key)
+            raise
+        if token is None:
+            token = generation_token(*namespaces)
+        # 先写入新条目再释放锁，其他请求拿到锁之前就能读到它
+        entry = _new_entry(value, token, timeout, started)
+        cache.set(key, entry, timeout + STALE_TIMEOUT)
+        local_cache.set(key, entry, _size(entry))
+        _record(key, entry)
+        return value
+    finally:
+        # 锁已超时并被其他请求取得时不能删除
+        if lock and cache.get(lock_key) == lock:
+            cache.delete(lock_key)
+
+
+async def aget_or_build(key, namespaces, build, timeout, label=None, refresh=False):
+    """get_or_build 的异步版本，``build`` 是无参的协程函数"""
+    if _bypass.get():
+        return await build()
+    label = label or ':'.join(key.split(':')[:2])
+    token = await ageneration_token(*namespaces, create=False)
+    lock_key = f'lock:{key}'
+    deadline = time.monotonic() + WAIT_TIMEOUT
+
+    while True:
+        entry = await _aread(key)
+        if token is None and entry is not None:
+            token = await ageneration_token(*namespaces, create=False)
+        if _is_fresh(entry, token, refresh):
+            record_cache(label, 'hit')
+            return entry[0]
+
+        lock = uuid.uuid4().hex
+        if _lock_acquired(await cache.aadd(lock_key, lock, LOCK_TIMEOUT)):
+            break
+        lock = None
+        if entry is not None:
+            record_cache(label, 'stale')
+            return entry[0]
+        if time.monotonic() >= deadline:
+            break
+        await asyncio.sleep(POLL_INTERVAL)
+
+    try:
+        current = await cache.aget(key) if lock else None
+        if _rebuilt_meanwhile(current, entry, token):
+            local_cache.set(key, current, _size(current))
+            record_cache(label, 'hit')
+            return current[0]
+
+        record_cache(label, 'miss')
+        started = time.perf_counter()
+        try:
+            value = await build()
+        except Exception:
+            if entry is not None:
+                await cache.adelete(key)
+                local_cache.delete(key)
+            raise
+        if token is None:
+            token = await ageneration_token(*namespaces)
+        entry = _new_entry(value, token, timeout, started)
+        await cache.aset(key, entry, timeout + STALE_TIMEOUT)
+        local_cache.set(key, entry, _size(entry))
+        _record(key, entry)
+        return value
+    finally:
+        if lock and await cache.aget(lock_key) == lock:
+            await cache.adelete(lock_key)
@@ -0,0 +1,46 @@
+"""
+统计渲染耗时的 Django 模板后端
+
+与内置的 DjangoTemplates 完全相同，只是 ``render`` 的耗时会记入当前
+请求的性能指标（见 ``moyinji.metrics``）。``precompile`` 在 worker 启动时
+预先编译全部模板。
+"""
+from django.conf import settings
+from django.template.autoreload import get_template_directories
+from django.template.backends import django as django_backend
+from django.template.loader import get_template
+
+from .metrics import render_timer
+
+
+class Template(django_backend.Template):
+
+    def render(self, context=None, request=None):
+        with render_timer():
+            return super().render(context, request)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
+
+
+def precompile():
+    """
+    编译项目中的全部模板并放入 cached 加载器
+
+    在 worker 开始接受请求前调用（见 gunicorn.conf.py），每个 worker 的
+    第一批请求不必再解析 base.html 和各个片段。返回编译的模板数。
+    """
+    count = 0
+    for directory in get_template_directories():
+        if not directory.is_relative_to(settings.BASE_DIR):
+            continue
+        for path in sorted(directory.rglob('*.html')):
+            get_template(path.relative_to(directory).as_posix())
+            count += 1
+    return count
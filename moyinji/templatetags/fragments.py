@@ -0,0 +1,55 @@
+"""
+片段缓存模板标签
+
+用法::
+
+    {% load fragments %}
+    {% cachefragment "post_card" post %}
+        ……只依赖 post 的 HTML……
+    {% endcachefragment %}
+
+片段名之后是片段依赖的值，通常是一条视图模型记录。块内只能使用这些值：
+随循环位置变化的内容（如 ``{% cycle %}``）要放在块外。
+"""
+import hashlib
+
+from django import template
+
+from moyinji.fragment_cache import fragment_key, get_or_render
+
+register = template.Library()
+
+
+class CacheFragmentNode(template.Node):
+
+    def __init__(self, nodelist, name, vary_on, source_digest):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+        self.source_digest = source_digest
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        key = fragment_key(name, self.source_digest, [var.resolve(context) for var in self.vary_on])
+        return get_or_render(name, key, lambda: self.nodelist.render(context))
+
+
+@register.tag
+def cachefragment(parser, token):
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a fragment name")
+
+    # parser.tokens 是倒序的待解析记号，解析块内容前后长度之差就是块内的记号
+    pending = parser.tokens[:]
+    nodelist = parser.parse(('endcachefragment',))
+    block = reversed(pending[len(parser.tokens):])
+    parser.delete_first_token()
+
+    source = '\x1f'.join(f'{token.token_type.value}:{token.contents}' for token in block)
+    return CacheFragmentNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        [parser.compile_filter(bit) for bit in bits[2:]],
+        hashlib.md5(source.encode(), usedforsecurity=False).hexdigest()[:12],
+    )
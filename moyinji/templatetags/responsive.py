@@ -0,0 +1,40 @@
+"""
+响应式图片模板标签
+
+用法::
+
+    {% load responsive %}
+    <picture class="contents">
+        {% image_sources post.cover_sources sizes="100vw" %}
+        <img src="{{ post.cover_url }}" alt="{{ post.title }}">
+    </picture>
+"""
+from django import template
+from django.utils.html import format_html_join
+
+register = template.Library()
+
+# 常用布局对应的 sizes
+SIZES = {
+    'full': '100vw',
+    # .grid-song：窄屏单列，max-w-7xl 下约三到四列
+    'grid': '(max-width: 640px) 100vw, (max-width: 1024px) 50vw, 400px',
+    # .masonry-song：一、二、三列
+    'masonry': '(max-width: 640px) 100vw, (max-width: 1024px) 50vw, 33vw',
+}
+
+
+@register.simple_tag
+def image_sources(sources, sizes='full'):
+    """
+    输出 ``<source>`` 元素
+
+    Args:
+        sources: 视图模型中的 ``[[MIME 类型, srcset], ...]``
+        sizes: SIZES 中的布局名，或直接给出 sizes 属性值
+    """
+    sizes = SIZES.get(sizes, sizes)
+    return format_html_join(
+        '\n', '<source type="{}" srcset="{}" sizes="{}">',
+        ((mime, srcset, sizes) for mime, srcset in sources or ()),
+    )
@@ -2,17 +2,42 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from . import views
+from rest_framework.routers import DefaultRouter
+from blog import urls as blog_urls
+from blog.api import CategoryViewSet, PostViewSet, TagViewSet
+from gallery import urls as gallery_urls
+from gallery.api import AlbumViewSet, PhotoViewSet
+from . import async_views, views
 
-urlpatterns = [
-    path('admin/', admin.site.urls),
-    path('', views.home, name='home'),
-    path('about/', views.about, name='about'),
-    path('blog/', include('blog.urls')),
-    path('gallery/', include('gallery.urls')),
-]
+router = DefaultRouter()
+router.register('posts', PostViewSet, basename='post')
+router.register('categories', CategoryViewSet, basename='category')
+router.register('tags', TagViewSet, basename='tag')
+router.register('albums', AlbumViewSet, basename='album')
+router.register('photos', PhotoViewSet, basename='photo')
 
-# Serve media files in development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+
+def url_patterns(use_async=False):
+    """
+    use_async 为 True 时首页、博客和相册页面使用异步视图，
+    供 ASGI 部署使用（见 moyinji.urls_async）
+    """
+    patterns = [
+        path('admin/', admin.site.urls),
+        path('', (async_views if use_async else views).home, name='home'),
+        path('about/', views.about, name='about'),
+        path('health/', views.health, name='health'),
+        path('metrics/', views.metrics, name='metrics'),
+        path('blog/', include((blog_urls.url_patterns(use_async), blog_urls.app_name))),
+        path('gallery/', include((gallery_urls.url_patterns(use_async), gallery_urls.app_name))),
+        path('api/', include(router.urls)),
+    ]
+
+    # Serve media files in development
+    if settings.DEBUG:
+        patterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+        patterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+    return patterns
+
+
+urlpatterns = url_patterns()
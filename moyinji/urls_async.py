@@ -0,0 +1,8 @@
+"""
+ASGI 部署使用的 URL 配置：与 moyinji.urls 相同，页面换成异步视图
+
+由 ASYNC_VIEWS=True 选用（见 settings.ROOT_URLCONF）。
+"""
+from .urls import url_patterns
+
+urlpatterns = url_patterns(use_async=True)
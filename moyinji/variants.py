@@ -0,0 +1,245 @@
+"""
+响应式图片变体
+
+为原图生成多个宽度的 AVIF / WebP 版本，供模板输出 ``<picture>`` 的
+``srcset``。生成在事务提交后交给后台任务队列（或 ``generate_variants`` 命令）
+完成，结果以清单（manifest）形式保存在模型的 JSONField 中：
+
+    {"source": 原图文件名, "version": 1, "width": 4000, "height": 3000,
+     "widths": [320, 640, 960, 1280, 1920], "formats": ["avif", "webp"]}
+
+变体文件名由原图文件名、宽度和格式确定，请求路径上只根据清单拼接 URL，
+从不访问存储检查文件是否存在。清单缺失或与当前原图不符时，模板只输出原图。
+"""
+import io
+import os
+from dataclasses import dataclass
+from typing import Callable
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models.signals import post_save
+from PIL import Image, ImageOps, features
+
+from .generations import bump
+from taskqueue.queue import PRIORITY_LOW, task
+
+from .pool import run_batched
+
+# 编码参数或命名规则变化时递增，旧清单全部视为过期
+VARIANT_VERSION = 1
+
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+
+ENCODE_OPTIONS = {
+    'avif': {'quality': 55, 'speed': 6},
+    'webp': {'quality': 80, 'method': 4},
+}
+
+# EXIF 方向为 5-8 时图片需要旋转 90 度，宽高互换
+_ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def available_formats():
+    """按优先顺序返回当前 Pillow 能编码的格式"""
+    return [fmt for fmt in settings.IMAGE_VARIANT_FORMATS if features.check(fmt)]
+
+
+def target_widths(width):
+    """要生成的宽度：不放大原图，原图比最大宽度窄时把原图宽度作为最后一档"""
+    configured = sorted(settings.IMAGE_VARIANT_WIDTHS)
+    widths = [w for w in configured if w < width]
+    widths.append(min(width, configured[-1]))
+    return sorted(set(widths))
+
+
+def variant_name(source_name, width, fmt):
+    """变体在存储中的文件名"""
+    stem = os.path.splitext(source_name)[0]
+    return f'{settings.IMAGE_VARIANT_DIR}/{stem}/{width}w.{fmt}'
+
+
+def is_current(manifest, source_name):
+    return bool(
+        manifest
+        and manifest.get('source') == source_name
+        and manifest.get('version') == VARIANT_VERSION
+    )
+
+
+def image_sources(field, manifest):
+    """
+    由清单构建 ``<source>`` 列表，不访问存储
+
+    Args:
+        field: 原图的 ImageField 值
+        manifest: 该图片的变体清单
+
+    Returns:
+        ``[[MIME 类型, srcset], ...]``，清单缺失或过期时为空列表
+    """
+    if not field or not is_current(manifest, field.name):
+        return []
+    return [
+        [
+            MIME_TYPES[fmt],
+            ', '.join(
+                f'{default_storage.url(variant_name(field.name, width, fmt))} {width}w'
+                for width in manifest['widths']
+            ),
+        ]
+        for fmt in manifest['formats']
+    ]
+
+
+def _normalize_mode(image):
+    if image.mode in ('RGB', 'RGBA'):
+        return image
+    has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+    return image.convert('RGBA' if has_alpha else 'RGB')
+
+
+def build_variants(image_name, force=False):
+    """
+    为一张原图生成全部变体，已存在的跳过
+
+    只读取文件头即可判断尺寸；所有变体都已存在时不解码像素。
+
+    Returns:
+        (清单, 生成的文件数)
+    """
+    formats = available_formats()
+    with default_storage.open(image_name, 'rb') as fileobj, Image.open(fileobj) as image:
+        width, height = image.size
+        if image.getexif().get(0x0112) in _ROTATED_ORIENTATIONS:
+            width, height = height, width
+        widths = target_widths(width)
+        manifest = {
+            'source': image_name,
+            'version': VARIANT_VERSION,
+            'width': width,
+            'height': height,
+            'widths': widths,
+            'formats': formats,
+        }
+
+        pending = [
+            (w, fmt) for w in widths for fmt in formats
+            if force or not default_storage.exists(variant_name(image_name, w, fmt))
+        ]
+        if not pending:
+            return manifest, 0
+
+        if image.format == 'JPEG':
+            # JPEG 可以直接按 1/2、1/4、1/8 缩小解码，省去大部分解码时间
+            largest = max(w for w, _ in pending)
+            box = (largest, round(height * largest / width))
+            if width != image.size[0]:
+                box = box[::-1]
+            image.draft('RGB', box)
+        image = _normalize_mode(ImageOps.exif_transpose(image))
+
+        for w in sorted({w for w, _ in pending}, reverse=True):
+            resized = image.resize((w, max(1, round(height * w / width))), Image.LANCZOS, reducing_gap=3.0)
+            for fmt in formats:
+                if (w, fmt) not in pending:
+                    continue
+                buffer = io.BytesIO()
+                resized.save(buffer, format=fmt.upper(), **ENCODE_OPTIONS.get(fmt, {}))
+                name = variant_name(image_name, w, fmt)
+                if default_storage.exists(name):
+                    # 存储在同名文件存在时会另起文件名，强制重建前先删除
+                    default_storage.delete(name)
+                default_storage.save(name, ContentFile(buffer.getvalue()))
+    return manifest, len(pending)
+
+
+@dataclass(frozen=True)
+class VariantSource:
+    """一个带响应式变体的图片字段"""
+    model: type
+    source_field: str
+    manifest_field: str
+    # 返回实例所在缓存命名空间的函数，清单更新后递增其代数
+    namespaces: Callable
+
+    def store(self, image_name, manifest):
+        """把清单写入所有使用该原图的行，并使相关缓存失效"""
+        rows = self.model._default_manager.filter(**{self.source_field: image_name})
+        affected = []
+        for instance in rows:
+            affected.extend(self.namespaces(instance))
+        rows.update(**{self.manifest_field: manifest})
+        if affected:
+            bump(*affected)
+
+
+_sources = {}
+
+
+def register(model, source_field, manifest_field, namespaces):
+    """
+    登记带变体的图片字段：保存后原图变化时在后台生成变体
+
+    在各应用的 signals 模块中调用，进程池子进程执行 django.setup()
+    时同样会完成登记。
+    """
+    label = model._meta.label
+    _sources[label] = VariantSource(model, source_field, manifest_field, namespaces)
+    post_save.connect(_schedule_on_save, sender=model, dispatch_uid=f'variants:{label}')
+
+
+def _schedule_on_save(sender, instance, update_fields=None, **kwargs):
+    source = _sources[sender._meta.label]
+    if update_fields is not None and source.source_field not in update_fields:
+        return
+    name = getattr(instance, source.source_field).name
+    manifest = getattr(instance, source.manifest_field)
+    if not name:
+        if manifest:
+            sender._default_manager.filter(pk=instance.pk).update(**{source.manifest_field: None})
+            setattr(instance, source.manifest_field, None)
+        return
+    if is_current(manifest, name):
+        return
+    generate_variants_task.enqueue(sender._meta.label, name)
+
+
+def generate_variants(label, image_name, force=False):
+    """
+    进程池任务：生成变体并保存清单
+
+    Returns:
+        (生成的文件数, 错误信息或 None)
+    """
+    source = _sources[label]
+    try:
+        manifest, generated = build_variants(image_name, force)
+    except (OSError, ValueError) as exc:
+        return 0, f'{image_name}: {exc}'
+    source.store(image_name, manifest)
+    return generated, None
+
+
+@task(priority=PRIORITY_LOW)
+def generate_variants_task(label, image_name, force=False):
+    """后台任务：生成变体，失败时抛出异常以便重试；变体缺失时模板输出原图，优先级较低"""
+    _, error = generate_variants(label, image_name, force)
+    if error:
+        raise RuntimeError(error)
+
+
+def generate_many(label, image_names, workers=None, force=False):
+    """批量生成某个模型的图片变体"""
+    return run_batched(_generate_item, ((label, name) for name in image_names), force, workers=workers)
+
+
+def _generate_item(item, force):
+    label, image_name = item
+    return generate_variants(label, image_name, force)
+
+
+def sources():
+    """已登记的图片字段，键为模型标签"""
+    return dict(_sources)
@@ -0,0 +1,86 @@
+"""
+视图模型：缓存和模板使用的轻量记录
+
+视图模型只保存模板实际用到的字段，按 FIELDS 顺序打包成 JSON 数组
+写入缓存。缓存命中时直接还原为记录对象渲染模板，不再反序列化 ORM
+实例，也不会在渲染时触发惰性查询。
+"""
+import hashlib
+import json
+
+from django.utils.dateparse import parse_date, parse_datetime
+
+# 字段的编码方式（pack/unpack 中的处理）变化时递增；字段本身的增删改名
+# 由 layout_version 自动体现在缓存键中
+SCHEMA_VERSION = 2
+
+
+class ViewModel:
+    """
+    按字段顺序打包的只读记录
+
+    子类声明 FIELDS（全部字段）与 __slots__（本类新增字段），
+    需要特殊编码的字段（时间、嵌套记录）在 pack/unpack 中处理。
+    """
+    FIELDS = ()
+    __slots__ = ()
+
+    def __init__(self, *values, **kwargs):
+        for name, value in zip(self.FIELDS, values):
+            setattr(self, name, value)
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return f'<{type(self).__name__}: {getattr(self, "title", "")}>'
+
+    def pack(self):
+        return [getattr(self, name) for name in self.FIELDS]
+
+    @classmethod
+    def unpack(cls, data):
+        return cls(*data)
+
+    @classmethod
+    def pack_many(cls, records):
+        return [record.pack() for record in records]
+
+    @classmethod
+    def unpack_many(cls, data):
+        return [cls.unpack(item) for item in data]
+
+
+def layout_version(*models):
+    """
+    一组视图模型的打包布局版本，缓存键带上它
+
+    由 SCHEMA_VERSION 和各模型的 FIELDS 计算，字段改名或调整顺序后键随之
+    变化，部署后不会把旧布局的数据（例如未经清洗的原始内容）按新字段解包。
+
+    Args:
+        models: 缓存条目中打包的全部视图模型，包括嵌套的引用
+    """
+    layout = dumps([SCHEMA_VERSION] + [[model.__qualname__, list(model.FIELDS)] for model in models])
+    digest = hashlib.md5(layout.encode(), usedforsecurity=False).hexdigest()[:8]
+    return f'{SCHEMA_VERSION}.{digest}'
+
+
+def encode_datetime(value):
+    return value.isoformat() if value else None
+
+
+def decode_datetime(value):
+    return parse_datetime(value) if value else None
+
+
+def decode_date(value):
+    return parse_date(value) if value else None
+
+
+def dumps(data):
+    """紧凑 JSON 编码"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def loads(raw):
+    return json.loads(raw)
@@ -1,23 +1,88 @@
+import time
+
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
+from django.views.decorators.cache import never_cache
 from blog.models import BlogPost
+from blog.viewmodels import PostCard
 from gallery.models import PhotoAlbum
+from gallery.viewmodels import AlbumCard
 
+from .metrics import collector
 
-def home(request):
-    """首页"""
-    # 获取最新发布的文章
-    latest_posts = BlogPost.objects.filter(is_published=True)[:6]
 
-    # 获取精选相册
-    featured_albums = PhotoAlbum.objects.filter(is_featured=True)
+def latest_posts_queryset():
+    return BlogPost.objects.published().cards()[:6]
+
+
+def featured_albums_queryset():
+    return PhotoAlbum.objects.filter(is_featured=True).with_cover()
+
 
+def render_home(request, latest_posts, featured_albums):
     context = {
-        'latest_posts': latest_posts,
-        'featured_albums': featured_albums,
+        'latest_posts': [PostCard.from_post(post) for post in latest_posts],
+        'featured_albums': [
+            AlbumCard.from_album(album, cover_spec='thumbnail_square') for album in featured_albums
+        ],
     }
     return render(request, 'home.html', context)
 
 
+def home(request):
+    """首页：最新发布的文章和精选相册"""
+    return render_home(request, latest_posts_queryset(), featured_albums_queryset())
+
+
 def about(request):
     """关于页"""
     return render(request, 'about.html')
+
+
+def _check(probe):
+    """执行一项检查，返回状态和耗时（毫秒）"""
+    started = time.perf_counter()
+    try:
+        probe()
+    except Exception as exc:  # 任何异常都视为该依赖不可用
+        status = f'error: {exc.__class__.__name__}'
+    else:
+        status = 'ok'
+    return {'status': status, 'ms': round((time.perf_counter() - started) * 1000, 2)}
+
+
+def _probe_database():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+        if cursor.fetchone() != (1,):
+            raise DatabaseError('unexpected result')
+
+
+def _probe_cache():
+    # django-redis 在 IGNORE_EXCEPTIONS 下连接失败不会抛出异常，只能从读回的值判断
+    token = str(time.time())
+    cache.set('health:probe', token, 10)
+    if cache.get('health:probe') != token:
+        raise ConnectionError('cache did not return the written value')
+
+
+@never_cache
+def health(request):
+    """健康检查：数据库和缓存都可用时返回 200，否则返回 503"""
+    checks = {
+        'database': _check(_probe_database),
+        'cache': _check(_probe_cache),
+    }
+    healthy = all(check['status'] == 'ok' for check in checks.values())
+    return JsonResponse(
+        {'status': 'ok' if healthy else 'error', 'checks': checks},
+        status=200 if healthy else 503,
+    )
+
+
+@never_cache
+def metrics(request):
+    """Prometheus 指标，汇总所有 worker 进程"""
+    return HttpResponse(collector.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
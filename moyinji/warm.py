@@ -0,0 +1,163 @@
+"""
+缓存预热
+
+部署或 Redis 重启后页面缓存全部是冷的，第一波访问会同时压到数据库上。
+预热按优先级依次请求页面，由视图自己的缓存逻辑写入整页缓存
+（``response:blog:list:*``、``response:gallery:list:all``）、详情数据
+（``blog:detail:*``、``gallery:album:*``）以及其中的模板片段：
+
+- 页面由各应用登记（见 ``register``）并给出优先级分数：首页和列表页最先，
+  分类、标签和文章按浏览次数从高到低，相册排在后面；
+- 多个线程并发请求，并发数有上限，预热本身不会压垮数据库；
+- 已经是最新的条目直接命中，不会重复构建，预热可以随时重复运行；
+- ``CACHE_WARM_ON_INVALIDATION`` 为 True 时，每次缓存失效都把受影响的页面
+  （与静态发布使用同一份命名空间到页面的映射）加入后台任务重新预热。
+
+缓存在进程内（locmem）时只有执行预热的进程受益。
+"""
+import logging
+import math
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import connections
+from django.dispatch import receiver
+from django.urls import reverse
+from taskqueue.queue import enqueue_many, task
+
+from . import stale_cache
+from .generations import invalidated
+from .publish import affected_pages, render_page
+
+logger = logging.getLogger(__name__)
+
+# 各应用注册的页面函数
+_registry = []
+
+
+def register(pages):
+    """
+    注册一组需要预热的页面
+
+    Args:
+        pages: 无参函数，返回 ``[(优先级分数, 页面路径)]``，分数越大越先预热，
+            通常是浏览次数，列表页等入口页面为 ``math.inf``
+    """
+    _registry.append(pages)
+
+
+def _site_pages():
+    return [(math.inf, reverse('home'))]
+
+
+register(_site_pages)
+
+
+def warm_pages(limit=None):
+    """按优先级从高到低排列的全部页面，分数相同时保持登记顺序"""
+    scored = [item for pages in _registry for item in pages()]
+    scored.sort(key=lambda item: item[0], reverse=True)
+    paths = list(dict.fromkeys(path for _, path in scored))
+    return paths[:limit] if limit else paths
+
+
+@dataclass
+class WarmStats:
+    pages: int = 0
+    keys: int = 0
+    bytes: int = 0
+    errors: list = field(default_factory=list)
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def keys_per_second(self):
+        return self.keys / self.elapsed if self.elapsed else 0
+
+
+def warm_page(path):
+    """
+    经过视图缓存请求一个页面
+
+    Returns:
+        本次写入缓存的 ``[(键, 值的字节数)]``，条目已是最新时为空
+    """
+    with stale_cache.recording() as written:
+        status, _ = render_page(path, cached=True)
+    # 页面已删除时没有可缓存的内容
+    if status not in (200, 404):
+        raise RuntimeError(f'HTTP {status}')
+    return written
+
+
+def warm(paths, concurrency=4):
+    """
+    预热这些页面，单个页面失败只记录错误
+
+    Args:
+        paths: 页面路径，按优先级排列
+        concurrency: 同时请求的页面数，1 表示在当前线程中依次请求
+    """
+    stats = WarmStats()
+    lock = threading.Lock()
+
+    def run(path):
+        try:
+            written = warm_page(path)
+        except Exception as exc:
+            logger.exception('预热页面 %s 失败', path)
+            written, error = [], f'{path}: {exc.__class__.__name__}: {exc}'
+        else:
+            error = None
+        with lock:
+            stats.pages += 1
+            stats.keys += len(written)
+            stats.bytes += sum(size for _, size in written)
+            if error:
+                stats.errors.append(error)
+
+    if concurrency <= 1:
+        for path in paths:
+            run(path)
+        return stats
+
+    pending = queue.SimpleQueue()
+    for path in paths:
+        pending.put(path)
+
+    def worker():
+        try:
+            while True:
+                try:
+                    path = pending.get_nowait()
+                except queue.Empty:
+                    return
+                run(path)
+        finally:
+            # 每个线程使用自己的数据库连接
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats
+
+
+@task
+def warm_page_task(path):
+    """后台任务：缓存失效后重新预热一个页面"""
+    warm_page(path)
+
+
+@receiver(invalidated)
+def warm_invalidated_pages(sender, namespaces, **kwargs):
+    if getattr(settings, 'CACHE_WARM_ON_INVALIDATION', False):
+        enqueue_many(warm_page_task, [(path,) for path in affected_pages(namespaces)])
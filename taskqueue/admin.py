@@ -0,0 +1,30 @@
+from django.contrib import admin
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ['name', 'args', 'priority', 'status', 'attempts', 'run_after', 'locked_by', 'created_at']
+    list_filter = ['status', 'name']
+    readonly_fields = [
+        'name', 'args', 'dedup_key', 'attempts', 'locked_by', 'locked_at', 'last_error', 'created_at',
+    ]
+    actions = ['retry_tasks']
+
+    @admin.action(description='重新执行所选的失败任务')
+    def retry_tasks(self, request, queryset):
+        retried = 0
+        for task in queryset.filter(status=Task.FAILED):
+            try:
+                with transaction.atomic():
+                    Task.objects.filter(pk=task.pk).update(
+                        status=Task.QUEUED, attempts=0, run_after=timezone.now(), last_error=''
+                    )
+            except IntegrityError:
+                # 已有相同的任务在等待执行
+                task.delete()
+            retried += 1
+        self.message_user(request, f'已重新加入队列 {retried} 个任务')
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class TaskQueueConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'taskqueue'
+    verbose_name = '后台任务'
+
+    def ready(self):
+        """导入各应用 tasks 模块中登记的任务"""
+        autodiscover_modules('tasks')
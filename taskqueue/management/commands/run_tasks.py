@@ -0,0 +1,57 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from taskqueue.processes import run_processes
+from taskqueue.worker import Worker
+
+
+class Command(BaseCommand):
+    help = (
+        'Run background task workers: execute queued tasks by priority, retry failures '
+        'and enqueue periodic tasks such as the view count flush'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Number of worker processes (default 1: run in this process)',
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit once no task is due instead of waiting for new ones (single process only)',
+        )
+        parser.add_argument(
+            '--min-priority', type=int, default=None,
+            help='Only run tasks with at least this priority, e.g. to keep a worker for urgent tasks',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=None,
+            help='Seconds to wait when the queue is empty (default TASK_POLL_INTERVAL)',
+        )
+
+    def handle(self, *args, **options):
+        if settings.TASK_QUEUE_EAGER:
+            self.stdout.write(self.style.WARNING(
+                'TASK_QUEUE_EAGER is on: tasks run in the process that enqueues them, '
+                'this worker only runs periodic tasks.'
+            ))
+
+        worker_options = {'min_priority': options['min_priority'], 'poll_interval': options['poll_interval']}
+        if options['workers'] > 1 and not options['burst']:
+            self.stdout.write(f'Starting {options["workers"]} worker processes...')
+            run_processes(options['workers'], **worker_options)
+            return
+
+        worker = Worker(**worker_options)
+        if options['burst']:
+            worker.run(burst=True)
+        else:
+            signal.signal(signal.SIGTERM, worker.stop)
+            signal.signal(signal.SIGINT, worker.stop)
+            self.stdout.write(f'Worker {worker.name} waiting for tasks...')
+            worker.run()
+        self.stdout.write(self.style.SUCCESS(
+            f'Worker {worker.name} ran {worker.succeeded + worker.failed} tasks, {worker.failed} failed.'
+        ))
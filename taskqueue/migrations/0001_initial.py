@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Task',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='任务')),
+                ('args', models.JSONField(default=list, verbose_name='参数')),
+                ('priority', models.SmallIntegerField(default=0, verbose_name='优先级')),
+                ('status', models.CharField(choices=[('queued', '等待执行'), ('running', '执行中'), ('failed', '失败')], default='queued', max_length=10, verbose_name='状态')),
+                ('dedup_key', models.CharField(max_length=32, verbose_name='去重键')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='已执行次数')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3, verbose_name='最多执行次数')),
+                ('run_after', models.DateTimeField(verbose_name='最早执行时间')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='执行进程')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='开始执行时间')),
+                ('last_error', models.TextField(blank=True, verbose_name='最近错误')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='入队时间')),
+            ],
+            options={
+                'verbose_name': '后台任务',
+                'verbose_name_plural': '后台任务',
+                'ordering': ['-priority', 'run_after', 'id'],
+                'indexes': [models.Index(condition=models.Q(('status', 'queued')), fields=['-priority', 'run_after', 'id'], name='taskqueue_task_next')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'queued')), fields=('dedup_key',), name='taskqueue_task_queued_dedup')],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+from django.db import models
+
+
+class Task(models.Model):
+    """
+    后台任务
+
+    执行成功后删除，失败且不再重试的任务保留在 failed 状态以便排查。
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, '等待执行'),
+        (RUNNING, '执行中'),
+        (FAILED, '失败'),
+    ]
+
+    name = models.CharField(max_length=200, verbose_name='任务')
+    args = models.JSONField(default=list, verbose_name='参数')
+    priority = models.SmallIntegerField(default=0, verbose_name='优先级')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED, verbose_name='状态')
+    # 任务名和参数的摘要，等待执行的任务中唯一，重复入队时合并
+    dedup_key = models.CharField(max_length=32, verbose_name='去重键')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='已执行次数')
+    max_attempts = models.PositiveSmallIntegerField(default=3, verbose_name='最多执行次数')
+    run_after = models.DateTimeField(verbose_name='最早执行时间')
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name='执行进程')
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name='开始执行时间')
+    last_error = models.TextField(blank=True, verbose_name='最近错误')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='入队时间')
+
+    class Meta:
+        verbose_name = '后台任务'
+        verbose_name_plural = '后台任务'
+        ordering = ['-priority', 'run_after', 'id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedup_key'],
+                condition=models.Q(status='queued'),
+                name='taskqueue_task_queued_dedup',
+            ),
+        ]
+        indexes = [
+            # worker 取任务：等待执行中优先级最高、最早到期的一条
+            models.Index(
+                fields=['-priority', 'run_after', 'id'],
+                condition=models.Q(status='queued'),
+                name='taskqueue_task_next',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name}{tuple(self.args)}'
@@ -0,0 +1,62 @@
+"""
+多进程运行 worker
+
+子进程使用 spawn 启动（与图片进程池相同的原因），启动后执行
+django.setup()。本模块不导入模型，子进程可以在 setup 之前导入它。
+"""
+import logging
+import multiprocessing
+import signal
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _worker_main(options):
+    import django
+    django.setup()
+
+    from .worker import Worker
+
+    worker = Worker(**options)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+
+
+def run_processes(count, **options):
+    """
+    启动 count 个 worker 子进程并等待
+
+    子进程意外退出时重新启动。收到 SIGTERM 或 SIGINT 后通知子进程
+    执行完当前任务再退出。
+
+    Args:
+        options: 传给 ``Worker`` 的参数
+    """
+    context = multiprocessing.get_context('spawn')
+    stopping = False
+
+    def stop(*args):
+        nonlocal stopping
+        stopping = True
+
+    def start():
+        process = context.Process(target=_worker_main, args=(options,), daemon=False)
+        process.start()
+        return process
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    processes = [start() for _ in range(count)]
+    while not stopping:
+        time.sleep(1)
+        for i, process in enumerate(processes):
+            if not stopping and not process.is_alive():
+                logger.warning('worker 进程 %s 已退出（%s），重新启动', process.pid, process.exitcode)
+                processes[i] = start()
+
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
@@ -0,0 +1,145 @@
+"""
+后台任务队列
+
+图片处理、搜索索引、相关文章和静态发布都不应让保存请求等待。任务用
+``@task`` 登记，保存时用 ``enqueue`` 写入数据库中的任务表，由
+``run_tasks`` 命令启动的 worker 进程取出执行：
+
+- 任务行与触发它的修改在同一个事务中写入，事务回滚时任务随之消失，
+  worker 只会看到已提交的修改，不需要额外的消息代理；
+- 任务名和参数相同、尚未开始执行的任务只保留一条，重复入队时取较高的优先级；
+- worker 按优先级从高到低、到期时间从早到晚取任务，失败后按指数退避重试；
+- ``@task(every=...)`` 登记的周期任务由 worker 按间隔入队。
+
+``TASK_QUEUE_EAGER`` 为 True 时（开发和测试环境的默认值）不写任务表，
+任务在事务提交后于当前进程中直接执行，失败只记录日志，不去重也不重试。
+参数需要能序列化为 JSON。
+"""
+import hashlib
+import json
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+PRIORITY_HIGH = 10
+PRIORITY_NORMAL = 0
+PRIORITY_LOW = -10
+
+
+@dataclass
+class TaskSpec:
+    func: Callable
+    name: str
+    priority: int
+    max_attempts: int
+    # 周期任务的间隔（秒），可以是返回间隔的函数
+    every: object = None
+
+    def interval(self):
+        return self.every() if callable(self.every) else self.every
+
+
+_registry = {}
+
+
+def task(func=None, *, priority=PRIORITY_NORMAL, max_attempts=3, every=None):
+    """
+    登记任务函数，之后可以用 ``func.enqueue(*args)`` 入队
+
+    任务名为函数的模块路径，worker 按任务名找到函数；函数本身不变，
+    仍然可以直接调用。
+
+    Args:
+        priority: 默认优先级，数值越大越先执行
+        max_attempts: 最多执行次数（含第一次）
+        every: 周期任务的间隔（秒）或返回间隔的函数，worker 按间隔入队，无参数
+    """
+    def register(func):
+        name = f'{func.__module__}.{func.__qualname__}'
+        _registry[name] = TaskSpec(func, name, priority, max_attempts, every)
+        func.task_name = name
+        func.enqueue = lambda *args, **options: enqueue(name, *args, **options)
+        return func
+
+    return register(func) if func is not None else register
+
+
+def get_task(name):
+    """按任务名或任务函数取得登记信息，未登记时抛出 KeyError"""
+    return _registry[getattr(name, 'task_name', name)]
+
+
+def periodic_tasks():
+    return [spec for spec in _registry.values() if spec.every is not None]
+
+
+def dedup_key(name, args):
+    payload = json.dumps([name, list(args)], sort_keys=True, separators=(',', ':'))
+    return hashlib.md5(payload.encode(), usedforsecurity=False).hexdigest()
+
+
+def enqueue(name, *args, priority=None, delay=0):
+    """
+    在当前事务中加入一个任务
+
+    Args:
+        name: 任务名或任务函数
+        args: 任务参数
+        priority: 优先级，默认为登记时的优先级
+        delay: 最早在多少秒后执行
+    """
+    enqueue_many(name, [args], priority=priority, delay=delay)
+
+
+def enqueue_many(name, arg_lists, priority=None, delay=0):
+    """同一个任务的多组参数一次入队"""
+    spec = get_task(name)
+    priority = spec.priority if priority is None else priority
+    items = {}
+    for args in arg_lists:
+        items.setdefault(dedup_key(spec.name, args), list(args))
+    if not items:
+        return
+
+    if settings.TASK_QUEUE_EAGER:
+        for args in items.values():
+            transaction.on_commit(_EagerCall(spec, args), robust=True)
+        return
+
+    from .models import Task
+
+    run_after = timezone.now() + timedelta(seconds=delay)
+    # 已有相同的等待中任务时忽略冲突，只把它的优先级提高到本次的优先级
+    Task.objects.bulk_create(
+        [
+            Task(
+                name=spec.name, args=args, priority=priority, dedup_key=key,
+                max_attempts=spec.max_attempts, run_after=run_after,
+            )
+            for key, args in items.items()
+        ],
+        ignore_conflicts=True,
+    )
+    Task.objects.filter(
+        status=Task.QUEUED, dedup_key__in=list(items), priority__lt=priority
+    ).update(priority=priority)
+
+
+class _EagerCall:
+    """直接执行模式下注册到事务提交回调的任务"""
+
+    def __init__(self, spec, args):
+        self.spec = spec
+        self.args = args
+
+    def __call__(self):
+        self.spec.func(*self.args)
+
+    def __repr__(self):
+        # 回调失败时 Django 记录的日志中显示任务名
+        return f'{self.spec.name}{tuple(self.args)}'
+
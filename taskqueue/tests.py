@@ -0,0 +1,107 @@
+import io
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from blog import search
+from blog.models import BlogPost
+
+from .models import Task
+from .queue import PRIORITY_HIGH, enqueue, task
+from .worker import Worker, claim, execute, requeue_stale
+
+calls = []
+
+
+@task
+def record(value):
+    calls.append(value)
+
+
+@task(max_attempts=2)
+def fail(value):
+    calls.append(value)
+    raise ValueError(value)
+
+
+@override_settings(TASK_QUEUE_EAGER=False, TASK_RETRY_DELAY=10)
+class TaskQueueTest(TestCase):
+    """后台任务队列"""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_deduplicates_and_runs_by_priority(self):
+        """测试重复入队合并为一条并取较高优先级，worker 按优先级执行后删除任务"""
+        record.enqueue('a')
+        record.enqueue('b')
+        enqueue(record, 'b', priority=PRIORITY_HIGH)
+        self.assertEqual(Task.objects.count(), 2)
+
+        call_command('run_tasks', burst=True, stdout=io.StringIO())
+        self.assertEqual(calls, ['b', 'a'])
+        self.assertFalse(Task.objects.exists())
+
+    def test_running_task_does_not_absorb_new_enqueue(self):
+        """测试执行中的任务不参与去重，执行期间的修改会再执行一次"""
+        record.enqueue('a')
+        claim('test')
+        record.enqueue('a')
+        record.enqueue('a')
+        self.assertEqual(
+            sorted(Task.objects.values_list('status', flat=True)), [Task.QUEUED, Task.RUNNING]
+        )
+
+    def test_retries_with_backoff_then_fails(self):
+        """测试失败后推迟重试，执行次数用完后保留为失败状态"""
+        fail.enqueue('x')
+        with self.assertLogs('taskqueue.worker', 'WARNING'):
+            self.assertFalse(execute(claim('test')))
+        retry = Task.objects.get()
+        self.assertEqual(retry.status, Task.QUEUED)
+        self.assertIn('ValueError', retry.last_error)
+        self.assertGreater(retry.run_after, timezone.now() + timedelta(seconds=5))
+        self.assertIsNone(claim('test'))
+
+        Task.objects.update(run_after=timezone.now())
+        with self.assertLogs('taskqueue.worker', 'ERROR'):
+            Worker(poll_interval=0).run(burst=True)
+        self.assertEqual(calls, ['x', 'x'])
+        self.assertEqual(Task.objects.get().status, Task.FAILED)
+
+    def test_requeues_abandoned_tasks(self):
+        """测试 worker 退出后未完成的任务重新入队"""
+        record.enqueue('a')
+        claim('gone')
+        Task.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(requeue_stale(timeout=60), 1)
+        self.assertEqual(Task.objects.get().status, Task.QUEUED)
+
+    def test_signals_enqueue_instead_of_running_inline(self):
+        """测试保存文章只加入任务，由 worker 更新搜索索引"""
+        with self.captureOnCommitCallbacks(execute=True):
+            post = BlogPost.objects.create(title='苏堤春晓', slug='su-causeway', content='西湖', is_published=True)
+        self.assertEqual(search.search_ids('苏堤'), [])
+        self.assertTrue(Task.objects.filter(name='blog.tasks.reindex_posts').exists())
+
+        call_command('run_tasks', burst=True, stdout=io.StringIO())
+        self.assertEqual(search.search_ids('苏堤'), [post.pk])
+
+
+class EagerTaskTest(TestCase):
+    """直接执行模式"""
+
+    def setUp(self):
+        calls.clear()
+
+    @override_settings(TASK_QUEUE_EAGER=True)
+    def test_runs_after_commit(self):
+        """测试直接执行模式在事务提交后执行，不写任务表"""
+        with self.captureOnCommitCallbacks(execute=True):
+            record.enqueue('a')
+            self.assertEqual(calls, [])
+        self.assertEqual(calls, ['a'])
+        self.assertFalse(Task.objects.exists())
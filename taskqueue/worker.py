@@ -0,0 +1,202 @@
+"""
+任务队列的 worker
+
+每个 worker 循环执行：把超时未完成的任务重新入队、按间隔加入周期任务、
+取出一个到期任务并执行。任务执行成功后删除；抛出异常时按
+``TASK_RETRY_DELAY`` 的指数退避重新入队，执行次数用完后标记为失败，
+保留在任务表中供后台查看和手动重试。
+"""
+import logging
+import os
+import socket
+import time
+import traceback
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Task
+from .queue import enqueue, get_task, periodic_tasks
+
+logger = logging.getLogger(__name__)
+
+# 重试间隔的上限（秒）
+MAX_RETRY_DELAY = 60 * 60
+# 检查超时任务的间隔（秒）
+STALE_CHECK_INTERVAL = 60
+
+
+def retry_delay(attempts):
+    """第 attempts 次执行失败后等待的秒数：TASK_RETRY_DELAY、2 倍、4 倍……"""
+    return min(settings.TASK_RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def claim(worker, min_priority=None):
+    """
+    取出优先级最高的一个到期任务并标记为执行中，没有时返回 None
+
+    PostgreSQL 上用 SKIP LOCKED 让并发的 worker 各自取到不同的行；SQLite
+    不支持行锁（事务中读后写还会因锁升级失败），不开事务，依靠带状态
+    条件的 UPDATE 保证同一个任务只被一个 worker 取到。
+    """
+    locking = connection.features.has_select_for_update_skip_locked
+    while True:
+        queued = Task.objects.filter(status=Task.QUEUED, run_after__lte=timezone.now())
+        if min_priority is not None:
+            queued = queued.filter(priority__gte=min_priority)
+        if locking:
+            queued = queued.select_for_update(skip_locked=True)
+        with transaction.atomic() if locking else nullcontext():
+            task = queued.order_by('-priority', 'run_after', 'id').first()
+            if task is None:
+                return None
+            now = timezone.now()
+            claimed = Task.objects.filter(pk=task.pk, status=Task.QUEUED).update(
+                status=Task.RUNNING, locked_by=worker, locked_at=now, attempts=F('attempts') + 1
+            )
+        if claimed:
+            task.status, task.locked_by, task.locked_at = Task.RUNNING, worker, now
+            task.attempts += 1
+            return task
+
+
+def _requeue(pk, **changes):
+    try:
+        with transaction.atomic():
+            Task.objects.filter(pk=pk).update(status=Task.QUEUED, locked_by='', locked_at=None, **changes)
+    except IntegrityError:
+        # 执行期间又有相同的任务入队，由那一条代替本次重试
+        Task.objects.filter(pk=pk).delete()
+
+
+def _fail(task, error):
+    logger.error('任务 %s 执行失败：\n%s', task, error)
+    Task.objects.filter(pk=task.pk).update(status=Task.FAILED, last_error=error, locked_by='', locked_at=None)
+
+
+def execute(task):
+    """
+    执行一个已取出的任务
+
+    Returns:
+        是否执行成功
+    """
+    try:
+        spec = get_task(task.name)
+    except KeyError:
+        # 任务函数已被删除或改名，重试也不会成功
+        _fail(task, f'Unknown task {task.name!r}.')
+        return False
+
+    started = time.perf_counter()
+    try:
+        spec.func(*task.args)
+    except Exception:
+        error = traceback.format_exc()
+        if task.attempts >= task.max_attempts:
+            _fail(task, error)
+        else:
+            delay = retry_delay(task.attempts)
+            logger.warning('任务 %s 第 %d 次执行失败，%d 秒后重试', task, task.attempts, delay)
+            _requeue(task.pk, last_error=error, run_after=timezone.now() + timedelta(seconds=delay))
+        return False
+
+    Task.objects.filter(pk=task.pk).delete()
+    logger.info('任务 %s 完成，耗时 %.2fs', task, time.perf_counter() - started)
+    return True
+
+
+def requeue_stale(timeout=None):
+    """
+    执行时间超过 ``TASK_LOCK_TIMEOUT`` 的任务（通常是 worker 进程被杀死）
+    重新入队，执行次数已用完的标记为失败
+
+    Returns:
+        处理的任务数
+    """
+    timeout = settings.TASK_LOCK_TIMEOUT if timeout is None else timeout
+    error = f'Worker did not finish the task within {timeout}s.'
+    stale = Task.objects.filter(
+        status=Task.RUNNING, locked_at__lt=timezone.now() - timedelta(seconds=timeout)
+    )
+    count = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Task.FAILED, last_error=error, locked_by='', locked_at=None
+    )
+    for pk in stale.values_list('pk', flat=True):
+        _requeue(pk, last_error=error, run_after=timezone.now())
+        count += 1
+    return count
+
+
+class Worker:
+    """在当前进程中循环取出并执行任务"""
+
+    def __init__(self, name=None, min_priority=None, poll_interval=None):
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.min_priority = min_priority
+        self.poll_interval = settings.TASK_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.stopping = False
+        self.succeeded = 0
+        self.failed = 0
+        self._next_periodic = {}
+        self._next_stale_check = 0
+
+    def stop(self, *args):
+        """执行完当前任务后退出，可以直接用作信号处理函数"""
+        self.stopping = True
+
+    def schedule_periodic(self):
+        """按间隔加入周期任务；任务表中已有等待执行的同一任务时不会重复加入"""
+        now = time.monotonic()
+        for spec in periodic_tasks():
+            if self._next_periodic.get(spec.name, 0) <= now:
+                interval = spec.interval()
+                enqueue(spec.name, delay=interval)
+                self._next_periodic[spec.name] = now + interval
+
+    def run_once(self):
+        """
+        取出并执行一个任务
+
+        Returns:
+            是否取到了任务
+        """
+        task = claim(self.name, self.min_priority)
+        if task is None:
+            return False
+        if execute(task):
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        return True
+
+    def run(self, burst=False):
+        """
+        循环执行任务直到 ``stop``
+
+        Args:
+            burst: 执行完当前到期的任务后退出，不加入周期任务
+        """
+        while not self.stopping:
+            # 长时间运行的进程中与请求周期一样关闭失效的数据库连接
+            close_old_connections()
+            try:
+                now = time.monotonic()
+                if now >= self._next_stale_check:
+                    requeue_stale()
+                    self._next_stale_check = now + STALE_CHECK_INTERVAL
+                if not burst:
+                    self.schedule_periodic()
+                if self.run_once():
+                    continue
+            except DatabaseError:
+                # 数据库暂时不可用（重启、SQLite 写锁超时）时等待后继续
+                logger.exception('worker %s 访问任务表失败', self.name)
+            if burst:
+                break
+            time.sleep(self.poll_interval)
+        close_old_connections()